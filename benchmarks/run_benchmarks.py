@@ -0,0 +1,280 @@
+"""Run pipeline stages over synthetic corpora and report time, memory and throughput.
+
+Each (scale, stage) runs in its own Python process so peak RSS is per
+stage. Network and LLM calls are never made: the thematic coding stage uses
+the stub backend with a throwaway cache. Results are written as JSON to
+benchmarks/results/.
+
+    python benchmarks/run_benchmarks.py --scales 100 1000 10000
+    python benchmarks/run_benchmarks.py --scales 100000 --stages srt violence --cues 50
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/<earlier>.json
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+SCALES = [100, 1_000, 10_000]
+REGRESSION_RATIO = 1.2
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return round(rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024, 1)
+
+
+# === Stages: each takes (corpus_dir, work_dir) and returns the number of items processed ===
+
+def stage_sampling(corpus, work):
+    from movie_store import build_store, load_movies
+    from sampler import stratified_sample
+
+    store = os.path.join(work, "movies.sqlite")
+    build_store(store, data_dir=corpus)
+    sample = stratified_sample(n=100, path=store)
+    load_movies(imdb_ids=[imdb_id for imdb_id, _ in sample], path=store)
+    return len(load_movies(["imdb_id"], path=store))
+
+
+def stage_srt(corpus, work):
+    from cue_store import build_cue_store, srt_files
+
+    sources = srt_files(os.path.join(corpus, "subtitles"))
+    build_cue_store(sources, path=os.path.join(work, "cues.parquet"))
+    return len(sources)
+
+
+def _texts(corpus, work):
+    import pandas as pd
+    from cue_store import load_dialogue
+
+    dialogue = load_dialogue(path=os.path.join(work, "cues.parquet"))
+    plots = pd.read_csv(os.path.join(corpus, "descriptions", "descriptions_all.csv"), usecols=["imdb_id", "plot"])
+    return pd.merge(dialogue, plots, on="imdb_id", how="outer")
+
+
+def stage_violence(corpus, work):
+    import pandas as pd
+    from corpus import batched, iter_films
+    from proposed_sentiment import BATCH_SIZE, detect_violence
+
+    # Streamed film by film, as proposed_sentiment.py does
+    films = iter_films(cue_path=os.path.join(work, "cues.parquet"),
+                       descriptions_path=os.path.join(corpus, "descriptions", "descriptions_all.csv"))
+    n = 0
+    for batch in batched(films, BATCH_SIZE):
+        detect_violence(pd.Series([f"{film.dialogue}\n{film.plot}" for film in batch]))
+        n += len(batch)
+    return n
+
+
+def stage_thematic_coding(corpus, work):
+    from chunking import make_windows, reduce_labels, select_windows
+    from llm_client import LLMClassifier, StubBackend
+    from response_cache import ResponseCache
+    from structured_output import THEMES, parse_response
+
+    df = _texts(corpus, work).fillna("")
+    jobs = {}
+    for imdb_id, dialogue, plot in df[["imdb_id", "subtitle_text", "plot"]].itertuples(index=False):
+        windows = make_windows(dialogue.split("\n"), 3000) if dialogue else [""]
+        for i in select_windows(windows):
+            jobs[(imdb_id, i)] = f"{plot}\n{windows[i]}"
+
+    # Fresh cache every run, so every window goes through the (stub) model
+    cache_path = os.path.join(work, "llm.sqlite")
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+    cache = ResponseCache(cache_path, ttl=None, max_entries=len(jobs) + 1)
+    classifier = LLMClassifier(StubBackend(), "{text}", cache=cache, workers=4, requests_per_second=1e9,
+                               validate=parse_response)
+    labels = {}
+    for (imdb_id, _), result in classifier.classify_all(jobs):
+        if isinstance(result, Exception):
+            continue
+        labels.setdefault(imdb_id, []).append(parse_response(result))
+    for window_labels in labels.values():
+        reduce_labels(window_labels, THEMES)
+    return len(labels)
+
+
+def stage_thematic_clean(corpus, work):
+    import pandas as pd
+    from movie_store import load_movies
+    from thematic_clean import clean_responses
+
+    df = pd.read_csv(os.path.join(corpus, "thematic_coding.csv"))
+    movies = load_movies(["imdb_id", "original_title", "year_of_release"], path=os.path.join(work, "movies.sqlite"))
+    long_df, _ = clean_responses(df, movies)
+    long_df.to_csv(os.path.join(work, "thematic_coding_clean.csv"), index=False)
+    return len(df)
+
+
+def stage_aggregation(corpus, work):
+    import pandas as pd
+    from aggregate_cube import TRENDS, AggregateCube, film_frame
+
+    # Build the count cube, then the tables visualisation.R plots
+    long_df = pd.read_csv(os.path.join(work, "thematic_coding_clean.csv"))
+    cube = AggregateCube()
+    cube.sync(film_frame(long_df))
+    for dims in TRENDS.values():
+        cube.table(dims)
+    return len(long_df)
+
+
+# Modules each stage uses, imported before its timers start so that import
+# time (pandas, pyarrow, ...) is not counted as work
+STAGE_MODULES = {
+    "sampling": ["movie_store", "sampler"],
+    "srt": ["cue_store"],
+    "violence": ["pandas", "corpus", "proposed_sentiment"],
+    "thematic_coding": ["pandas", "cue_store", "chunking", "llm_client", "response_cache", "structured_output"],
+    "thematic_clean": ["pandas", "movie_store", "thematic_clean"],
+    "aggregation": ["pandas", "aggregate_cube"],
+}
+
+# Listed in dependency order; later stages read what earlier ones wrote to work_dir
+STAGES = {
+    "sampling": stage_sampling,
+    "srt": stage_srt,
+    "violence": stage_violence,
+    "thematic_coding": stage_thematic_coding,
+    "thematic_clean": stage_thematic_clean,
+    "aggregation": stage_aggregation,
+}
+
+
+def run_child(stage, corpus, work):
+    """Run one stage in this process and print its measurements as JSON."""
+    for module in STAGE_MODULES[stage]:
+        importlib.import_module(module)
+    baseline = peak_rss_mb()
+    wall, cpu = time.perf_counter(), time.process_time()
+    items = STAGES[stage](corpus, work)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    print(json.dumps({
+        "stage": stage,
+        "items": items,
+        "wall_s": round(wall, 4),
+        "cpu_s": round(cpu, 4),
+        "items_per_s": round(items / wall, 1) if wall > 0 else None,
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+def ensure_corpus(n, cues, seed):
+    from synthetic import generate
+
+    corpus = os.path.join(RESULTS_DIR, "corpora", f"n{n}_c{cues}_s{seed}")
+    marker = os.path.join(corpus, ".complete")
+    if not os.path.exists(marker):
+        started = time.perf_counter()
+        generate(corpus, n, cues, seed)
+        open(marker, "w").close()
+        print(f"🧪 Generated {n}-film corpus in {time.perf_counter() - started:.1f}s")
+    return corpus
+
+
+def run_stage(stage, corpus, work):
+    env = {**os.environ, "LLM_BACKEND": "stub"}
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", stage, corpus, work],
+                          capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        return {"stage": stage, "error": proc.stderr.strip().splitlines()[-1] if proc.stderr else "failed"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def add_scaling(results):
+    """Per-item time relative to the smallest scale, per stage (1.0 = linear scaling)."""
+    smallest = {}
+    for row in sorted(results, key=lambda r: r["scale"]):
+        if "error" in row or not row["items"]:
+            continue
+        per_item = row["wall_s"] / row["items"]
+        row["per_item_ms"] = round(per_item * 1000, 4)
+        smallest.setdefault(row["stage"], per_item)
+        row["scaling_vs_smallest"] = round(per_item / smallest[row["stage"]], 2) if smallest[row["stage"]] else None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["scale"], r["stage"]): r for r in json.load(f)["results"] if "error" not in r}
+    for row in results:
+        before = baseline.get((row["scale"], row["stage"]))
+        if before and "error" not in row and before["wall_s"] > 0:
+            row["vs_baseline"] = round(row["wall_s"] / before["wall_s"], 2)
+            if row["vs_baseline"] > REGRESSION_RATIO:
+                print(f"⚠️ {row['stage']} at {row['scale']} films is {row['vs_baseline']}x slower than baseline")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages on synthetic corpora.")
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES)
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--cues", type=int, default=200, help="average cues per synthetic film")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--output", help="results path (default: benchmarks/results/benchmark_<time>.json)")
+    parser.add_argument("--child", nargs=3, metavar=("STAGE", "CORPUS", "WORK"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    # Stages read earlier stages' outputs, so keep them in pipeline order
+    stages = [s for s in STAGES if s in args.stages]
+    results = []
+    for n in args.scales:
+        corpus = ensure_corpus(n, args.cues, args.seed)
+        work = os.path.join(RESULTS_DIR, "work", f"n{n}_c{args.cues}_s{args.seed}")
+        os.makedirs(work, exist_ok=True)
+        for stage in stages:
+            row = {"scale": n, **run_stage(stage, corpus, work)}
+            results.append(row)
+            if "error" in row:
+                print(f"❌ {stage:<16} {n:>7} films: {row['error']}")
+            else:
+                print(f"⏱️ {stage:<16} {n:>7} films: {row['wall_s']:>9.3f}s "
+                      f"{row['items_per_s'] or 0:>10.1f}/s  peak {row['peak_rss_mb']} MB")
+
+    add_scaling(results)
+    if args.baseline:
+        compare(results, args.baseline)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "cues_per_film": args.cues,
+        "seed": args.seed,
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"benchmark_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Benchmark results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
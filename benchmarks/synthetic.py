@@ -0,0 +1,138 @@
+"""Deterministic synthetic corpus shaped like the real pipeline inputs.
+
+Writes, for `n` films, into one directory:
+  bollywood_*.csv                  the four source tables (movie_store.SOURCES)
+  descriptions/descriptions_all.csv  OMDb-style plots
+  subtitles/<imdb_id>.srt          SRT files, including some block pages
+  thematic_coding.csv              LLM-style responses, including malformed ones
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from lexicon import LEXICONS
+from structured_output import THEME_LABELS
+
+GENRES = ["Action", "Comedy", "Drama", "Romance", "Thriller", "Crime", "Family", "Musical", "Biography", "Horror"]
+SYLLABLES = ["ka", "ra", "ma", "ji", "na", "pa", "ya", "sha", "dil", "hai", "tum", "pyar", "ghar", "raj", "veer"]
+BLOCK_PAGE = ('<meta name="viewport" content="width=device-width"/>'
+              '<iframe src="https://www.airtel.in/court-orders/"></iframe>')
+
+
+def _vocabulary(rng, size=5_000):
+    words = {"".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3))) for _ in range(size * 2)}
+    return sorted(words)[:size] + ["the", "and", "you", "to", "is", "army", "border", "love", "family"]
+
+
+def _sentence(rng, vocabulary, violence, p_violent):
+    words = [rng.choice(vocabulary) for _ in range(rng.randint(3, 12))]
+    if rng.random() < p_violent:
+        words.insert(rng.randrange(len(words)), rng.choice(violence))
+    return " ".join(words).capitalize()
+
+
+def _timestamp(ms):
+    return f"{ms // 3_600_000:02d}:{ms // 60_000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+
+def write_srt(path, rng, vocabulary, violence, n_cues, p_violent):
+    with open(path, "w", encoding="utf-8") as f:
+        end = 0
+        for i in range(1, n_cues + 1):
+            start = end + rng.randint(100, 8_000)
+            end = start + rng.randint(800, 4_000)
+            text = _sentence(rng, vocabulary, violence, p_violent)
+            if rng.random() < 0.1:
+                text = f"<i>{text}</i>"
+            f.write(f"{i}\n{_timestamp(start)} --> {_timestamp(end)}\n{text}\n\n")
+
+
+def _response(rng):
+    labels = {theme: rng.choice(labels) for theme, labels in THEME_LABELS.items()}
+    roll = rng.random()
+    if roll < 0.02:
+        return "I'm sorry, I can't classify this content."
+    if roll < 0.04:
+        labels.pop(rng.choice(list(labels)))
+    elif roll < 0.06:
+        labels[rng.choice(list(labels))] = "Mixed"
+    return f"```json\n{json.dumps(labels, indent=2)}\n```"
+
+
+def generate(out_dir, n, cues_per_film=200, seed=0, p_blocked=0.05):
+    """Write a synthetic corpus of `n` films to `out_dir`; returns the imdb_ids."""
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(rng)
+    violence = LEXICONS["violence"]
+    ids = [f"tt{1_000_000 + i:07d}" for i in range(n)]
+    titles = [" ".join(rng.choice(vocabulary).capitalize() for _ in range(rng.randint(1, 3))) for _ in ids]
+
+    os.makedirs(out_dir, exist_ok=True)
+    pd.DataFrame({
+        "title": titles,
+        "imdb_id": ids,
+        "poster_path": [f"https://example.org/{i}.jpg" for i in ids],
+        "wiki_link": [f"https://en.wikipedia.org/wiki/{t.replace(' ', '_')}" for t in titles],
+    }).to_csv(os.path.join(out_dir, "bollywood_2010-2019.csv"), index=False)
+    pd.DataFrame({
+        "imdb_id": ids,
+        "title": titles,
+        "original_title": titles,
+        "is_adult": 0,
+        "year_of_release": [rng.randint(2010, 2019) for _ in ids],
+        "runtime": [rng.randint(90, 190) for _ in ids],
+        "genres": ["|".join(rng.sample(GENRES, rng.randint(1, 3))) for _ in ids],
+    }).to_csv(os.path.join(out_dir, "bollywood_meta_2010-2019.csv"), index=False)
+    pd.DataFrame({
+        "imdb_id": ids,
+        "imdb_rating": [round(rng.uniform(2.0, 9.5), 1) for _ in ids],
+        "imdb_votes": [rng.randint(10, 500_000) for _ in ids],
+    }).to_csv(os.path.join(out_dir, "bollywood_ratings_2010-2019.csv"), index=False)
+    plots = [" ".join(_sentence(rng, vocabulary, violence, 0.3) + "." for _ in range(rng.randint(2, 6)))
+             for _ in ids]
+    pd.DataFrame({
+        "imdb_id": ids,
+        "story": plots,
+        "summary": plots,
+        "tagline": "",
+        "actors": ["|".join(rng.choice(titles) for _ in range(4)) for _ in ids],
+        "wins_nominations": "",
+        "release_date": [f"{rng.randint(1, 28)} Jan {rng.randint(2010, 2019)}" for _ in ids],
+    }).to_csv(os.path.join(out_dir, "bollywood_text_2010-2019.csv"), index=False)
+
+    descriptions_dir = os.path.join(out_dir, "descriptions")
+    os.makedirs(descriptions_dir, exist_ok=True)
+    pd.DataFrame({"imdb_id": ids, "original_title": titles, "plot": plots}).to_csv(
+        os.path.join(descriptions_dir, "descriptions_all.csv"), index=False)
+
+    subtitle_dir = os.path.join(out_dir, "subtitles")
+    os.makedirs(subtitle_dir, exist_ok=True)
+    for imdb_id in ids:
+        path = os.path.join(subtitle_dir, f"{imdb_id}.srt")
+        if rng.random() < p_blocked:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(BLOCK_PAGE)
+        else:
+            write_srt(path, rng, vocabulary, violence, rng.randint(cues_per_film // 2, cues_per_film * 3 // 2),
+                      p_violent=rng.choice([0.0, 0.01, 0.05]))
+
+    pd.DataFrame({"raw": [_response(rng) for _ in ids], "imdb_id": ids, "original_title": titles}).to_csv(
+        os.path.join(out_dir, "thematic_coding.csv"), index=False)
+    return ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic corpus.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--n", type=int, default=1_000)
+    parser.add_argument("--cues", type=int, default=200, help="average cues per film")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.out_dir, args.n, args.cues, args.seed)
+    print(f"✅ Synthetic corpus of {args.n} films written to {args.out_dir}")
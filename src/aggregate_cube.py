@@ -0,0 +1,246 @@
+"""Precomputed year x theme x sentiment x violence x director gender counts.
+
+The cube is a dense int32 array, a few KB, with one count per film and theme
+in the cell of its coding. A ledger keeps the cell coordinates each film
+contributed, so an update only touches films whose coding, year, violence
+level or director gender changed: their old counts are subtracted and the
+new ones added. The trend tables the plots need are sums over the cube.
+
+    python src/aggregate_cube.py             # sync the cube, write the trend tables
+    python src/aggregate_cube.py --rebuild   # start from an empty cube
+
+Output: data/aggregates/cube.npz and one CSV per entry of TRENDS.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from structured_output import THEME_LABELS, THEMES
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_DIR = os.path.join(PROJECT_DIR, "data")
+AGGREGATES_DIR = os.path.join(DATA_DIR, "aggregates")
+CUBE_PATH = os.path.join(AGGREGATES_DIR, "cube.npz")
+CODING_PATH = os.path.join(DATA_DIR, "thematic_coding_clean.csv")
+VIOLENCE_PATH = os.path.join(DATA_DIR, "violence_measure.csv")
+METADATA_PATH = os.path.join(DATA_DIR, "metadata", "metadata_extended.csv")
+
+UNKNOWN = "unknown"
+UNKNOWN_YEAR = 0  # year axis slot for films without a release year
+VIOLENCE_LEVELS = ["High", "Low", "Unclear", UNKNOWN]
+GENDERS = ["male", "female", UNKNOWN]
+SENTIMENT_SLOTS = max(len(labels) for labels in THEME_LABELS.values())  # labels are per theme
+
+# Axis order of the cube; names match the columns of the trend tables
+DIMENSIONS = ["year", "theme", "sentiment_category", "violence_representation", "director_gender"]
+
+# Trend tables written by main(): file name -> dimensions kept
+TRENDS = {
+    "theme_frequency": ["year", "theme"],
+    "theme_sentiment": ["theme", "sentiment_category"],
+    "theme_sentiment_year": ["year", "theme", "sentiment_category"],
+    "theme_sentiment_violence": ["theme", "sentiment_category", "violence_representation"],
+    "theme_sentiment_gender": ["theme", "sentiment_category", "director_gender"],
+}
+
+
+def film_frame(long_df, violence=None, metadata=None):
+    """One row per film: imdb_id, year, violence_representation, director_gender and a label per theme.
+
+    `long_df` is the long (imdb_id, year, theme, sentiment_category) table
+    written by thematic_clean.py; `violence` and `metadata` are the violence
+    and metadata CSVs, either of which may be missing.
+    """
+    wide = long_df.pivot_table(index="imdb_id", columns="theme", values="sentiment_category", aggfunc="first")
+    wide = wide.reindex(columns=THEMES)
+    wide.columns.name = None
+    films = long_df.groupby("imdb_id")["year"].first().to_frame().join(wide)
+    for frame, column in ((violence, "violence_representation"), (metadata, "director_gender")):
+        if frame is not None and column in frame:
+            films = films.join(frame.drop_duplicates("imdb_id").set_index("imdb_id")[column])
+        else:
+            films[column] = None
+    return films.reset_index()
+
+
+class AggregateCube:
+    """Dense counts over DIMENSIONS plus the ledger of what each film contributed."""
+
+    def __init__(self, years=(), counts=None, ledger=None):
+        self.years = [int(y) for y in years]
+        shape = (len(self.years), len(THEMES), SENTIMENT_SLOTS, len(VIOLENCE_LEVELS), len(GENDERS))
+        self.counts = counts if counts is not None else np.zeros(shape, dtype=np.int32)
+        # imdb_id -> (year, violence index, gender index, sentiment index per theme or -1)
+        self.ledger = ledger if ledger is not None else {}
+
+    # === Coordinates ===
+    def _year_index(self, year):
+        if year not in self.years:
+            self.years.append(year)
+            self.years.sort()
+            pad = np.zeros((1,) + self.counts.shape[1:], dtype=np.int32)
+            at = self.years.index(year)
+            self.counts = np.concatenate([self.counts[:at], pad, self.counts[at:]])
+        return self.years.index(year)
+
+    @staticmethod
+    def _coordinates(row):
+        year = int(row.year) if pd.notna(row.year) else UNKNOWN_YEAR
+        violence = row.violence_representation if row.violence_representation in VIOLENCE_LEVELS else UNKNOWN
+        gender = str(row.director_gender).lower() if isinstance(row.director_gender, str) else UNKNOWN
+        gender = gender if gender in GENDERS else UNKNOWN
+        labels = tuple(THEME_LABELS[theme].index(getattr(row, theme))
+                       if getattr(row, theme) in THEME_LABELS[theme] else -1 for theme in THEMES)
+        return year, VIOLENCE_LEVELS.index(violence), GENDERS.index(gender), labels
+
+    def _apply(self, entries, sign):
+        """Add (sign=1) or subtract (sign=-1) the counts of ledger entries, all at once."""
+        if not entries:
+            return
+        for year in {entry[0] for entry in entries}:
+            self._year_index(year)  # grow the year axis before any index is taken
+        position = {year: i for i, year in enumerate(self.years)}
+        index = []
+        for year, violence, gender, labels in entries:
+            index.extend((position[year], t, s, violence, gender) for t, s in enumerate(labels) if s >= 0)
+        if index:
+            np.add.at(self.counts, tuple(np.array(index, dtype=np.int64).T), sign)
+
+    # === Updates ===
+    def update(self, films):
+        """Add or replace the films in `films` (see film_frame); returns the number that changed."""
+        old, new = [], []
+        for row in films.itertuples(index=False):
+            entry = self._coordinates(row)
+            previous = self.ledger.get(row.imdb_id)
+            if previous == entry:
+                continue
+            if previous is not None:
+                old.append(previous)
+            new.append(entry)
+            self.ledger[row.imdb_id] = entry
+        self._apply(old, -1)
+        self._apply(new, 1)
+        return len(new)
+
+    def remove(self, imdb_ids):
+        """Take films out of the cube; returns the number removed."""
+        gone = [self.ledger.pop(imdb_id) for imdb_id in imdb_ids if imdb_id in self.ledger]
+        self._apply(gone, -1)
+        return len(gone)
+
+    def sync(self, films):
+        """Make the cube match `films` exactly: (changed, removed)."""
+        removed = self.remove(set(self.ledger) - set(films["imdb_id"]))
+        return self.update(films), removed
+
+    # === Queries ===
+    def table(self, dims):
+        """Long count table over `dims` (a subset of DIMENSIONS), zero cells dropped.
+
+        Sentiment labels depend on the theme, so "sentiment_category" needs
+        "theme" as well. Films without a year have a missing year.
+        """
+        unknown = set(dims) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown cube dimensions: {sorted(unknown)}")
+        if "sentiment_category" in dims and "theme" not in dims:
+            raise ValueError("sentiment_category needs the theme dimension")
+        axes = tuple(i for i, d in enumerate(DIMENSIONS) if d not in dims)
+        kept = self.counts.sum(axis=axes)
+        kept_dims = [d for d in DIMENSIONS if d in dims]
+
+        cells = np.nonzero(kept)
+        columns = {}
+        for dim, idx in zip(kept_dims, cells):
+            if dim == "year":
+                years = np.array(self.years, dtype=float)[idx]
+                columns[dim] = pd.array(np.where(years == UNKNOWN_YEAR, np.nan, years), dtype="Int64")
+            elif dim == "theme":
+                columns[dim] = np.array(THEMES, dtype=object)[idx]
+            elif dim == "sentiment_category":
+                theme_idx = cells[kept_dims.index("theme")]
+                columns[dim] = [THEME_LABELS[THEMES[t]][s] for t, s in zip(theme_idx, idx)]
+            elif dim == "violence_representation":
+                columns[dim] = np.array(VIOLENCE_LEVELS, dtype=object)[idx]
+            else:
+                columns[dim] = np.array(GENDERS, dtype=object)[idx]
+        columns["n"] = kept[cells]
+        table = pd.DataFrame(columns, columns=kept_dims + ["n"])
+        return table[[d for d in dims] + ["n"]]
+
+    # === Storage ===
+    def save(self, path=CUBE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        ids = list(self.ledger)
+        entries = [self.ledger[i] for i in ids]
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            counts=self.counts,
+            years=np.array(self.years, dtype=np.int32),
+            themes=np.array(THEMES, dtype=str),
+            ledger_ids=np.array(ids, dtype=str),
+            ledger_year=np.array([e[0] for e in entries], dtype=np.int32),
+            ledger_violence=np.array([e[1] for e in entries], dtype=np.int8),
+            ledger_gender=np.array([e[2] for e in entries], dtype=np.int8),
+            ledger_labels=np.array([e[3] for e in entries], dtype=np.int8).reshape(len(ids), len(THEMES)),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        """The saved cube, or an empty one if there is none or the theme schema changed."""
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path, allow_pickle=False) as data:
+            if data["themes"].tolist() != THEMES or data["counts"].shape[2] != SENTIMENT_SLOTS:
+                print("⚠️ Theme schema changed since the cube was saved; rebuilding it")
+                return cls()
+            ledger = {
+                imdb_id: (int(year), int(violence), int(gender), tuple(int(s) for s in labels))
+                for imdb_id, year, violence, gender, labels in zip(
+                    data["ledger_ids"].tolist(), data["ledger_year"], data["ledger_violence"],
+                    data["ledger_gender"], data["ledger_labels"])
+            }
+            return cls(data["years"].tolist(), data["counts"], ledger)
+
+
+def write_trends(cube, out_dir=AGGREGATES_DIR):
+    """Write every TRENDS table as <name>.csv; returns the paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, dims in TRENDS.items():
+        path = os.path.join(out_dir, f"{name}.csv")
+        cube.table(dims).to_csv(path, index=False, encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def _read_optional(path):
+    if os.path.exists(path):
+        return pd.read_csv(path)
+    print(f"⚠️ {path} not found; that dimension is recorded as {UNKNOWN}")
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update the aggregate count cube and its trend tables.")
+    parser.add_argument("--rebuild", action="store_true", help="start from an empty cube")
+    args = parser.parse_args(argv)
+
+    films = film_frame(pd.read_csv(CODING_PATH), _read_optional(VIOLENCE_PATH), _read_optional(METADATA_PATH))
+    cube = AggregateCube() if args.rebuild else AggregateCube.load()
+    changed, removed = cube.sync(films)
+    cube.save()
+    write_trends(cube)
+
+    print(f"🧊 {len(cube.ledger)} films in the cube: {changed} added or changed, {removed} removed")
+    print(f"✅ Cube saved to {CUBE_PATH} ({os.path.getsize(CUBE_PATH) / 1024:.1f} KB)")
+    print(f"✅ Trend tables saved to {AGGREGATES_DIR}")
+
+
+if __name__ == "__main__":
+    main()
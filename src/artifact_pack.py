@@ -0,0 +1,300 @@
+"""Append-only, content-addressed pack files for fetched artifacts.
+
+One pack per kind of artifact (subtitles, descriptions, posters) replaces a
+directory of small files. A pack is two files in data/packs/:
+
+    <name>.pack        the artifacts' bytes, back to back, only ever appended to
+                       (<name>.<n>.pack after the n-th compaction)
+    <name>.index.json  the pack file's name and imdb_id -> [offset, length, sha256]
+
+New bytes are appended and fsynced before the index is replaced atomically,
+so a crash can leave unreferenced bytes at the end of the pack but never an
+index entry that points past it. Compaction writes a new pack file and
+switches the index to it the same way. Identical contents are stored once.
+Readers memory-map the pack and get a zero-copy memoryview per artifact.
+
+    python src/artifact_pack.py import subtitles     # pack data/subtitles/*.srt
+    python src/artifact_pack.py import descriptions  # plots from descriptions_all.csv and the .txt files
+    python src/artifact_pack.py verify               # empty, truncated or corrupt entries; descriptions vs the CSV
+    python src/artifact_pack.py compact posters      # drop bytes no entry refers to
+"""
+import argparse
+import glob
+import hashlib
+import json
+import mmap
+import os
+import threading
+
+import pandas as pd
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_DIR = os.path.join(PROJECT_DIR, "data")
+PACK_DIR = os.path.join(DATA_DIR, "packs")
+DESCRIPTIONS_CSV = os.path.join(DATA_DIR, "descriptions", "descriptions_all.csv")
+
+# Pack name -> (directory, extension) of the loose files it replaces
+SOURCES = {
+    "subtitles": (os.path.join(DATA_DIR, "subtitles"), ".srt"),
+    "descriptions": (os.path.join(DATA_DIR, "descriptions"), ".txt"),
+    "posters": (os.path.join(DATA_DIR, "posters"), ".jpg"),
+}
+
+
+class ArtifactPack:
+    """Append-only pack of artifacts keyed by imdb_id. Safe to share between threads."""
+
+    def __init__(self, name, pack_dir=PACK_DIR):
+        os.makedirs(pack_dir, exist_ok=True)
+        self.name = name
+        self.pack_dir = pack_dir
+        self.path = os.path.join(pack_dir, f"{name}.pack")
+        self.index_path = os.path.join(pack_dir, f"{name}.index.json")
+        self._lock = threading.Lock()
+        self._map = None
+        self._file = None
+        self.entries = {}
+        self.generation = 0  # number of compactions; names the pack file after the first
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            self.entries = {k: tuple(v) for k, v in index["entries"].items()}
+            self.path = os.path.join(pack_dir, index.get("pack", os.path.basename(self.path)))
+            self.generation = index.get("generation", 0)
+        if not os.path.exists(self.path):
+            open(self.path, "wb").close()
+        # Content address -> location of its bytes, for storing each content once
+        self._by_sha = {sha: (offset, length) for offset, length, sha in self.entries.values()}
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # === Writing ===
+    def add(self, key, data):
+        """Store one artifact (bytes or str); returns its sha256."""
+        return self.add_many([(key, data)])[key]
+
+    def add_many(self, items):
+        """Store (key, data) pairs with one fsync and one index write; returns {key: sha256}."""
+        added = {}
+        with self._lock:
+            with open(self.path, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                for key, data in items:
+                    data = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+                    sha = hashlib.sha256(data).hexdigest()
+                    if sha not in self._by_sha:
+                        f.write(data)
+                        self._by_sha[sha] = (offset, len(data))
+                        offset += len(data)
+                    self.entries[key] = (*self._by_sha[sha], sha)
+                    added[key] = sha
+                f.flush()
+                os.fsync(f.fileno())
+            self._write_index()
+        return added
+
+    def _write_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pack": os.path.basename(self.path), "generation": self.generation,
+                       "entries": self.entries}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+
+    # === Reading ===
+    def _mapped(self, end):
+        """The pack mapped read-only, remapped if it has grown past `end` since."""
+        if self._map is None or len(self._map) < end:
+            self.close()
+            if os.path.getsize(self.path) == 0:
+                return b""
+            self._file = open(self.path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def get(self, key):
+        """Zero-copy memoryview of an artifact; KeyError if it is not packed."""
+        offset, length, _ = self.entries[key]
+        with self._lock:
+            data = self._mapped(offset + length)
+            if len(data) < offset + length:
+                raise ValueError(f"{self.name}: entry {key} is truncated")
+            return memoryview(data)[offset:offset + length]
+
+    def read_text(self, key, encoding="utf-8"):
+        return str(self.get(key), encoding, errors="replace")
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # views handed out still use the mapping; it is freed with the last of them
+            self._file.close()
+            self._map = self._file = None
+
+    # === Maintenance ===
+    def verify(self):
+        """[(key, problem)] for entries that are empty, truncated or whose bytes do not match their sha256."""
+        problems = []
+        size = os.path.getsize(self.path)
+        for key, (offset, length, sha) in self.entries.items():
+            if length == 0:
+                problems.append((key, "empty"))
+            elif offset + length > size:
+                problems.append((key, f"truncated ({max(size - offset, 0)} of {length} bytes)"))
+            elif hashlib.sha256(self.get(key)).hexdigest() != sha:
+                problems.append((key, "sha256 mismatch"))
+        return problems
+
+    def compact(self):
+        """Copy only the bytes the index refers to into a new pack file; returns bytes reclaimed.
+
+        The new file is synced before the index is switched to it, and the old
+        one is removed last, so a crash at any point leaves an index that
+        matches the pack it names.
+        """
+        with self._lock:
+            old_path, before = self.path, os.path.getsize(self.path)
+            new_path = os.path.join(self.pack_dir, f"{self.name}.{self.generation + 1}.pack")
+            moved, entries = {}, {}
+            with open(old_path, "rb") as src, open(new_path, "wb") as dst:
+                for key, (offset, length, sha) in self.entries.items():
+                    if sha not in moved:
+                        src.seek(offset)
+                        moved[sha] = (dst.tell(), length)
+                        dst.write(src.read(length))
+                    entries[key] = (*moved[sha], sha)
+                dst.flush()
+                os.fsync(dst.fileno())
+            self.close()
+            self.path, self.generation = new_path, self.generation + 1
+            self.entries, self._by_sha = entries, moved
+            self._write_index()
+            os.remove(old_path)
+        return before - os.path.getsize(self.path)
+
+
+# === Importing loose files ===
+def import_directory(name, directory=None, extension=None):
+    """Pack every non-empty <imdb_id><extension> file; returns (packed, [empty file names]).
+
+    Files are read one at a time as they are appended.
+    """
+    default_dir, default_ext = SOURCES[name]
+    directory, extension = directory or default_dir, extension or default_ext
+    empty = []
+
+    def files():
+        for path in sorted(glob.glob(os.path.join(directory, f"*{extension}"))):
+            with open(path, "rb") as f:
+                data = f.read()
+            if data.strip():
+                yield os.path.splitext(os.path.basename(path))[0], data
+            else:
+                empty.append(os.path.basename(path))
+
+    with ArtifactPack(name) as pack:
+        packed = len(pack.add_many(files()))
+    return packed, empty
+
+
+def import_descriptions(csv_path=DESCRIPTIONS_CSV):
+    """Pack plots from descriptions_all.csv, the copy the pipeline reads, and compare the .txt files.
+
+    Returns (packed, [imdb_ids whose .txt is empty], [imdb_ids whose .txt differs from the CSV]).
+    """
+    directory, extension = SOURCES["descriptions"]
+    plots = pd.read_csv(csv_path, usecols=["imdb_id", "plot"]).dropna().drop_duplicates("imdb_id", keep="last")
+    empty, differ = [], []
+    for imdb_id, plot in plots.itertuples(index=False):
+        txt_path = os.path.join(directory, f"{imdb_id}{extension}")
+        if not os.path.exists(txt_path):
+            continue
+        with open(txt_path, encoding="utf-8") as f:
+            text = f.read()
+        if not text.strip():
+            empty.append(imdb_id)
+        elif text.strip() != plot.strip():
+            differ.append(imdb_id)
+    with ArtifactPack("descriptions") as pack:
+        pack.add_many(plots.itertuples(index=False))
+    return len(plots), empty, differ
+
+
+def compare_descriptions(pack, csv_path=DESCRIPTIONS_CSV):
+    """[(imdb_id, problem)] where the descriptions pack disagrees with descriptions_all.csv.
+
+    The CSV is still what the pipeline reads, so the pack is checked against it
+    rather than trusted on its own.
+    """
+    if not os.path.exists(csv_path):
+        return []
+    plots = pd.read_csv(csv_path, usecols=["imdb_id", "plot"]).dropna().drop_duplicates("imdb_id", keep="last")
+    problems = []
+    for imdb_id, plot in plots.itertuples(index=False):
+        if imdb_id not in pack:
+            problems.append((imdb_id, "in the CSV but not in the pack"))
+        elif pack.read_text(imdb_id).strip() != plot.strip():
+            problems.append((imdb_id, "plot differs from the CSV"))
+    for imdb_id in sorted(set(pack.entries) - set(plots["imdb_id"])):
+        problems.append((imdb_id, "in the pack but not in the CSV"))
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack fetched artifacts and check pack integrity.")
+    parser.add_argument("command", choices=["import", "verify", "compact"])
+    parser.add_argument("names", nargs="*", help=f"packs to act on (default: all of {', '.join(SOURCES)})")
+    args = parser.parse_args(argv)
+    unknown = [n for n in args.names if n not in SOURCES]
+    if unknown:
+        parser.error(f"unknown pack(s): {', '.join(unknown)}")
+    names = args.names or list(SOURCES)
+
+    failed = False
+    for name in names:
+        if args.command == "import":
+            if name == "descriptions":
+                n, empty, differ = import_descriptions()
+                print(f"📦 descriptions: {n} plots packed from {DESCRIPTIONS_CSV}")
+                if empty:
+                    print(f"⚠️ {len(empty)} .txt files are empty; the CSV plot was packed instead")
+                if differ:
+                    print(f"⚠️ {len(differ)} .txt files differ from the CSV: {', '.join(differ[:10])}")
+            else:
+                n, empty = import_directory(name)
+                print(f"📦 {name}: {n} files packed")
+                if empty:
+                    print(f"⚠️ {len(empty)} empty files skipped: {', '.join(empty[:10])}")
+        elif args.command == "verify":
+            with ArtifactPack(name) as pack:
+                problems = pack.verify()
+                if name == "descriptions" and not problems:
+                    problems = compare_descriptions(pack)
+                print(f"🔍 {name}: {len(pack)} entries, {len(problems)} problems")
+            for key, problem in problems:
+                print(f"❌ {name}/{key}: {problem}")
+            if name == "descriptions" and problems:
+                print("ℹ️ python src/artifact_pack.py import descriptions rebuilds the pack from the CSV")
+            failed = failed or bool(problems)
+        else:
+            with ArtifactPack(name) as pack:
+                print(f"🧹 {name}: {pack.compact()} bytes reclaimed")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
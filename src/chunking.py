@@ -0,0 +1,72 @@
+from collections import Counter
+
+# Rough English average; good enough for budgeting prompts
+CHARS_PER_TOKEN = 4
+
+STRATEGIES = ("all", "stratified", "first")
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def make_windows(cues, token_budget):
+    """Pack consecutive cue texts into windows of at most `token_budget` tokens.
+
+    Cues are never split; a single cue longer than the budget is truncated
+    into a window of its own.
+    """
+    windows, current, used = [], [], 0
+    for cue in cues:
+        cost = estimate_tokens(cue)
+        if current and used + cost > token_budget:
+            windows.append("\n".join(current))
+            current, used = [], 0
+        if cost > token_budget:
+            cue = cue[:token_budget * CHARS_PER_TOKEN]
+            cost = token_budget
+        current.append(cue)
+        used += cost
+    if current:
+        windows.append("\n".join(current))
+    return windows
+
+
+def select_windows(windows, strategy="stratified", max_windows=8):
+    """Indices of the windows to classify.
+
+    "all" keeps every window, "first" the first `max_windows`, and
+    "stratified" `max_windows` windows spread evenly from start to end of
+    the film, so cost is bounded without only looking at the opening.
+    """
+    n = len(windows)
+    if strategy == "all" or n <= max_windows:
+        return list(range(n))
+    if strategy == "first":
+        return list(range(max_windows))
+    if strategy == "stratified":
+        return [int((i + 0.5) * n / max_windows) for i in range(max_windows)]
+    raise ValueError(f"Unknown sampling strategy: {strategy} (expected one of {STRATEGIES})")
+
+
+def reduce_labels(window_labels, themes, neutral="Neutral"):
+    """Combine per-window theme labels into one film-level coding.
+
+    For each theme the majority label wins; ties go to a non-neutral label,
+    then alphabetically, so the result is deterministic. Returns
+    {theme: {"label", "votes", "confidence"}} where confidence is the
+    winner's share of the windows that gave a label for that theme.
+    """
+    coding = {}
+    for theme in themes:
+        votes = Counter(labels[theme] for labels in window_labels if labels.get(theme))
+        if not votes:
+            coding[theme] = {"label": None, "votes": {}, "confidence": 0.0}
+            continue
+        label = min(votes, key=lambda lab: (-votes[lab], lab == neutral, lab))
+        coding[theme] = {
+            "label": label,
+            "votes": dict(votes),
+            "confidence": round(votes[label] / sum(votes.values()), 3),
+        }
+    return coding
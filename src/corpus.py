@@ -0,0 +1,52 @@
+import os
+from collections import namedtuple
+from itertools import islice
+
+import pandas as pd
+
+from cue_store import CUE_STORE_PATH, iter_dialogue
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DESCRIPTIONS_PATH = os.path.join(PROJECT_DIR, "data", "descriptions", "descriptions_all.csv")
+
+Film = namedtuple("Film", ["imdb_id", "title", "plot", "dialogue"])
+
+
+def load_plots(path=DESCRIPTIONS_PATH, imdb_ids=None, chunksize=10_000):
+    """{imdb_id: (original_title, plot)} read from descriptions_all.csv in chunks."""
+    wanted = set(imdb_ids) if imdb_ids is not None else None
+    plots = {}
+    if not os.path.exists(path):
+        return plots
+    for chunk in pd.read_csv(path, usecols=["imdb_id", "original_title", "plot"], chunksize=chunksize):
+        chunk = chunk.dropna(subset=["imdb_id"])
+        for imdb_id, title, plot in chunk.itertuples(index=False):
+            if wanted is None or imdb_id in wanted:
+                plots[imdb_id] = (title if isinstance(title, str) else None,
+                                  plot if isinstance(plot, str) else "")
+    return plots
+
+
+def iter_films(imdb_ids=None, cue_path=CUE_STORE_PATH, descriptions_path=DESCRIPTIONS_PATH, plot_only=()):
+    """Yield one Film(imdb_id, title, plot, dialogue) per movie, one movie at a time.
+
+    Equivalent to an outer join of the cue store and the plots on imdb_id:
+    films with dialogue come first, in cue store order, then films that only
+    have a plot. Only the plots (a few hundred bytes per film) are held in
+    memory; dialogue is streamed from the cue store film by film. Films in
+    `plot_only` (e.g. flagged subtitles) come with empty dialogue.
+    """
+    plots = load_plots(descriptions_path, imdb_ids)
+    if os.path.exists(cue_path):
+        for imdb_id, dialogue in iter_dialogue(imdb_ids, cue_path):
+            title, plot = plots.pop(imdb_id, (None, ""))
+            yield Film(imdb_id, title, plot, "" if imdb_id in plot_only else dialogue)
+    for imdb_id, (title, plot) in plots.items():
+        yield Film(imdb_id, title, plot, "")
+
+
+def batched(iterable, n):
+    """Lists of up to `n` consecutive items."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, n)):
+        yield batch
@@ -0,0 +1,112 @@
+import glob
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from srt_parser import parse_file
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SUBTITLE_DIR = os.path.join(PROJECT_DIR, "data", "subtitles")
+CUE_STORE_PATH = os.path.join(SUBTITLE_DIR, "cues.parquet")
+
+SCHEMA = pa.schema([
+    ("imdb_id", pa.dictionary(pa.int32(), pa.string())),
+    ("cue_index", pa.int32()),
+    ("start_ms", pa.int32()),
+    ("end_ms", pa.int32()),
+    ("text", pa.string()),
+])
+
+ROWS_PER_GROUP = 100_000
+
+
+def srt_files(subtitle_dir=SUBTITLE_DIR):
+    """(imdb_id, path) for every downloaded .srt file, sorted by imdb_id."""
+    paths = sorted(glob.glob(os.path.join(subtitle_dir, "*.srt")))
+    return [(os.path.splitext(os.path.basename(p))[0], p) for p in paths]
+
+
+def build_cue_store(sources=None, path=CUE_STORE_PATH, rows_per_group=ROWS_PER_GROUP):
+    """Stream SRT files into a Parquet cue table, one row per cue.
+
+    `sources` is an iterable of (imdb_id, srt_path), sorted by imdb_id so that
+    each film's cues are contiguous. Only one row group is held in memory at a
+    time, and the file is written to a temp path and swapped in atomically.
+    Returns the number of films that produced at least one cue.
+    """
+    sources = srt_files() if sources is None else sources
+    columns = {name: [] for name in SCHEMA.names}
+    films = 0
+    tmp_path = path + ".tmp"
+
+    def flush(writer):
+        if columns["text"]:
+            writer.write_table(pa.table(columns, schema=SCHEMA))
+            for values in columns.values():
+                values.clear()
+
+    with pq.ParquetWriter(tmp_path, SCHEMA, compression="zstd") as writer:
+        for imdb_id, srt_path in sources:
+            has_cues = False
+            for cue in parse_file(srt_path):
+                has_cues = True
+                columns["imdb_id"].append(imdb_id)
+                columns["cue_index"].append(cue.cue_index)
+                columns["start_ms"].append(cue.start_ms)
+                columns["end_ms"].append(cue.end_ms)
+                columns["text"].append(cue.text)
+                if len(columns["text"]) >= rows_per_group:
+                    flush(writer)
+            films += has_cues
+        flush(writer)
+
+    os.replace(tmp_path, path)
+    return films
+
+
+def read_cues(imdb_ids=None, columns=None, path=CUE_STORE_PATH):
+    """Cue rows as a DataFrame, reading only the requested columns and films."""
+    filters = [("imdb_id", "in", list(imdb_ids))] if imdb_ids is not None else None
+    table = pq.read_table(path, columns=columns, filters=filters)
+    return table.to_pandas()
+
+
+def iter_film_cues(imdb_ids=None, path=CUE_STORE_PATH, batch_size=65_536):
+    """Yield (imdb_id, [(cue_index, text), ...]) per film without loading the whole store.
+
+    Only the imdb_id, cue_index and text columns are read, batch by batch.
+    """
+    wanted = set(imdb_ids) if imdb_ids is not None else None
+    current, cues = None, []
+    parquet = pq.ParquetFile(path)
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=["imdb_id", "cue_index", "text"]):
+        rows = zip(batch.column(0).to_pylist(), batch.column(1).to_pylist(), batch.column(2).to_pylist())
+        for imdb_id, cue_index, text in rows:
+            if imdb_id != current:
+                if cues:
+                    yield current, cues
+                current, cues = imdb_id, []
+            if wanted is None or imdb_id in wanted:
+                cues.append((cue_index, text))
+    if cues:
+        yield current, cues
+
+
+def iter_dialogue(imdb_ids=None, path=CUE_STORE_PATH, batch_size=65_536):
+    """Yield (imdb_id, dialogue_text) per film; cues of a film are joined with newlines."""
+    for imdb_id, cues in iter_film_cues(imdb_ids, path, batch_size):
+        yield imdb_id, "\n".join(text for _, text in cues)
+
+
+def load_dialogue(imdb_ids=None, path=CUE_STORE_PATH):
+    """DataFrame with one row per film: imdb_id, subtitle_text (dialogue only)."""
+    return pd.DataFrame(list(iter_dialogue(imdb_ids, path)), columns=["imdb_id", "subtitle_text"])
+
+
+if __name__ == "__main__":
+    subtitle_dir = sys.argv[1] if len(sys.argv) > 1 else SUBTITLE_DIR
+    n_films = build_cue_store(srt_files(subtitle_dir))
+    print(f"✅ Cue store built for {n_films} films: {CUE_STORE_PATH}")
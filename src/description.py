@@ -1,75 +1,111 @@
 import os
-import time
-import requests
 import pandas as pd
 from dotenv import load_dotenv
 
-# === Step 1: Set working directory ===
-os.chdir(r"D:\RA assessment\bollywood-movie-analysis\venv")
-
-# === Step 2: Load environment variables ===
-load_dotenv()
-OMDB_API_KEY = os.getenv("OPENDESCRIPTION_API_KEY")
-
-if not OMDB_API_KEY:
-    raise ValueError("API key not found. Please set OPENDESCRIPTION_API_KEY in your .env file.")
-
-# === Step 3: Load sampled movie data ===
-df = pd.read_csv("data/sampled/movies_sampled.csv")
-
-# === Step 4: Create output directory for .txt files ===
-output_dir = "data/descriptions"
-os.makedirs(output_dir, exist_ok=True)
-
-# === Step 5: Prepare list for CSV ===
-plot_data = []
-
-# === Step 6: Download and save descriptions ===
-for _, row in df.iterrows():
-    imdb_id = row.get("imdb_id")
-    title = row.get("original_title")
-
-    if not imdb_id:
-        continue
-
-    params = {
-        "apikey": OMDB_API_KEY,
-        "i": imdb_id,
-        "plot": "full",
-        "r": "json"
-    }
-
-    response = requests.get("http://www.omdbapi.com/", params=params)
+from artifact_pack import ArtifactPack
+from http_replay import api_key
+from http_utils import TokenBucket, make_session, request_with_retry
+from instrumentation import start_run
+from manifest import Manifest, append_rows, dedupe_csv
+from movie_store import load_sample
+from sharding import in_shard, shard_path, shard_suffix, stage_args
+
+# === Step 1: Resolve project paths from the script location ===
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Plots are packed, appended to the CSV and checkpointed together, one index write per batch
+WRITE_EVERY = 25
+
+def main(argv=None):
+    shard = stage_args("Fetch OMDb plots for the sampled movies.", argv).shard
+
+    # === Step 2: Load environment variables ===
+    load_dotenv()
+    OMDB_API_KEY = api_key("OPENDESCRIPTION_API_KEY")
+
+    # Per-host latency, retries and stage timings are reported in data/reports/
+    run = start_run("descriptions" + shard_suffix(shard))
+
+    # One request every 1.5 s to respect the OMDb rate limit
+    session = make_session()
+    bucket = TokenBucket(1 / 1.5)
+
+    # === Step 3: Load sampled movie data ===
+    df = load_sample(["imdb_id", "original_title"])
+
+    # === Step 4: Create output directory; plots are also kept in data/packs/descriptions.pack ===
+    output_dir = os.path.join(PROJECT_DIR, "data", "descriptions")
+    os.makedirs(output_dir, exist_ok=True)
+    pack = ArtifactPack("descriptions" + shard_suffix(shard))
+
+    # === Step 5: Resume from the manifest; the CSV is appended to as we go ===
+    csv_path = shard_path(os.path.join(output_dir, "descriptions_all.csv"), shard)
+    CSV_COLUMNS = ["imdb_id", "original_title", "plot"]
+    manifest = Manifest("descriptions")
+    manifest.seed_from_csv(csv_path)
+
+    df = df[df["imdb_id"].notna()]
+    df = df[[in_shard(imdb_id, shard) for imdb_id in df["imdb_id"]]]
+    pending = set(manifest.pending(df["imdb_id"].tolist()))
+    print(f"🚀 Fetching descriptions for {len(pending)} of {len(df)} movies")
+
+    # === Step 6: Download descriptions; save them a batch at a time ===
+    fetched = []
+
+    def save_batch():
+        if not fetched:
+            return
+        # ✅ Checkpoint: pack (synced), append to the combined CSV, then record completion
+        pack.add_many((record["imdb_id"], record["plot"]) for record in fetched)
+        append_rows(csv_path, fetched, CSV_COLUMNS)
+        for record in fetched:
+            manifest.mark_done(record["imdb_id"])
+        fetched.clear()
 
     try:
-        data = response.json()
-    except Exception as e:
-        print(f"❌ JSON decode error for {title}: {e}")
-        continue
-
-    if data.get("Response") == "True":
-        plot = data.get("Plot", "No plot available.")
-        filename = f"{imdb_id}.txt"
-        filepath = os.path.join(output_dir, filename)
-
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(plot)
-
-        # ✅ Add to combined CSV data
-        plot_data.append({
-            "imdb_id": imdb_id,
-            "original_title": title,
-            "plot": plot
-        })
-
-        print(f"✅ Saved description for: {title}")
-    else:
-        print(f"❌ Plot not found for: {title} ({imdb_id})")
-
-    time.sleep(1.5)  # Respect OMDb rate limit
-
-# === Step 7: Save all collected descriptions into one CSV ===
-desc_df = pd.DataFrame(plot_data)
-desc_df.to_csv("data/descriptions/descriptions_all.csv", index=False)
-
-print("📁 All descriptions saved to: data/descriptions/descriptions_all.csv")
\ No newline at end of file
+        for _, row in df.iterrows():
+            imdb_id = row.get("imdb_id")
+            title = row.get("original_title")
+
+            if imdb_id not in pending:
+                continue
+
+            params = {
+                "apikey": OMDB_API_KEY,
+                "i": imdb_id,
+                "plot": "full",
+                "r": "json"
+            }
+
+            try:
+                response = request_with_retry(session, "GET", "http://www.omdbapi.com/", bucket=bucket, params=params)
+                data = response.json()
+            except Exception as e:
+                print(f"❌ Request failed for {title}: {e}")
+                manifest.mark_failed(imdb_id, e)
+                continue
+
+            if data.get("Response") == "True":
+                plot = data.get("Plot", "No plot available.")
+                fetched.append({"imdb_id": imdb_id, "original_title": title, "plot": plot})
+                if len(fetched) >= WRITE_EVERY:
+                    save_batch()
+                print(f"✅ Fetched description for: {title}")
+            else:
+                print(f"❌ Plot not found for: {title} ({imdb_id})")
+                manifest.mark_failed(imdb_id, data.get("Error", "plot not found"))
+    finally:
+        # Interrupted or not, plots already fetched are kept
+        save_batch()
+
+    # === Step 7: Drop rows superseded by a retry ===
+    dedupe_csv(csv_path)
+    pack.close()
+
+    print(f"📁 All descriptions saved to: {csv_path}")
+    print(f"📋 Manifest: {manifest.summary()}")
+    print(f"📊 Run report: {run.finish(manifest=manifest.summary())}")
+
+
+if __name__ == "__main__":
+    main()
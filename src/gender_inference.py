@@ -0,0 +1,146 @@
+import os
+
+import pandas as pd
+
+from http_utils import TokenBucket, make_session, request_with_retry
+from response_cache import ResponseCache
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CACHE_PATH = os.path.join(PROJECT_DIR, "data", "cache", "genderize.sqlite")
+LOOKUP_PATH = os.path.join(PROJECT_DIR, "data", "metadata", "gender_lookup.csv")
+
+GENDERIZE_URL = "https://api.genderize.io"
+BATCH_SIZE = 10  # names per Genderize request (API maximum)
+
+
+def first_name(full_name):
+    """Lowercased first name, the part Genderize and the lookup table are keyed by."""
+    if not isinstance(full_name, str) or not full_name.strip():
+        return None
+    return full_name.strip().split()[0].strip(".,").lower()
+
+
+def _unknown(name):
+    return {"name": name, "gender": None, "probability": None, "count": 0}
+
+
+# === Backends: names in, {name: {gender, probability, count}} out ===
+class GenderizeBackend:
+    """genderize.io, up to 10 names per request through the shared session."""
+
+    name = "genderize"
+    cache_unknown = True
+
+    def __init__(self, api_key=None, session=None, requests_per_second=1):
+        self.api_key = api_key if api_key is not None else os.getenv("GENDERIZE_API_KEY")
+        self.session = session if session is not None else make_session()
+        self.bucket = TokenBucket(requests_per_second)
+
+    def lookup(self, names):
+        results = {}
+        for start in range(0, len(names), BATCH_SIZE):
+            batch = names[start:start + BATCH_SIZE]
+            params = [("name[]", n) for n in batch]
+            if self.api_key:
+                params.append(("apikey", self.api_key))
+            response = request_with_retry(self.session, "GET", GENDERIZE_URL, bucket=self.bucket, params=params)
+            response.raise_for_status()
+            for item in response.json():
+                results[item["name"].lower()] = {
+                    "name": item["name"].lower(),
+                    "gender": item.get("gender"),
+                    "probability": item.get("probability"),
+                    "count": item.get("count", 0),
+                }
+        return results
+
+
+class LookupBackend:
+    """Offline backend: a CSV of name, gender, probability, count."""
+
+    name = "lookup"
+    # A name missing from the table may still be resolved by genderize later
+    cache_unknown = False
+
+    def __init__(self, path=LOOKUP_PATH):
+        table = pd.read_csv(path, dtype={"name": str})
+        table["name"] = table["name"].str.strip().str.lower()
+        table = table.astype(object).where(table.notna(), None)
+        self.table = {row["name"]: row for row in table.to_dict("records")}
+
+    def lookup(self, names):
+        return {n: dict(self.table[n]) for n in names if n in self.table}
+
+
+def make_backend(kind=None):
+    """Backend from `kind` or env GENDER_BACKEND (genderize | lookup)."""
+    kind = (kind or os.getenv("GENDER_BACKEND", "genderize")).lower()
+    if kind == "genderize":
+        return GenderizeBackend()
+    if kind == "lookup":
+        return LookupBackend(os.getenv("GENDER_LOOKUP_CSV", LOOKUP_PATH))
+    raise ValueError(f"Unknown gender backend: {kind}")
+
+
+class GenderInference:
+    """Name-based gender inference that resolves every name at most once.
+
+    Collect all names first and call infer() once: names already in the
+    cache are answered locally, and the rest go to the backend in batches.
+    Names genderize cannot resolve are cached too (gender None), so they
+    are not retried on every run.
+    """
+
+    def __init__(self, backend=None, cache=None):
+        self.backend = backend if backend is not None else make_backend()
+        self.cache = cache if cache is not None else ResponseCache(CACHE_PATH, ttl=None)
+        self.resolved = 0
+
+    def infer(self, full_names):
+        """{full_name: {gender, probability, count}} for the given names."""
+        keys = {n: first_name(n) for n in full_names if first_name(n)}
+        results, missing = {}, []
+        for key in dict.fromkeys(keys.values()):
+            cached = self.cache.get(f"name:{key}")
+            if cached is not None:
+                results[key] = cached
+            else:
+                missing.append(key)
+
+        if missing:
+            found = self.backend.lookup(missing)
+            for key in missing:
+                result = {**_unknown(key), **found.get(key, {}), "source": self.backend.name}
+                if key in found or self.backend.cache_unknown:
+                    self.cache.set(f"name:{key}", result)
+                results[key] = result
+            self.resolved += len(missing)
+
+        return {full: results[key] for full, key in keys.items()}
+
+    def stats(self):
+        return {"resolved_by_backend": self.resolved, **self.cache.stats()}
+
+
+def build_lookup(metadata_csv, path=LOOKUP_PATH):
+    """Offline lookup table from directors whose gender is already known.
+
+    One row per first name with its majority gender, the share of directors
+    with that gender (probability) and how many directors it is based on.
+    """
+    df = pd.read_csv(metadata_csv, usecols=["director", "director_gender"]).dropna()
+    df["name"] = df["director"].map(first_name)
+    counts = df.groupby(["name", "director_gender"]).size().rename("n").reset_index()
+    totals = counts.groupby("name")["n"].transform("sum")
+    counts["probability"] = (counts["n"] / totals).round(2)
+    table = (counts.sort_values(["name", "n"], ascending=[True, False])
+             .drop_duplicates("name")
+             .rename(columns={"director_gender": "gender"}))
+    table["count"] = totals.loc[table.index]
+    table[["name", "gender", "probability", "count"]].to_csv(path, index=False, encoding="utf-8")
+    return len(table)
+
+
+if __name__ == "__main__":
+    metadata_csv = os.path.join(PROJECT_DIR, "data", "metadata", "metadata_extended.csv")
+    print(f"✅ Gender lookup with {build_lookup(metadata_csv)} names saved to: {LOOKUP_PATH}")
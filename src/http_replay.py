@@ -0,0 +1,234 @@
+"""Record and replay HTTP traffic (and LLM calls) for offline reruns.
+
+HTTP_MODE selects what sessions from http_utils.make_session do:
+
+    live     (default) talk to the network
+    record   talk to the network and store every successful response
+    replay   serve stored responses only; a request that was never recorded fails
+
+Recordings live in data/replay/http.sqlite, keyed by method, URL, query
+parameters (API keys left out) and a hash of the request body. Gemini calls
+are recorded in the same store through RecordingBackend / ReplayBackend in
+llm_client.make_backend.
+
+In replay mode the local stand-in can be made to behave like a remote API:
+
+    HTTP_REPLAY_LATENCY     mean seconds added per response (default 0)
+    HTTP_REPLAY_ERROR_RATE  share of requests that fail with a 503 or a
+                            connection error, to exercise retries (default 0)
+    HTTP_REPLAY_SEED        seed for the injected latency and errors
+"""
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from response_cache import SECRET_PARAMS
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+REPLAY_PATH = os.path.join(PROJECT_DIR, "data", "replay", "http.sqlite")
+
+MODES = ("live", "record", "replay")
+# Not replayed: the stored body is already decoded and its length may differ
+DROPPED_HEADERS = {"content-encoding", "transfer-encoding", "content-length", "connection"}
+# Transient failures are not worth recording
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+
+
+class ReplayMiss(requests.RequestException):
+    """Replay mode was asked for a request that was never recorded (not retried)."""
+
+
+def http_mode():
+    mode = os.getenv("HTTP_MODE", "live")
+    if mode not in MODES:
+        raise ValueError(f"Unknown HTTP_MODE: {mode} (expected one of {', '.join(MODES)})")
+    return mode
+
+
+def api_key(name):
+    """The API key in env var `name`; replay needs none, since keys are not part of recorded requests."""
+    value = os.getenv(name)
+    if value:
+        return value
+    if http_mode() == "replay":
+        return "replay"
+    raise ValueError(f"API key not found. Please set {name} in your .env file.")
+
+
+def request_key(method, url, body=None):
+    """Stable key for a request: method, URL with sorted query minus API keys, and a body hash."""
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in SECRET_PARAMS)
+    key = f"{method.upper()} {urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ''))}"
+    if body:
+        body = body.encode("utf-8") if isinstance(body, str) else body
+        key += " " + hashlib.sha256(body).hexdigest()
+    return key
+
+
+class ReplayStore:
+    """Recorded responses in SQLite: key -> status, headers, body. Safe to share between threads."""
+
+    def __init__(self, path=REPLAY_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS recordings ("
+            " key TEXT PRIMARY KEY,"
+            " status INTEGER NOT NULL,"
+            " headers TEXT NOT NULL,"
+            " body BLOB NOT NULL,"
+            " recorded_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        """(status, headers dict, body bytes) or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT status, headers, body FROM recordings WHERE key = ?", (key,)).fetchone()
+        return (row[0], json.loads(row[1]), bytes(row[2])) if row else None
+
+    def put(self, key, status, headers, body):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO recordings (key, status, headers, body, recorded_at) VALUES (?, ?, ?, ?, ?)",
+                (key, status, json.dumps(headers), sqlite3.Binary(body), time.time()),
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM recordings").fetchone()[0]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def shared_store(path=REPLAY_PATH):
+    """One ReplayStore per path for the whole process."""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = ReplayStore(path)
+        return _stores[path]
+
+
+class FaultInjector:
+    """Latency and errors added to replayed responses, from the HTTP_REPLAY_* env vars."""
+
+    def __init__(self, latency=None, error_rate=None, seed=None):
+        self.latency = float(os.getenv("HTTP_REPLAY_LATENCY", "0")) if latency is None else latency
+        self.error_rate = float(os.getenv("HTTP_REPLAY_ERROR_RATE", "0")) if error_rate is None else error_rate
+        seed = os.getenv("HTTP_REPLAY_SEED") if seed is None else seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        if self.latency:
+            with self._lock:
+                seconds = self._random.expovariate(1 / self.latency)
+            time.sleep(seconds)
+
+    def fault(self):
+        """None, "status" (serve a 503) or "connection" (raise a connection error)."""
+        if not self.error_rate:
+            return None
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            return self._random.choice(["status", "connection"])
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Transport adapter that records responses or serves them from a ReplayStore."""
+
+    def __init__(self, mode, store=None, faults=None, **kwargs):
+        super().__init__(**kwargs)
+        self.mode = mode
+        self.store = store if store is not None else shared_store()
+        self.faults = faults if faults is not None else FaultInjector()
+
+    def send(self, request, **kwargs):
+        key = request_key(request.method, request.url, request.body)
+        if self.mode == "record":
+            response = super().send(request, **kwargs)
+            body = response.content  # reads a streamed body; iter_content then serves it from memory
+            if response.status_code not in TRANSIENT_STATUS:
+                headers = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS}
+                self.store.put(key, response.status_code, headers, body)
+            return response
+
+        self.faults.delay()
+        fault = self.faults.fault()
+        if fault == "connection":
+            raise requests.ConnectionError(f"injected connection error for {key}", request=request)
+        if fault == "status":
+            return self._response(request, 503, {"Retry-After": "0"}, b"")
+        recorded = self.store.get(key)
+        if recorded is None:
+            raise ReplayMiss(f"no recording for {key}", request=request)
+        return self._response(request, *recorded)
+
+    @staticmethod
+    def _response(request, status, headers, body):
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict({**headers, "Content-Length": str(len(body))})
+        response._content = body
+        response._content_consumed = True
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.reason = "Replayed" if status != 503 else "Service Unavailable (injected)"
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(0)
+        return response
+
+
+# === LLM calls ===
+def _llm_key(model_name, prompt):
+    return f"LLM {model_name} {hashlib.sha256(prompt.encode('utf-8')).hexdigest()}"
+
+
+class RecordingBackend:
+    """Wraps an LLM backend and stores every response it generates."""
+
+    def __init__(self, backend, store=None):
+        self.backend = backend
+        self.name = backend.name
+        self.store = store if store is not None else shared_store()
+
+    def generate(self, prompt):
+        text = self.backend.generate(prompt)
+        self.store.put(_llm_key(self.name, prompt), 200, {}, text.encode("utf-8"))
+        return text
+
+
+class ReplayBackend:
+    """Serves recorded LLM responses for `name` (the recorded model), with injected latency and errors."""
+
+    def __init__(self, name, store=None, faults=None):
+        self.name = name
+        self.store = store if store is not None else shared_store()
+        self.faults = faults if faults is not None else FaultInjector()
+
+    def generate(self, prompt):
+        self.faults.delay()
+        if self.faults.fault():
+            raise RuntimeError("injected LLM error")
+        recorded = self.store.get(_llm_key(self.name, prompt))
+        if recorded is None:
+            raise ReplayMiss(f"no recorded {self.name} response for this prompt")
+        return recorded[2].decode("utf-8")
@@ -0,0 +1,125 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_replay import ReplayAdapter, http_mode
+from instrumentation import host_of, metrics, response_bytes
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def rate_limit_divisor(env=os.environ):
+    """RATE_LIMIT_DIVISOR from `env` (default 1); must be a positive number."""
+    value = env.get("RATE_LIMIT_DIVISOR", "1")
+    try:
+        divisor = float(value)
+    except ValueError:
+        divisor = None
+    if divisor is None or not divisor > 0 or divisor == float("inf"):
+        raise ValueError(f"RATE_LIMIT_DIVISOR must be a positive number, got {value!r}")
+    return divisor
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by all workers hitting one API.
+
+    `rate` tokens are added per second up to `capacity`; each request takes
+    one token and blocks until one is available. With HTTP_MODE=replay no
+    request reaches the API, so the bucket never blocks; HTTP_REPLAY_LATENCY
+    is the only delay. Processes that share one API quota (local shards,
+    see sharding.py) set RATE_LIMIT_DIVISOR to the number of processes, and
+    each gets that share of `rate`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate) / rate_limit_divisor()
+        self.capacity = float(capacity if capacity is not None else max(1.0, self.rate))
+        self.unlimited = http_mode() == "replay"
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        if self.unlimited:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def make_session(pool_size=10, headers=None):
+    """Session with a per-host connection pool sized for `pool_size` workers.
+
+    With HTTP_MODE=record or replay the session records responses or serves
+    them from disk (see http_replay.py).
+    """
+    session = requests.Session()
+    mode = http_mode()
+    if mode == "live":
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    else:
+        adapter = ReplayAdapter(mode, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def request_with_retry(session, method, url, bucket=None, max_retries=5, backoff=1.0, timeout=30, **kwargs):
+    """Send a request through `bucket`, retrying 429/5xx and connection errors.
+
+    Honours `Retry-After` when the server sends one. Returns the last response
+    (which may still be an error status); re-raises the last exception if every
+    attempt failed at the connection level.
+    """
+    host = host_of(url)
+    for attempt in range(max_retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.record_request(host, time.perf_counter() - started, error=e)
+            if attempt == max_retries:
+                raise
+            metrics.record_retry(host)
+            time.sleep(backoff_delay(attempt, backoff))
+            continue
+        metrics.record_request(host, time.perf_counter() - started, response.status_code, response_bytes(response))
+
+        if response.status_code not in RETRY_STATUS or attempt == max_retries:
+            return response
+
+        metrics.record_retry(host)
+        delay = _retry_after(response)
+        time.sleep(delay if delay is not None else backoff_delay(attempt, backoff))
+    return response
@@ -0,0 +1,202 @@
+import atexit
+import bisect
+import cProfile
+import csv
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+REPORT_DIR = os.path.join(PROJECT_DIR, "data", "reports")
+
+# Latency histogram bucket upper bounds, in milliseconds
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1_000, 2_500, 5_000, 10_000, 30_000, float("inf")]
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with exact count, sum, min and max."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (the max for the last bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return round(min(bound, self.max), 1)
+        return round(self.max, 1)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 1) if self.count else None,
+            "min_ms": round(self.min, 1) if self.min is not None else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "max_ms": round(self.max, 1) if self.max is not None else None,
+            "buckets": {("inf" if b == float("inf") else str(b)): n
+                        for b, n in zip(self.bounds, self.counts) if n},
+        }
+
+
+class Metrics:
+    """Process-wide counters: per-host request latency, retries, errors, bytes
+    and per-stage wall/CPU time. All methods are thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hosts = {}
+            self.stages = {}
+
+    def _host(self, host):
+        if host not in self.hosts:
+            self.hosts[host] = {"latency": Histogram(), "requests": 0, "retries": 0,
+                                "errors": 0, "bytes": 0, "status": {}}
+        return self.hosts[host]
+
+    def record_request(self, host, seconds, status=None, nbytes=0, error=None):
+        with self._lock:
+            entry = self._host(host)
+            entry["requests"] += 1
+            entry["latency"].add(seconds * 1000)
+            entry["bytes"] += nbytes or 0
+            key = str(status) if status is not None else type(error).__name__ if error else "ok"
+            entry["status"][key] = entry["status"].get(key, 0) + 1
+            if error is not None or (status is not None and status >= 400):
+                entry["errors"] += 1
+
+    def record_retry(self, host):
+        with self._lock:
+            self._host(host)["retries"] += 1
+
+    def record_stage(self, name, wall, cpu):
+        with self._lock:
+            stage = self.stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "runs": 0})
+            stage["wall_s"] = round(stage["wall_s"] + wall, 4)
+            stage["cpu_s"] = round(stage["cpu_s"] + cpu, 4)
+            stage["runs"] += 1
+
+    @contextmanager
+    def timed(self, host):
+        """Time a call that does not go through request_with_retry (SDKs, client libraries)."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record_request(host, time.perf_counter() - started, error=e)
+            raise
+        self.record_request(host, time.perf_counter() - started)
+
+    @contextmanager
+    def stage(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def snapshot(self):
+        with self._lock:
+            hosts = {}
+            for host, entry in sorted(self.hosts.items()):
+                hosts[host] = {k: v for k, v in entry.items() if k != "latency"}
+                hosts[host]["latency"] = entry["latency"].to_dict()
+            return {"hosts": hosts, "stages": {k: dict(v) for k, v in self.stages.items()}}
+
+
+metrics = Metrics()
+
+
+def host_of(url):
+    return urlsplit(url).netloc or url
+
+
+def response_bytes(response):
+    """Bytes received for a response, without forcing a streamed body to download."""
+    length = response.headers.get("Content-Length")
+    if length is not None and length.isdigit():
+        return int(length)
+    return len(response.content) if getattr(response, "_content_consumed", False) else 0
+
+
+def _profile_enabled(name):
+    # PROFILE=1 profiles every run; PROFILE=stage_a,stage_b only those stages
+    wanted = os.getenv("PROFILE", "")
+    return wanted in ("1", "all") or name in {s.strip() for s in wanted.split(",")}
+
+
+class Run:
+    """One script run: times the whole stage and writes a report when finished.
+
+    The report is written on finish() or, if the script dies first, at exit,
+    so slow or failing runs still leave numbers behind.
+    """
+
+    def __init__(self, name, report_dir=REPORT_DIR, profile=None):
+        self.name = name
+        self.report_dir = report_dir
+        self.started_at = time.strftime("%Y%m%d-%H%M%S")
+        self._wall, self._cpu = time.perf_counter(), time.process_time()
+        self._profiler = None
+        if profile if profile is not None else _profile_enabled(name):
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self.finished = False
+        atexit.register(self.finish, status="aborted")
+
+    def finish(self, status="ok", **extra):
+        """Record stage time and write <name>_<time>.json and _hosts.csv; returns the JSON path."""
+        if self.finished:
+            return None
+        self.finished = True
+        atexit.unregister(self.finish)
+        metrics.record_stage(self.name, time.perf_counter() - self._wall, time.process_time() - self._cpu)
+
+        os.makedirs(self.report_dir, exist_ok=True)
+        base = os.path.join(self.report_dir, f"{self.name}_{self.started_at}")
+        report = {"stage": self.name, "started_at": self.started_at, "status": status,
+                  **extra, **metrics.snapshot()}
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(base + ".prof")
+            report["profile"] = base + ".prof"
+
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+        with open(base + "_hosts.csv", "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["host", "requests", "retries", "errors", "bytes",
+                             "mean_ms", "p50_ms", "p95_ms", "max_ms"])
+            for host, entry in report["hosts"].items():
+                latency = entry["latency"]
+                writer.writerow([host, entry["requests"], entry["retries"], entry["errors"], entry["bytes"],
+                                 latency["mean_ms"], latency["p50_ms"], latency["p95_ms"], latency["max_ms"]])
+        return base + ".json"
+
+
+def start_run(name, **kwargs):
+    return Run(name, **kwargs)
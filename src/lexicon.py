@@ -0,0 +1,122 @@
+import re
+
+import numpy as np
+
+# Keyword lexicons for text measures. Add a new measure by adding an entry;
+# every lexicon is matched in the same single pass over each document.
+LEXICONS = {
+    "violence": [
+        "kill", "murder", "violence", "gun", "fight", "blood", "terrorist", "attack", "riot",
+        "war", "shoot", "bomb", "stab", "explosion", "rebel", "hostage", "brutal", "torture"
+    ],
+}
+
+# Word forms counted as each keyword, listed explicitly: a generic suffix
+# rule also matches unrelated words ("ward", "wares" for "war") and misses
+# doubled consonants ("stabbed", "gunned"). A keyword without an entry only
+# matches itself.
+INFLECTIONS = {
+    "kill": ["kills", "killed", "killing", "killings", "killer", "killers"],
+    "murder": ["murders", "murdered", "murdering", "murderer", "murderers", "murderous"],
+    "violence": ["violent", "violently"],
+    "gun": ["guns", "gunned", "gunning", "gunman", "gunmen", "gunfire", "gunshot", "gunshots"],
+    "fight": ["fights", "fighting", "fighter", "fighters", "fought"],
+    "blood": ["bloody", "bloodied", "bloodshed", "bloodbath"],
+    "terrorist": ["terrorists", "terrorism"],
+    "attack": ["attacks", "attacked", "attacking", "attacker", "attackers"],
+    "riot": ["riots", "rioted", "rioting", "rioter", "rioters"],
+    "war": ["wars", "warring", "warfare"],
+    "shoot": ["shoots", "shooting", "shootings", "shooter", "shooters", "shootout"],
+    "bomb": ["bombs", "bombed", "bombing", "bombings", "bomber", "bombers"],
+    "stab": ["stabs", "stabbed", "stabbing", "stabbings"],
+    "explosion": ["explosions", "explosive", "explosives"],
+    "rebel": ["rebels", "rebelled", "rebelling", "rebellion", "rebellious"],
+    "hostage": ["hostages"],
+    "brutal": ["brutally", "brutality"],
+    "torture": ["tortures", "tortured", "torturing"],
+}
+
+# Regression cases for the violence lexicon: text -> keywords it must count, in order
+EXAMPLES = [
+    ("He was stabbed, then stabbing again", ["stab", "stab"]),
+    ("They gunned him down; guns everywhere", ["gun", "gun"]),
+    ("A bloody, warring family", ["blood", "war"]),
+    ("The wars of the killers", ["war", "kill"]),
+    ("Walk toward the award in the hospital ward", []),
+    ("He sells his wares to the warden", []),
+    ("It has begun, said the skilled shotgun owner", []),
+    ("They FOUGHT and Attacked", ["fight", "attack"]),
+]
+
+
+class LexiconMatcher:
+    """Single compiled word-boundary matcher over one or more lexicons.
+
+    Keywords match as whole words in the forms listed in INFLECTIONS, so
+    "war" matches "wars" and "warring" but not "toward", "award" or "ward".
+    Matching is case-insensitive without lowercasing the document.
+    """
+
+    def __init__(self, lexicons=None, inflections=None):
+        lexicons = LEXICONS if lexicons is None else lexicons
+        inflections = INFLECTIONS if inflections is None else inflections
+        self.lexicons = {name: list(dict.fromkeys(w.lower() for w in words))
+                         for name, words in lexicons.items()}
+        self.terms = sorted({w for words in self.lexicons.values() for w in words})
+        self.term_index = {term: i for i, term in enumerate(self.terms)}
+        # Every accepted form -> the column of its keyword
+        self.forms = {}
+        for term in self.terms:
+            for form in [term] + [f.lower() for f in inflections.get(term, [])]:
+                self.forms.setdefault(form, self.term_index[term])
+        # Longest first so overlapping forms prefer the more specific one
+        alternation = "|".join(re.escape(f) for f in sorted(self.forms, key=len, reverse=True))
+        self._regex = re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE)
+
+    def columns(self, lexicon):
+        """Matrix column indices of the terms in one lexicon."""
+        return [self.term_index[t] for t in self.lexicons[lexicon]]
+
+    def hits(self, text):
+        """Term index of every keyword occurrence in `text`, in order."""
+        if not isinstance(text, str):
+            return []
+        return [self.forms[m.group(0).lower()] for m in self._regex.finditer(text)]
+
+    def count_matrix(self, texts):
+        """Per-keyword counts, shape (n_documents, n_terms), one pass per document."""
+        doc_ids, term_ids = [], []
+        n_docs = 0
+        for doc_id, text in enumerate(texts):
+            n_docs += 1
+            found = self.hits(text)
+            doc_ids.extend([doc_id] * len(found))
+            term_ids.extend(found)
+        flat = np.asarray(doc_ids, dtype=np.int64) * len(self.terms) + np.asarray(term_ids, dtype=np.int64)
+        counts = np.bincount(flat, minlength=n_docs * len(self.terms))
+        return counts.reshape(n_docs, len(self.terms)).astype(np.int32)
+
+    def lexicon_counts(self, matrix, lexicon, distinct=False):
+        """Total hits per document for one lexicon, or number of distinct terms hit."""
+        sub = matrix[:, self.columns(lexicon)]
+        return (sub > 0).sum(axis=1) if distinct else sub.sum(axis=1)
+
+
+def check(matcher=None, examples=EXAMPLES):
+    """[(text, expected, found)] for EXAMPLES the matcher gets wrong."""
+    matcher = matcher or LexiconMatcher()
+    failures = []
+    for text, expected in examples:
+        found = [matcher.terms[i] for i in matcher.hits(text)]
+        if found != expected:
+            failures.append((text, expected, found))
+    return failures
+
+
+if __name__ == "__main__":
+    failures = check()
+    for text, expected, found in failures:
+        print(f"❌ {text!r}: expected {expected}, found {found}")
+    if failures:
+        raise SystemExit(1)
+    print(f"✅ All {len(EXAMPLES)} lexicon examples match")
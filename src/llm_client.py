@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from http_replay import RecordingBackend, ReplayBackend, ReplayMiss, http_mode
+from http_utils import TokenBucket, backoff_delay
+from instrumentation import metrics
+from response_cache import ResponseCache
+from structured_output import THEME_LABELS
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+LLM_CACHE_PATH = os.path.join(PROJECT_DIR, "data", "cache", "llm.sqlite")
+
+
+# === Backends ===
+class LLMBackend:
+    """Minimal text-in, text-out model interface used by the coding stages."""
+
+    name = "base"
+
+    def generate(self, prompt):
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    def __init__(self, model_name="models/gemini-2.5-pro", api_key=None):
+        import google.generativeai as genai
+
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("API key not found. Please set GEMINI_API_KEY in your .env file.")
+        genai.configure(api_key=api_key)
+        self.name = model_name
+        self._model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt):
+        return self._model.generate_content(prompt).text.strip()
+
+
+class StubBackend(LLMBackend):
+    """Offline backend: deterministic labels derived from a hash of the prompt.
+
+    Returns the same fenced-JSON shape as Gemini, so the downstream parsing
+    is exercised too. `latency` (seconds) simulates a remote call for
+    throughput tests.
+    """
+
+    def __init__(self, name="stub", latency=0.0):
+        self.name = name
+        self.latency = latency
+
+    def generate(self, prompt):
+        if self.latency:
+            time.sleep(self.latency)
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        result = {theme: labels[digest[i] % len(labels)]
+                  for i, (theme, labels) in enumerate(THEME_LABELS.items())}
+        return "```json\n" + json.dumps(result, indent=2) + "\n```"
+
+
+def make_backend(kind=None, model_name="models/gemini-2.5-pro"):
+    """Backend chosen by `kind` or the LLM_BACKEND env var ("gemini" or "stub").
+
+    Gemini follows HTTP_MODE: its responses are recorded, or replayed
+    without an API key.
+    """
+    kind = kind or os.getenv("LLM_BACKEND", "gemini")
+    if kind == "gemini":
+        mode = http_mode()
+        if mode == "replay":
+            return ReplayBackend(model_name)
+        backend = GeminiBackend(model_name)
+        return RecordingBackend(backend) if mode == "record" else backend
+    if kind == "stub":
+        return StubBackend(latency=float(os.getenv("LLM_STUB_LATENCY", "0")))
+    raise ValueError(f"Unknown LLM backend: {kind}")
+
+
+# === Cached, rate-limited, concurrent classification ===
+def cache_key(model_name, template, text):
+    """Content address of one classification: model, prompt template and input."""
+    h = hashlib.sha256()
+    for part in (model_name, template, text):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class LLMClassifier:
+    """Runs a prompt template over many inputs with bounded concurrency.
+
+    Results are cached by content address, so unchanged inputs are never sent
+    again; calls share one rate limiter and are retried with backoff. With
+    `validate` (a callable that raises on a bad response, e.g.
+    structured_output.parse_response) only responses that pass it are
+    cached, so a malformed answer is sent to the model again next time.
+    """
+
+    def __init__(self, backend, template, cache=None, workers=4, requests_per_second=1.0, max_retries=4,
+                 validate=None):
+        self.backend = backend
+        self.template = template
+        self.validate = validate
+        self.cache = cache if cache is not None else ResponseCache(LLM_CACHE_PATH, ttl=None)
+        self.workers = workers
+        self.bucket = TokenBucket(requests_per_second)
+        self.max_retries = max_retries
+        self.calls = 0
+        self._calls_lock = threading.Lock()
+
+    def prompt(self, text):
+        return self.template.format(text=text)
+
+    def _generate(self, prompt):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                with self._calls_lock:
+                    self.calls += 1
+                with metrics.timed(f"llm:{self.backend.name}"):
+                    return self.backend.generate(prompt)
+            except ReplayMiss:
+                raise
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                metrics.record_retry(f"llm:{self.backend.name}")
+                time.sleep(backoff_delay(attempt, base=2.0))
+
+    def _valid(self, response):
+        try:
+            self.validate(response)
+        except Exception:
+            return False
+        return True
+
+    def classify_one(self, text):
+        key = cache_key(self.backend.name, self.template, text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            if self.validate is None or self._valid(cached):
+                return cached
+            self.cache.delete(key)  # cached before responses were validated
+        result = self._generate(self.prompt(text))
+        if self.validate is not None:
+            self.validate(result)  # raises; an invalid response is not cached
+        self.cache.set(key, result)
+        return result
+
+    def classify_all(self, items):
+        """Classify `items` (key -> text), yielding (key, response text or exception)
+        in completion order."""
+        return self.classify_iter(items.items())
+
+    def classify_iter(self, items, max_pending=None):
+        """Like classify_all, for an iterable of (key, text) pairs.
+
+        Items are pulled from `items` only as results come back, with at most
+        `max_pending` (default 4 per worker) in flight, so a generator over a
+        large corpus is never materialised.
+        """
+        max_pending = max_pending or self.workers * 4
+
+        def run(key, text):
+            try:
+                return key, self.classify_one(text)
+            except Exception as e:
+                return key, e
+
+        items = iter(items)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(run, *item) for item in islice(items, max_pending)}
+            while futures:
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                futures |= {executor.submit(run, *item) for item in islice(items, len(done))}
+                for future in done:
+                    yield future.result()
+
+    def stats(self):
+        return {"model_calls": self.calls, **self.cache.stats()}
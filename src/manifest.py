@@ -0,0 +1,168 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MANIFEST_PATH = os.path.join(PROJECT_DIR, "data", "manifest.sqlite")
+
+DONE = "done"
+FAILED = "failed"
+SUSPECT = "suspect"
+
+
+class Manifest:
+    """Per-stage record of which imdb_ids completed or failed.
+
+    Every status change is committed immediately, so an interrupted run
+    loses at most the movie in flight and a restart only processes ids
+    that are missing or failed.
+    """
+
+    def __init__(self, stage, path=MANIFEST_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.stage = stage
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS manifest ("
+            " stage TEXT NOT NULL,"
+            " imdb_id TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " info TEXT,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (stage, imdb_id))"
+        )
+        self._conn.commit()
+
+    def _set(self, imdb_id, status, error=None, info=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO manifest (stage, imdb_id, status, attempts, error, info, updated_at)"
+                " VALUES (?, ?, ?, 1, ?, ?, ?)"
+                " ON CONFLICT (stage, imdb_id) DO UPDATE SET"
+                " status = excluded.status, attempts = attempts + 1,"
+                " error = excluded.error, info = excluded.info, updated_at = excluded.updated_at",
+                (self.stage, imdb_id, status, error, json.dumps(info) if info else None, time.time()),
+            )
+            self._conn.commit()
+
+    def mark_done(self, imdb_id, **info):
+        self._set(imdb_id, DONE, info=info)
+
+    def mark_failed(self, imdb_id, error):
+        self._set(imdb_id, FAILED, error=str(error))
+
+    def mark_suspect(self, imdb_id, reason, **info):
+        """Completed, but the result looks wrong (kept for review, not retried)."""
+        self._set(imdb_id, SUSPECT, error=str(reason), info=info)
+
+    def statuses(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT imdb_id, status FROM manifest WHERE stage = ?", (self.stage,)
+            ).fetchall()
+        return dict(rows)
+
+    def with_status(self, status):
+        """Ids currently recorded with `status`."""
+        return {imdb_id for imdb_id, s in self.statuses().items() if s == status}
+
+    def info(self, imdb_id):
+        """Details recorded with the last mark_done() for an id, or {}."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT info FROM manifest WHERE stage = ? AND imdb_id = ?", (self.stage, imdb_id)
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] else {}
+
+    def pending(self, imdb_ids, retry_failed=True):
+        """Ids from `imdb_ids` that still need processing, in input order."""
+        statuses = self.statuses()
+        skip = {DONE, SUSPECT} if retry_failed else {DONE, SUSPECT, FAILED}
+        return [i for i in imdb_ids if statuses.get(i) not in skip]
+
+    def seed_from_csv(self, csv_path, key="imdb_id", check=None):
+        """Mark ids already present in a legacy output file as done.
+
+        Only used the first time a stage runs with a manifest, so existing
+        outputs are not fetched again. `check(imdb_id)` can return an error
+        for an existing output that is unusable; that id is seeded as failed
+        instead, so it is fetched again.
+        """
+        if self.statuses() or not os.path.exists(csv_path):
+            return 0
+        ids = pd.read_csv(csv_path, usecols=[key])[key].dropna().unique()
+        rows = []
+        now = time.time()
+        for i in ids:
+            error = check(i) if check is not None else None
+            rows.append((self.stage, i, FAILED if error else DONE, str(error) if error else None, now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO manifest (stage, imdb_id, status, attempts, error, updated_at)"
+                " VALUES (?, ?, ?, 0, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+        return len(ids)
+
+    def summary(self):
+        counts = {}
+        for status in self.statuses().values():
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+
+def ensure_columns(csv_path, columns):
+    """Add any of `columns` missing from an existing CSV as empty values.
+
+    Returns the file's column order afterwards (or `columns` if it is new).
+    """
+    if not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0:
+        return list(columns)
+    header = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    missing = [c for c in columns if c not in header]
+    if missing:
+        df = pd.read_csv(csv_path)
+        df = df.reindex(columns=header + missing)
+        tmp_path = csv_path + ".tmp"
+        df.to_csv(tmp_path, index=False, encoding="utf-8")
+        os.replace(tmp_path, csv_path)
+    return header + missing
+
+
+def append_rows(csv_path, records, columns):
+    """Append records to a CSV, writing the header only when the file is new.
+
+    Rows follow the existing file's column order; columns the file does not
+    have yet are added first, so output schemas can grow between runs.
+    """
+    if not records:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(csv_path)), exist_ok=True)
+    write_header = not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0
+    columns = ensure_columns(csv_path, columns)
+    pd.DataFrame(records, columns=columns).to_csv(
+        csv_path, mode="a", header=write_header, index=False, encoding="utf-8"
+    )
+
+
+def dedupe_csv(csv_path, key="imdb_id"):
+    """Keep the last row per key; rewrites the file only if duplicates exist."""
+    if not os.path.exists(csv_path):
+        return 0
+    keys = pd.read_csv(csv_path, usecols=[key])[key]
+    duplicates = int(keys.duplicated().sum())
+    if duplicates:
+        df = pd.read_csv(csv_path).drop_duplicates(subset=key, keep="last")
+        tmp_path = csv_path + ".tmp"
+        df.to_csv(tmp_path, index=False, encoding="utf-8")
+        os.replace(tmp_path, csv_path)
+    return duplicates
@@ -1,79 +1,138 @@
 import os
-import time
-import requests
 import pandas as pd
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
-from genderize import Genderize  
 
-# --- Load TMDb key ---
-load_dotenv()
-TMDB_API_KEY = os.getenv("TMDB_API_KEY")
-if not TMDB_API_KEY:
-    raise ValueError("TMDB_API_KEY missing in .env")
+from gender_inference import GenderInference
+from http_replay import api_key
+from instrumentation import start_run
+from manifest import Manifest, append_rows, dedupe_csv
+from movie_store import load_sample
+from sharding import in_shard, shard_path, shard_suffix, stage_args
+from tmdb_client import TMDbClient
+from wikipedia import WikipediaClient, box_office, parse_box_office
 
-# --- Load sample movies ---
 PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-df = pd.read_csv(os.path.join(PROJECT_DIR, "data", "sampled", "movies_sampled.csv"))
-
-records = []
-
-for _, row in df.iterrows():
-    imdb_id = row.get("imdb_id")
-    title = row.get("original_title")
-
-    if not imdb_id:
-        continue
-
-    # 1. Fetch TMDb movie (+ credits)
-    url = f"https://api.themoviedb.org/3/find/{imdb_id}"
-    resp = requests.get(url, params={"api_key": TMDB_API_KEY, "external_source": "imdb_id"})
-    movie = resp.json().get("movie_results", [])
-    if not movie:
-        continue
-    tmdb_id = movie[0]["id"]
-
-    details = requests.get(
-        f"https://api.themoviedb.org/3/movie/{tmdb_id}",
-        params={"api_key": TMDB_API_KEY, "append_to_response": "credits"}
-    ).json()
-
-    # Director info
-    director = next((c for c in details.get("credits", {}).get("crew", []) if c.get("job") == "Director"), {})
-    gender_code = director.get("gender", 0)
-    gender = {1: "female", 2: "male"}.get(gender_code, None)
-
-    # Fallback name-based gender inference
-    if not gender and director.get("name"):
-        iso = Genderize().get([director["name"]])[0]
-        gender = iso["gender"]
-
-    # 2. Attempt box office via Wikipedia scraping
-    wiki = row.get("wiki_link")
-    box_office = None
-    if isinstance(wiki, str):
-        try:
-            resp2 = requests.get(wiki)
-            soup = BeautifulSoup(resp2.text, "html.parser")
-            header = soup.find(lambda tag: tag.name == "th" and "Box office" in tag.text)
-            if header:
-                val = header.find_next_sibling("td").text.strip()
-                box_office = val.replace("\n", " ")
-        except Exception:
-            box_office = None
-
-    records.append({
-        "imdb_id": imdb_id,
-        "title": title,
-        "director": director.get("name"),
-        "director_gender": gender,
-        "box_office": box_office or ""
-    })
-
-    time.sleep(1.5)
-
-# Save to CSV
-out = os.path.join(PROJECT_DIR, "data", "metadata", "metadata_extended.csv")
-os.makedirs(os.path.dirname(out), exist_ok=True)
-pd.DataFrame(records).to_csv(out, index=False)
-print("✅ Extended metadata saved:", out)
+
+# Movies fetched, gender-resolved and checkpointed together; an interrupted
+# run loses at most one batch
+BATCH_SIZE = int(os.getenv("METADATA_BATCH", "20"))
+
+load_dotenv()
+
+
+def complete_batch(records, genders, out, columns, manifest):
+    """Name-based gender for a batch's directors TMDb has no gender for, then append and checkpoint it."""
+    unresolved = [r["director"] for r in records if not r["director_gender"] and r["director"]]
+    try:
+        inferred = genders.infer(unresolved)
+    except Exception as e:
+        print(f"⚠️ Gender inference failed: {e}")
+        inferred = {}
+    for record in records:
+        guess = inferred.get(record["director"]) if not record["director_gender"] else None
+        if guess:
+            record["director_gender"] = guess["gender"]
+            record["director_gender_probability"] = guess["probability"]
+            record["director_gender_source"] = guess["source"]
+        elif record["director_gender"]:
+            record["director_gender_source"] = "tmdb"
+
+    append_rows(out, records, columns)
+    for record in records:
+        manifest.mark_done(record["imdb_id"])
+
+
+def main(argv=None):
+    shard = stage_args("Fetch director and box office metadata for the sampled movies.", argv).shard
+
+    # --- Load TMDb key ---
+    TMDB_API_KEY = api_key("TMDB_API_KEY")
+
+    # --- Per-host latency, retries and stage timings are reported in data/reports/ ---
+    run = start_run("metadata" + shard_suffix(shard))
+
+    # --- Load sample movies ---
+    df = load_sample(["imdb_id", "original_title", "wiki_link"])
+    df = df[[in_shard(imdb_id, shard) for imdb_id in df["imdb_id"]]]
+
+    tmdb = TMDbClient(TMDB_API_KEY)
+    genders = GenderInference()
+    wiki = WikipediaClient(workers=int(os.getenv("WIKI_WORKERS", "4")))
+
+    # --- Resume from the manifest; rows are appended as each batch completes ---
+    out = shard_path(os.path.join(PROJECT_DIR, "data", "metadata", "metadata_extended.csv"), shard)
+    BOX_OFFICE_COLUMNS = ["box_office_inr", "box_office_usd", "box_office_estimate"]
+    CSV_COLUMNS = ["imdb_id", "title", "director", "director_gender", "box_office"] + BOX_OFFICE_COLUMNS + [
+        "director_gender_probability", "director_gender_source"]
+    manifest = Manifest("metadata")
+    manifest.seed_from_csv(out)
+    pending = set(manifest.pending(df["imdb_id"].dropna().tolist()))
+
+    # --- Rows written before box office was normalised get numeric values from their raw strings ---
+    if os.path.exists(out):
+        existing = pd.read_csv(out)
+        if not set(BOX_OFFICE_COLUMNS) <= set(existing.columns):
+            parsed = pd.DataFrame([parse_box_office(v) for v in existing["box_office"]], index=existing.index)
+            existing[BOX_OFFICE_COLUMNS] = parsed[BOX_OFFICE_COLUMNS]
+            existing.to_csv(out, index=False, encoding="utf-8")
+
+    # --- Fetch the infoboxes of all pending movies up front, concurrently and cached by revision ---
+    wiki_links = df.loc[df["imdb_id"].isin(pending), "wiki_link"].dropna().unique().tolist()
+    try:
+        infoboxes = wiki.infoboxes(wiki_links)
+    except Exception as e:
+        print(f"⚠️ Wikipedia lookup failed: {e}")
+        infoboxes = {}
+
+    # --- TMDb details and Wikipedia box office per movie (both cached), gender and checkpoint per batch ---
+    records = []
+    for _, row in df.iterrows():
+        imdb_id = row.get("imdb_id")
+        title = row.get("original_title")
+
+        if not imdb_id or imdb_id not in pending:
+            continue
+
+        # 1. Fetch TMDb movie (+ credits)
+        movie = tmdb.find_movie(imdb_id)
+        if not movie:
+            manifest.mark_failed(imdb_id, "no TMDb match")
+            continue
+
+        details = tmdb.movie_details(movie["id"]) or {}
+
+        # Director info
+        director = next((c for c in details.get("credits", {}).get("crew", []) if c.get("job") == "Director"), {})
+        gender_code = director.get("gender", 0)
+        gender = {1: "female", 2: "male"}.get(gender_code, None)
+
+        # 2. Box office from the Wikipedia infobox, raw and normalised to INR / USD
+        money = box_office(infoboxes.get(row.get("wiki_link")))
+
+        records.append({
+            "imdb_id": imdb_id,
+            "title": title,
+            "director": director.get("name"),
+            "director_gender": gender,
+            **money,
+            "box_office": money["box_office"] or "",
+        })
+        if len(records) >= BATCH_SIZE:
+            complete_batch(records, genders, out, CSV_COLUMNS, manifest)
+            records = []
+
+    if records:
+        complete_batch(records, genders, out, CSV_COLUMNS, manifest)
+
+    # Drop rows superseded by a retry
+    dedupe_csv(out)
+    print("✅ Extended metadata saved:", out)
+    print("🗄️ TMDb cache:", tmdb.stats())
+    print("🗄️ Wikipedia cache:", wiki.stats())
+    print("🗄️ Gender cache:", genders.stats())
+    print("📋 Manifest:", manifest.summary())
+    print("📊 Run report:", run.finish(manifest=manifest.summary(), tmdb_cache=tmdb.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_DIR = os.path.join(PROJECT_DIR, "data")
+STORE_PATH = os.path.join(DATA_DIR, "movies.sqlite")
+SAMPLE_PATH = os.path.join(DATA_DIR, "sampled", "movies_sampled.csv")
+
+# Source CSVs and the typed columns each contributes (SQLite type affinity)
+SOURCES = {
+    "bollywood_2010-2019.csv": {
+        "title": ("wiki_title", "TEXT"),
+        "poster_path": ("poster_path", "TEXT"),
+        "wiki_link": ("wiki_link", "TEXT"),
+    },
+    "bollywood_meta_2010-2019.csv": {
+        "title": ("title", "TEXT"),
+        "original_title": ("original_title", "TEXT"),
+        "is_adult": ("is_adult", "INTEGER"),
+        "year_of_release": ("year_of_release", "INTEGER"),
+        "runtime": ("runtime", "INTEGER"),
+        "genres": ("genres", "TEXT"),
+    },
+    "bollywood_ratings_2010-2019.csv": {
+        "imdb_rating": ("imdb_rating", "REAL"),
+        "imdb_votes": ("imdb_votes", "INTEGER"),
+    },
+    "bollywood_text_2010-2019.csv": {
+        "story": ("story", "TEXT"),
+        "summary": ("summary", "TEXT"),
+        "tagline": ("tagline", "TEXT"),
+        "actors": ("actors", "TEXT"),
+        "wins_nominations": ("wins_nominations", "TEXT"),
+        "release_date": ("release_date", "TEXT"),
+    },
+}
+BASE_SOURCE = "bollywood_2010-2019.csv"
+
+# pandas dtypes applied when reading back
+DTYPES = {
+    "is_adult": "boolean",
+    "year_of_release": "Int64",
+    "runtime": "Int64",
+    "imdb_rating": "Float64",
+    "imdb_votes": "Int64",
+    "genres": "category",
+}
+
+COLUMNS = ["imdb_id"] + [name for cols in SOURCES.values() for name, _ in cols.values()]
+CHUNK_SIZE = 50_000
+
+
+def _clean_chunk(chunk, columns):
+    chunk = chunk[chunk["imdb_id"].notna()].drop_duplicates("imdb_id")
+    out = pd.DataFrame({"imdb_id": chunk["imdb_id"]})
+    for src, (name, sql_type) in columns.items():
+        values = chunk[src] if src in chunk else pd.Series(None, index=chunk.index)
+        if sql_type in ("INTEGER", "REAL"):
+            values = pd.to_numeric(values, errors="coerce")
+            if sql_type == "INTEGER":
+                values = values.round().astype("Int64")
+        out[name] = values
+    # Plain Python values, with NaN/NA as None so SQLite stores NULL
+    out = out.astype(object).where(out.notna(), None)
+    return list(out.itertuples(index=False, name=None))
+
+
+def build_store(path=STORE_PATH, data_dir=DATA_DIR):
+    """Build the typed movie store from the four source CSVs.
+
+    Each CSV is streamed in chunks into its own staging table keyed by
+    imdb_id (first occurrence wins; rows without an id are dropped), and the
+    final `movies` table is produced by indexed joins inside SQLite, so
+    memory use does not grow with the size of the source files. Genres are
+    also normalised into `movie_genres` (one row per movie and genre).
+    """
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+
+    for i, (filename, columns) in enumerate(SOURCES.items()):
+        table = f"src_{i}"
+        defs = ", ".join(f"{name} {sql_type}" for name, sql_type in columns.values())
+        conn.execute(f"CREATE TEMP TABLE {table} (imdb_id TEXT PRIMARY KEY, {defs})")
+        placeholders = ", ".join("?" * (len(columns) + 1))
+        reader = pd.read_csv(os.path.join(data_dir, filename), na_values=["\\N"],
+                             keep_default_na=True, chunksize=CHUNK_SIZE)
+        for chunk in reader:
+            conn.executemany(f"INSERT OR IGNORE INTO {table} VALUES ({placeholders})",
+                             _clean_chunk(chunk, columns))
+
+    defs = ", ".join(f"{name} {sql_type}" for cols in SOURCES.values() for name, sql_type in cols.values())
+    conn.execute(f"CREATE TABLE movies (imdb_id TEXT PRIMARY KEY, {defs})")
+    base = list(SOURCES).index(BASE_SOURCE)
+    joins = " ".join(f"LEFT JOIN src_{i} USING (imdb_id)" for i in range(len(SOURCES)) if i != base)
+    conn.execute(f"INSERT INTO movies SELECT {', '.join(COLUMNS)} FROM src_{base} {joins} ORDER BY src_{base}.rowid")
+
+    conn.execute("CREATE TABLE movie_genres (imdb_id TEXT NOT NULL, genre TEXT NOT NULL, "
+                 "PRIMARY KEY (imdb_id, genre))")
+    rows = conn.execute("SELECT imdb_id, genres FROM movies WHERE genres IS NOT NULL")
+    conn.executemany("INSERT OR IGNORE INTO movie_genres VALUES (?, ?)",
+                     ((imdb_id, g) for imdb_id, genres in rows.fetchall() for g in genres.split("|") if g))
+    conn.execute("CREATE INDEX movie_genres_genre ON movie_genres (genre)")
+    conn.execute("CREATE INDEX movies_year ON movies (year_of_release)")
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, path)
+    return path
+
+
+def _is_stale(path, data_dir):
+    if not os.path.exists(path):
+        return True
+    built = os.path.getmtime(path)
+    return any(os.path.getmtime(os.path.join(data_dir, f)) > built for f in SOURCES)
+
+
+def connect(path=STORE_PATH, data_dir=DATA_DIR):
+    """Connection to the store, (re)building it if missing or older than its sources."""
+    if _is_stale(path, data_dir):
+        build_store(path, data_dir)
+    return sqlite3.connect(path)
+
+
+def _typed(df):
+    for column, dtype in DTYPES.items():
+        if column in df:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def load_movies(columns=None, imdb_ids=None, path=STORE_PATH):
+    """Movies as a typed DataFrame, reading only `columns` for `imdb_ids`.
+
+    With `imdb_ids` the rows come back in the order of the ids given
+    (unknown ids are skipped).
+    """
+    columns = list(columns) if columns else COLUMNS
+    unknown = set(columns) - set(COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown movie columns: {sorted(unknown)}")
+    select = ", ".join(f"m.{c}" for c in columns)
+
+    with closing(connect(path)) as conn:
+        if imdb_ids is None:
+            return _typed(pd.read_sql_query(f"SELECT {select} FROM movies m ORDER BY m.rowid", conn))
+        # Id filter via an indexed join, which scales past SQLite's bound-parameter limit
+        conn.execute("CREATE TEMP TABLE wanted (pos INTEGER PRIMARY KEY, imdb_id TEXT)")
+        conn.executemany("INSERT INTO wanted (imdb_id) VALUES (?)", ((i,) for i in imdb_ids))
+        df = pd.read_sql_query(
+            f"SELECT {select} FROM wanted w JOIN movies m ON m.imdb_id = w.imdb_id ORDER BY w.pos", conn)
+        return _typed(df)
+
+
+def load_genres(imdb_ids=None, path=STORE_PATH):
+    """Long (imdb_id, genre) table with a categorical genre column."""
+    with closing(connect(path)) as conn:
+        df = pd.read_sql_query("SELECT imdb_id, genre FROM movie_genres", conn)
+    if imdb_ids is not None:
+        df = df[df["imdb_id"].isin(set(imdb_ids))]
+    df["genre"] = df["genre"].astype("category")
+    return df.reset_index(drop=True)
+
+
+def sample_ids(sample_path=SAMPLE_PATH):
+    """imdb_ids of the current sample, in sample order, without duplicates."""
+    ids = pd.read_csv(sample_path, usecols=["imdb_id"])["imdb_id"].dropna()
+    return ids.drop_duplicates().tolist()
+
+
+def load_sample(columns=None, sample_path=SAMPLE_PATH, path=STORE_PATH):
+    """Projected store rows for the sampled movies."""
+    return load_movies(columns, imdb_ids=sample_ids(sample_path), path=path)
+
+
+if __name__ == "__main__":
+    build_store()
+    with closing(sqlite3.connect(STORE_PATH)) as conn:
+        n = conn.execute("SELECT COUNT(*) FROM movies").fetchone()[0]
+    print(f"✅ Movie store with {n} movies saved to: {STORE_PATH}")
@@ -0,0 +1,247 @@
+"""Flag downloaded subtitles that are probably the wrong film.
+
+Two checks, both linear in the number of films:
+  near-duplicates  MinHash signatures of word shingles, bucketed with LSH, so
+                   only films that share a band are compared
+  plot fit         TF-IDF cosine between the dialogue and the film's own OMDb
+                   plot + Kaggle story/summary, ranked against DECOYS other
+                   films' plots; a dialogue that fits its own plot no better
+                   than most strangers' is flagged
+
+Results go to data/subtitles/subtitle_checks.csv, and every film is recorded
+in the manifest under the "subtitle_checks" stage as done or suspect.
+thematic_coding.py leaves the dialogue of suspect films out of its prompts.
+
+    python src/near_duplicates.py
+"""
+import argparse
+import math
+import os
+import random
+import zlib
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from corpus import DESCRIPTIONS_PATH, load_plots
+from cue_store import CUE_STORE_PATH, iter_dialogue
+from manifest import SUSPECT, Manifest
+from movie_store import load_movies
+from text_index import tokenize
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CHECKS_PATH = os.path.join(PROJECT_DIR, "data", "subtitles", "subtitle_checks.csv")
+CHECK_STAGE = "subtitle_checks"
+
+SHINGLE_SIZE = 5  # words per shingle
+NUM_PERM = 128
+BANDS = 32  # 4 rows per band: pairs with Jaccard ~0.4 and up usually share a bucket
+DUPLICATE_JACCARD = 0.5
+DECOYS = 20  # other films' plots each dialogue is also scored against
+FIT_RANK = 0.5  # share of decoys the film's own plot must beat
+MERSENNE = (1 << 32) + 15  # prime just above 2**32; a * x + b stays below 2**64
+
+
+# === MinHash / LSH ===
+def shingle_hashes(text, k=SHINGLE_SIZE):
+    """Distinct 32-bit hashes (crc32, stable across runs) of the k-word shingles of `text`."""
+    tokens = tokenize(text)
+    if len(tokens) < k:
+        return np.array([zlib.crc32(" ".join(tokens).encode("utf-8"))] if tokens else [], dtype=np.uint64)
+    hashes = {zlib.crc32(" ".join(tokens[i:i + k]).encode("utf-8")) for i in range(len(tokens) - k + 1)}
+    return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+
+class MinHasher:
+    """NUM_PERM universal hash functions (a * x + b) mod p, applied with NumPy."""
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signature(self, hashes, chunk=4_096):
+        """Minimum of each hash function over the shingles; all-max for an empty set."""
+        signature = np.full(self.num_perm, MERSENNE, dtype=np.uint64)
+        for start in range(0, len(hashes), chunk):
+            x = hashes[start:start + chunk, None]
+            values = (x * self.a + self.b) % MERSENNE
+            np.minimum(signature, values.min(axis=0), out=signature)
+        return signature
+
+
+class LSHIndex:
+    """Band the signatures and bucket identical bands together."""
+
+    def __init__(self, num_perm=NUM_PERM, bands=BANDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = defaultdict(list)
+        self.signatures = {}
+
+    def add(self, key, signature):
+        self.signatures[key] = signature
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            self.buckets[(band, chunk.tobytes())].append(key)
+
+    def candidates(self):
+        """Pairs of keys that share at least one band."""
+        pairs = set()
+        for keys in self.buckets.values():
+            if len(keys) > 1:
+                pairs.update((a, b) if a < b else (b, a) for i, a in enumerate(keys) for b in keys[i + 1:])
+        return pairs
+
+    def similarity(self, a, b):
+        """Estimated Jaccard similarity: the share of hash functions whose minima agree."""
+        return float(np.mean(self.signatures[a] == self.signatures[b]))
+
+    def near_duplicates(self, threshold=DUPLICATE_JACCARD):
+        """[(a, b, jaccard)] for candidate pairs at or above `threshold`, most similar first."""
+        pairs = [(a, b, self.similarity(a, b)) for a, b in self.candidates()]
+        return sorted((p for p in pairs if p[2] >= threshold), key=lambda p: -p[2])
+
+
+# === Plot fit ===
+def tfidf_vector(counts, df, n_docs):
+    """Unit-length TF-IDF weights (sublinear tf, smoothed idf) of a term-count dict."""
+    weights = {t: (1 + math.log(c)) * math.log((1 + n_docs) / (1 + df[t])) for t, c in counts.items()}
+    norm = math.sqrt(sum(w * w for w in weights.values()))
+    return {t: w / norm for t, w in weights.items()} if norm else {}
+
+
+def cosine(a, b):
+    """Cosine of two unit-length sparse vectors."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(t, 0.0) for t, w in a.items())
+
+
+def decoys(imdb_id, pool, n=DECOYS):
+    """`n` other films to score the dialogue against, the same ones on every run."""
+    others = [other for other in pool if other != imdb_id]
+    return random.Random(zlib.crc32(imdb_id.encode("utf-8"))).sample(others, min(n, len(others)))
+
+
+def reference_texts(imdb_ids=None, descriptions_path=DESCRIPTIONS_PATH):
+    """{imdb_id: OMDb plot + Kaggle story + summary}, what the dialogue should be about."""
+    texts = {imdb_id: plot for imdb_id, (_, plot) in load_plots(descriptions_path, imdb_ids).items()}
+    try:
+        movies = load_movies(["imdb_id", "story", "summary"], imdb_ids=imdb_ids)
+    except Exception as e:
+        print(f"⚠️ Movie store unavailable, plot fit uses OMDb plots only: {e}")
+        movies = pd.DataFrame(columns=["imdb_id", "story", "summary"])
+    for imdb_id, story, summary in movies.itertuples(index=False):
+        parts = [texts.get(imdb_id, "")] + [t for t in (story, summary) if isinstance(t, str)]
+        texts[imdb_id] = "\n".join(p for p in parts if p)
+    return texts
+
+
+# === Checks ===
+def check_subtitles(cue_path=CUE_STORE_PATH, references=None, threshold=DUPLICATE_JACCARD, fit_rank=FIT_RANK):
+    """One row per film with dialogue: near-duplicate matches, plot fit and the suspect verdict.
+
+    Streams the cue store twice: once for signatures and document
+    frequencies, once to score each film against its reference text and its
+    decoys. Only the signatures, the vocabulary counts and the reference
+    vectors are kept; dialogue is held one film at a time.
+    """
+    hasher, index = MinHasher(), LSHIndex()
+    df, n_docs, shingles = Counter(), 0, {}
+
+    for imdb_id, dialogue in iter_dialogue(path=cue_path):
+        hashes = shingle_hashes(dialogue)
+        shingles[imdb_id] = len(hashes)
+        if len(hashes):
+            index.add(imdb_id, hasher.signature(hashes))
+        df.update(set(tokenize(dialogue)))
+        n_docs += 1
+
+    references = reference_texts(list(shingles)) if references is None else references
+    references = {imdb_id: Counter(tokenize(text)) for imdb_id, text in references.items()}
+    references = {imdb_id: counts for imdb_id, counts in references.items() if counts}
+    for counts in references.values():
+        df.update(counts.keys())
+        n_docs += 1
+    vectors = {imdb_id: tfidf_vector(counts, df, n_docs) for imdb_id, counts in references.items()}
+    pool = sorted(vectors)
+
+    fit = {}
+    for imdb_id, dialogue in iter_dialogue(path=cue_path):
+        if imdb_id not in vectors or not shingles[imdb_id]:
+            fit[imdb_id] = (None, None)
+            continue
+        vector = tfidf_vector(Counter(tokenize(dialogue)), df, n_docs)
+        own = cosine(vector, vectors[imdb_id])
+        others = [cosine(vector, vectors[other]) for other in decoys(imdb_id, pool)]
+        fit[imdb_id] = (own, sum(own > score for score in others) / len(others) if others else None)
+
+    matches = defaultdict(list)
+    for a, b, jaccard in index.near_duplicates(threshold):
+        matches[a].append((b, jaccard))
+        matches[b].append((a, jaccard))
+
+    rows = []
+    for imdb_id in shingles:
+        score, rank = fit[imdb_id]
+        reasons = [f"near-duplicate of {other} (J={j:.2f})" for other, j in matches[imdb_id]]
+        if rank is not None and rank < fit_rank:
+            reasons.append(f"dialogue fits its plot better than only {rank:.0%} of other films' plots")
+        best = max(matches[imdb_id], key=lambda m: m[1], default=(None, None))
+        rows.append({
+            "imdb_id": imdb_id,
+            "shingles": shingles[imdb_id],
+            "duplicate_of": best[0],
+            "duplicate_jaccard": round(best[1], 3) if best[1] is not None else None,
+            "plot_fit": round(score, 4) if score is not None else None,
+            "plot_fit_rank": rank,
+            "suspect": bool(reasons),
+            "reasons": "; ".join(reasons),
+        })
+    return pd.DataFrame(rows, columns=["imdb_id", "shingles", "duplicate_of", "duplicate_jaccard",
+                                       "plot_fit", "plot_fit_rank", "suspect", "reasons"])
+
+
+def record_checks(checks, manifest=None):
+    """Record each film as done or suspect in the manifest."""
+    manifest = manifest if manifest is not None else Manifest(CHECK_STAGE)
+    for row in checks.itertuples(index=False):
+        info = {"plot_fit": row.plot_fit, "plot_fit_rank": row.plot_fit_rank, "duplicate_of": row.duplicate_of}
+        if row.suspect:
+            manifest.mark_suspect(row.imdb_id, row.reasons, **info)
+        else:
+            manifest.mark_done(row.imdb_id, **info)
+    return manifest
+
+
+def suspect_ids(manifest=None):
+    """imdb_ids whose subtitles were flagged by the last check."""
+    manifest = manifest if manifest is not None else Manifest(CHECK_STAGE)
+    return manifest.with_status(SUSPECT)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flag near-duplicate and mismatched subtitles.")
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_JACCARD,
+                        help="estimated Jaccard similarity that counts as a near-duplicate")
+    parser.add_argument("--fit-rank", type=float, default=FIT_RANK,
+                        help="share of other films' plots the dialogue must fit worse than its own")
+    args = parser.parse_args(argv)
+
+    checks = check_subtitles(threshold=args.threshold, fit_rank=args.fit_rank)
+    checks.to_csv(CHECKS_PATH, index=False, encoding="utf-8")
+    manifest = record_checks(checks)
+    print(f"🔍 {int(checks['suspect'].sum())} of {len(checks)} subtitles flagged as suspect")
+    for row in checks[checks["suspect"]].itertuples(index=False):
+        print(f"⚠️ {row.imdb_id}: {row.reasons}")
+    print(f"✅ Subtitle checks saved to: {CHECKS_PATH}")
+    print(f"📋 Manifest: {manifest.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""Run the pipeline stages in dependency order, skipping stages that are up to date.
+
+A stage is up to date when its outputs exist and the hash of its inputs
+(file contents, its script and the local modules that script imports, and
+the environment variables it reads) matches the hash recorded after its
+last successful run. Stages whose dependencies are done run concurrently,
+so the network-bound fetch stages overlap.
+
+    python src/pipeline.py                   # everything that is stale
+    python src/pipeline.py thematic_clean    # a stage and whatever it needs
+    python src/pipeline.py --dry-run
+    python src/pipeline.py subtitles --force
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from aggregate_cube import TRENDS
+from movie_store import SOURCES
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
+DATA_DIR = os.path.join(PROJECT_DIR, "data")
+STATE_PATH = os.path.join(DATA_DIR, "pipeline_state.json")
+LOG_DIR = os.path.join(DATA_DIR, "logs")
+
+SAMPLE_CSV = os.path.join("data", "sampled", "movies_sampled.csv")
+CUES = os.path.join("data", "subtitles", "cues.parquet")
+DESCRIPTIONS_CSV = os.path.join("data", "descriptions", "descriptions_all.csv")
+SUBTITLE_CHECKS_CSV = os.path.join("data", "subtitles", "subtitle_checks.csv")
+THEMATIC_CSV = os.path.join("data", "thematic_coding.csv")
+THEMATIC_CLEAN_CSV = os.path.join("data", "thematic_coding_clean.csv")
+VIOLENCE_CSV = os.path.join("data", "violence_measure.csv")
+METADATA_CSV = os.path.join("data", "metadata", "metadata_extended.csv")
+TREND_CSVS = [os.path.join("data", "aggregates", f"{name}.csv") for name in TRENDS]
+
+IMPORT_RE = re.compile(r"^\s*(?:from|import)\s+(\w+)", re.MULTILINE)
+
+
+class Stage:
+    """One pipeline step: a script, the stages it needs, and the files it reads and writes.
+
+    Paths are relative to the project root, where every stage is run.
+    """
+
+    def __init__(self, name, script, deps=(), inputs=(), outputs=(), env=(), args=()):
+        self.name = name
+        self.script = script
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.env = list(env)
+        self.args = list(args)
+
+    def command(self):
+        if self.script.endswith(".R"):
+            return ["Rscript", self.script, *self.args]
+        return [sys.executable, self.script, *self.args]
+
+    def available(self):
+        return not self.script.endswith(".R") or shutil.which("Rscript") is not None
+
+
+def _stages():
+    fetch_env = ["SUBTITLE_WORKERS", "SUBTITLE_RPS", "POSTER_RPS", "POSTER_REFRESH",
+                 "WIKI_WORKERS", "GENDER_BACKEND"]
+    text_inputs = [CUES, DESCRIPTIONS_CSV, SAMPLE_CSV]
+    preclassifier = os.path.join("data", "models", "preclassifier.joblib")
+    return [
+        Stage("sample", "src/sampled_movies.py",
+              inputs=[os.path.join("data", f) for f in SOURCES],
+              outputs=[SAMPLE_CSV]),
+        Stage("subtitles", "src/subtitles.py", ["sample"], [SAMPLE_CSV], [CUES], fetch_env),
+        Stage("descriptions", "src/description.py", ["sample"], [SAMPLE_CSV], [DESCRIPTIONS_CSV], fetch_env),
+        Stage("posters", "src/poster.py", ["sample"], [SAMPLE_CSV],
+              [os.path.join("data", "posters", "posters_all.csv")], fetch_env),
+        Stage("metadata", "src/metadata.py", ["sample"], [SAMPLE_CSV],
+              [METADATA_CSV], fetch_env),
+        Stage("subtitle_checks", "src/near_duplicates.py", ["subtitles", "descriptions"], text_inputs,
+              [SUBTITLE_CHECKS_CSV]),
+        Stage("thematic_coding", "src/thematic_coding.py", ["subtitles", "descriptions", "subtitle_checks"],
+              text_inputs + [SUBTITLE_CHECKS_CSV, preclassifier],
+              [THEMATIC_CSV], ["LLM_BACKEND", "CHUNK_TOKEN_BUDGET", "CHUNK_STRATEGY", "CHUNK_MAX_WINDOWS",
+                               "PRECLASSIFY", "PRECLASSIFY_THRESHOLD", "SUSPECT_SUBTITLES"]),
+        Stage("violence", "src/proposed_sentiment.py", ["subtitles", "descriptions"], text_inputs,
+              [VIOLENCE_CSV]),
+        Stage("timeline", "src/timeline.py", ["subtitles"],
+              [CUES, os.path.join("data", "bollywood_meta_2010-2019.csv")],
+              [os.path.join("data", "timeline", f) for f in ("timeline.npz", "timeline_summary.csv")]),
+        Stage("thematic_clean", "src/thematic_clean.py", ["thematic_coding", "sample"],
+              [THEMATIC_CSV, SAMPLE_CSV], [THEMATIC_CLEAN_CSV]),
+        Stage("aggregate_cube", "src/aggregate_cube.py", ["thematic_clean", "violence", "metadata"],
+              [THEMATIC_CLEAN_CSV, VIOLENCE_CSV, METADATA_CSV],
+              [os.path.join("data", "aggregates", "cube.npz")] + TREND_CSVS),
+        Stage("aggregates", "src/visualisation.R", ["aggregate_cube"], TREND_CSVS,
+              [os.path.join("data", f"theme_{p}.png")
+               for p in ("frequency", "sentiment_breakdown", "sentiment_over_time")]),
+    ]
+
+
+STAGES = {stage.name: stage for stage in _stages()}
+
+
+# === Hashing ===
+def _abs(path):
+    return os.path.join(PROJECT_DIR, path)
+
+
+def file_digest(path, known=None):
+    """sha256 of a file (or of every file under a directory), reusing `known` digests
+    when size and mtime are unchanged so large inputs are not re-read."""
+    full = _abs(path)
+    if os.path.isdir(full):
+        h = hashlib.sha256()
+        for root, _, files in sorted(os.walk(full)):
+            for name in sorted(files):
+                rel = os.path.relpath(os.path.join(root, name), PROJECT_DIR)
+                h.update(rel.encode("utf-8") + file_digest(rel, known).encode("ascii"))
+        return h.hexdigest()
+    if not os.path.exists(full):
+        return "missing"
+
+    stat = os.stat(full)
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    if known is not None and known.get(path, {}).get("stamp") == stamp:
+        return known[path]["sha256"]
+    h = hashlib.sha256()
+    with open(full, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    if known is not None:
+        known[path] = {"stamp": stamp, "sha256": h.hexdigest()}
+    return h.hexdigest()
+
+
+def code_files(script):
+    """The stage script plus every module in src/ it imports, directly or indirectly."""
+    seen, todo = [], [script]
+    while todo:
+        path = todo.pop()
+        if path in seen:
+            continue
+        seen.append(path)
+        if not path.endswith(".py"):
+            continue
+        with open(_abs(path), encoding="utf-8") as f:
+            for module in IMPORT_RE.findall(f.read()):
+                candidate = f"src/{module}.py"
+                if os.path.exists(_abs(candidate)):
+                    todo.append(candidate)
+    return sorted(seen)
+
+
+def stage_hash(stage, known=None):
+    h = hashlib.sha256()
+    for path in code_files(stage.script) + stage.inputs:
+        h.update(f"{path}={file_digest(path, known)}\n".encode("utf-8"))
+    for name in stage.env:
+        h.update(f"${name}={os.getenv(name, '')}\n".encode("utf-8"))
+    h.update(json.dumps(stage.args).encode("utf-8"))
+    return h.hexdigest()
+
+
+# === State: last successful hash per stage, plus a digest cache for input files ===
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {"stages": {}, "files": {}}
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    state.setdefault("stages", {})
+    state.setdefault("files", {})
+    return state
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_stale(stage, state, current_hash):
+    if any(not os.path.exists(_abs(p)) for p in stage.outputs):
+        return True
+    return state["stages"].get(stage.name, {}).get("hash") != current_hash
+
+
+# === Planning and running ===
+def select(targets):
+    """The targets and everything upstream of them, in dependency order."""
+    wanted = set()
+
+    def visit(name):
+        if name not in wanted:
+            wanted.add(name)
+            for dep in STAGES[name].deps:
+                visit(dep)
+
+    for name in targets or STAGES:
+        visit(name)
+    return [name for name in STAGES if name in wanted]
+
+
+def run_stage(stage, log_dir=LOG_DIR):
+    """Run one stage as a subprocess from the project root, logging its output."""
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f"{stage.name}.log")
+    env = {**os.environ, "PYTHONIOENCODING": "utf-8"}
+    started = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.run(stage.command(), cwd=PROJECT_DIR, env=env,
+                              stdout=log, stderr=subprocess.STDOUT)
+    return proc.returncode, time.perf_counter() - started, log_path
+
+
+def run_pipeline(targets=None, force=False, jobs=4, dry_run=False, state_path=STATE_PATH):
+    """Run stale stages, each as soon as its dependencies are done; returns {stage: status}."""
+    order = select(targets)
+    forced = set(order) if force is True else set(force or ())
+    state = load_state(state_path)
+    status = {}
+    pending = list(order)
+    running = {}
+
+    def ready(name):
+        return all(status.get(dep) in ("ok", "up to date") for dep in STAGES[name].deps if dep in order)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            for name in list(pending):
+                stage = STAGES[name]
+                deps = [status.get(d) for d in stage.deps if d in order]
+                if any(s in ("failed", "blocked", "unavailable") for s in deps):
+                    status[name] = "blocked"
+                    pending.remove(name)
+                    print(f"⛔ {name}: blocked by an upstream failure")
+                    continue
+                if dry_run and any(s == "would run" for s in deps):
+                    status[name] = "would run"
+                    pending.remove(name)
+                    print(f"🔜 {name}: would run (upstream changes)")
+                    continue
+                if not ready(name):
+                    continue
+
+                pending.remove(name)
+                current = stage_hash(stage, state["files"])
+                outputs_exist = all(os.path.exists(_abs(p)) for p in stage.outputs)
+                if (name not in forced and name not in state["stages"] and outputs_exist
+                        and all(s == "up to date" for s in deps)):
+                    # First run of the runner: outputs made by hand are taken as current
+                    # rather than redone (a rerun of sample would redraw the sample)
+                    state["stages"][name] = {"hash": current, "finished_at": None, "seconds": None}
+                    status[name] = "up to date"
+                    print(f"📌 {name}: existing outputs recorded as up to date")
+                elif name not in forced and not is_stale(stage, state, current):
+                    status[name] = "up to date"
+                    print(f"✔️ {name}: up to date")
+                elif not stage.available():
+                    status[name] = "unavailable"
+                    print(f"⚠️ {name}: skipped, {stage.command()[0]} not found")
+                elif dry_run:
+                    status[name] = "would run"
+                    print(f"🔜 {name}: would run")
+                else:
+                    print(f"▶️ {name}: {' '.join(stage.command())}")
+                    running[executor.submit(run_stage, stage)] = (name, current)
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, current = running.pop(future)
+                returncode, seconds, log_path = future.result()
+                if returncode == 0:
+                    status[name] = "ok"
+                    state["stages"][name] = {"hash": current, "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                             "seconds": round(seconds, 1)}
+                    save_state(state, state_path)
+                    print(f"✅ {name}: done in {seconds:.1f}s")
+                else:
+                    status[name] = "failed"
+                    print(f"❌ {name}: exit code {returncode} after {seconds:.1f}s, see {log_path}")
+
+    if not dry_run:
+        save_state(state, state_path)
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the pipeline stages that are out of date.")
+    parser.add_argument("targets", nargs="*",
+                        help="stages to bring up to date, with their upstream stages (default: all)")
+    parser.add_argument("--force", nargs="*", metavar="STAGE",
+                        help="rerun these stages (all selected stages if none named) even if up to date")
+    parser.add_argument("--jobs", type=int, default=4, help="stages run at the same time")
+    parser.add_argument("--dry-run", action="store_true", help="show what would run")
+    parser.add_argument("--list", action="store_true", help="list the stages and their dependencies")
+    args = parser.parse_args(argv)
+    unknown = set(args.targets + (args.force or [])) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {sorted(unknown)} (choose from {', '.join(STAGES)})")
+
+    if args.list:
+        for stage in STAGES.values():
+            print(f"{stage.name:<16} <- {', '.join(stage.deps) or '(source CSVs)'}")
+        return
+
+    force = True if args.force == [] else args.force
+    status = run_pipeline(args.targets, force=force, jobs=args.jobs, dry_run=args.dry_run)
+    print(f"📋 Pipeline: {json.dumps(status)}")
+    if any(s in ("failed", "blocked") for s in status.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
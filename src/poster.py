@@ -1,90 +1,194 @@
 # %%
 import os
-import time
-import requests
+import hashlib
 import pandas as pd
 from dotenv import load_dotenv
 
-# === Load environment variables ===
-load_dotenv()
-TMDB_API_KEY = os.getenv("TMDB_API_KEY")
-
-if not TMDB_API_KEY:
-    raise ValueError("API key not found. Please set TMDB_API_KEY in your .env file.")
+from http_replay import api_key
+from http_utils import TokenBucket, make_session, request_with_retry
+from instrumentation import metrics, start_run
+from manifest import Manifest, append_rows, dedupe_csv
+from movie_store import load_sample
+from poster_features import build_features, resolve_path
+from sharding import in_shard, shard_path, shard_suffix, stage_args
+from tmdb_client import TMDbClient, image_url
 
 # === Setup directories ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
-SAMPLE_PATH = os.path.join(PROJECT_DIR, "data", "sampled", "movies_sampled.csv")
 POSTER_DIR = os.path.join(PROJECT_DIR, "data", "posters")
-os.makedirs(POSTER_DIR, exist_ok=True)
 
-# === Load sampled movies ===
-df = pd.read_csv(SAMPLE_PATH)
+# === Load environment variables ===
+load_dotenv()
 
 # === Helper: Search TMDB movie and get poster URL ===
-def get_poster_url(imdb_id):
-    tmdb_url = f"https://api.themoviedb.org/3/find/{imdb_id}"
-    params = {
-        "api_key": TMDB_API_KEY,
-        "external_source": "imdb_id"
-    }
-
-    response = requests.get(tmdb_url, params=params)
-    if response.status_code != 200:
-        print(f"❌ TMDB request failed for {imdb_id}. Status: {response.status_code}")
-        return None
-
-    data = response.json()
-    movie_results = data.get("movie_results", [])
-    if not movie_results:
+def get_poster_url(tmdb, imdb_id):
+    movie = tmdb.find_movie(imdb_id)
+    if not movie:
         print(f"❌ No TMDB movie match for {imdb_id}")
         return None
 
-    poster_path = movie_results[0].get("poster_path")
+    poster_path = movie.get("poster_path")
     if not poster_path:
         print(f"⚠️ No poster path for {imdb_id}")
         return None
 
-    return f"https://image.tmdb.org/t/p/w500{poster_path}"
-
-# === Download posters ===
-poster_records = []
-
-print("Starting poster download...")
-for _, row in df.iterrows():
-    imdb_id = row.get("imdb_id")
-    title = row.get("original_title", "Unknown")
-
-    if pd.isna(imdb_id):
-        continue
-
-    poster_url = get_poster_url(imdb_id)
-    if not poster_url:
-        continue
-
-    # Download image
-    try:
-        img_data = requests.get(poster_url).content
-        filename = f"{imdb_id}.jpg"
-        save_path = os.path.join(POSTER_DIR, filename)
-
-        with open(save_path, "wb") as f:
-            f.write(img_data)
-
-        print(f"✅ Poster saved: {save_path}")
-
-        poster_records.append({
-            "imdb_id": imdb_id,
-            "original_title": title,
-            "poster_path": os.path.relpath(save_path, PROJECT_DIR)
-        })
-    except Exception as e:
-        print(f"❌ Failed to download poster for {imdb_id}: {e}")
-
-    time.sleep(1.5)  # Respect TMDB rate limits
-
-# === Save metadata to CSV ===
-poster_df = pd.DataFrame(poster_records)
-poster_df.to_csv(os.path.join(PROJECT_DIR, "data", "posters", "posters_all.csv"), index=False)
-print("🎉 All posters metadata saved to posters_all.csv")
\ No newline at end of file
+    return image_url(poster_path)
+
+# === Helper: Stream a poster to disk with a conditional GET ===
+JPEG_MAGIC = b"\xff\xd8\xff"
+CHUNK_SIZE = 64 * 1024
+
+def download_poster(session, bucket, url, dest_path, validators=None):
+    """Download `url` to `dest_path` in chunks, hashing as it streams.
+
+    Sends If-None-Match / If-Modified-Since from a previous download and
+    returns None on 304. Otherwise returns the sha256, size and new
+    validators; the file is only moved into place once it is a complete JPEG.
+    """
+    headers = {}
+    if validators and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    response = request_with_retry(session, "GET", url, bucket=bucket, headers=headers, stream=True)
+    with response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        sha = hashlib.sha256()
+        size = 0
+        tmp_path = dest_path + ".part"
+        with open(tmp_path, "wb") as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if size == 0 and not chunk.startswith(JPEG_MAGIC):
+                    f.close()
+                    os.remove(tmp_path)
+                    raise ValueError(f"not a JPEG image ({response.headers.get('Content-Type')})")
+                sha.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+
+        expected = response.headers.get("Content-Length")
+        if size == 0 or (expected and int(expected) != size):
+            os.remove(tmp_path)
+            raise ValueError(f"truncated download ({size} of {expected} bytes)")
+
+        return {
+            "tmp_path": tmp_path,
+            "sha256": sha.hexdigest(),
+            "bytes": size,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+
+def main(argv=None):
+    shard = stage_args("Download TMDb posters for the sampled movies.", argv).shard
+
+    TMDB_API_KEY = api_key("TMDB_API_KEY")
+
+    # === Per-host latency, retries and stage timings are reported in data/reports/ ===
+    run = start_run("posters" + shard_suffix(shard))
+    os.makedirs(POSTER_DIR, exist_ok=True)
+
+    # === Load sampled movies ===
+    df = load_sample(["imdb_id", "original_title"])
+    df = df[[in_shard(imdb_id, shard) for imdb_id in df["imdb_id"]]]
+
+    # === Shared, cached TMDb client; image downloads get their own session and rate limit ===
+    tmdb = TMDbClient(TMDB_API_KEY)
+    image_session = make_session()
+    image_bucket = TokenBucket(float(os.getenv("POSTER_RPS", "4")))
+
+    # === Resume from the manifest; posters_all.csv is appended to as we go ===
+    base_csv_path = os.path.join(POSTER_DIR, "posters_all.csv")
+    csv_path = shard_path(base_csv_path, shard)
+    CSV_COLUMNS = ["imdb_id", "original_title", "poster_path", "sha256", "bytes"]
+    manifest = Manifest("posters")
+    manifest.seed_from_csv(csv_path)
+
+    # POSTER_REFRESH=1 revalidates already downloaded posters with conditional requests
+    REFRESH = os.getenv("POSTER_REFRESH") == "1"
+    all_ids = df["imdb_id"].dropna().tolist()
+    pending = set(all_ids if REFRESH else manifest.pending(all_ids))
+
+    # Content hash -> stored file, so identical images are kept once
+    hash_index = {}
+    for known_path in dict.fromkeys([base_csv_path, csv_path]):
+        if os.path.exists(known_path):
+            known = pd.read_csv(known_path)
+            if "sha256" in known:
+                known = known.dropna(subset=["sha256"])
+                hash_index.update(zip(known["sha256"], known["poster_path"]))
+
+    # === Download posters ===
+    print(f"Starting poster download for {len(pending)} movies...")
+    for _, row in df.iterrows():
+        imdb_id = row.get("imdb_id")
+        title = row.get("original_title", "Unknown")
+
+        if pd.isna(imdb_id) or imdb_id not in pending:
+            continue
+
+        poster_url = get_poster_url(tmdb, imdb_id)
+        if not poster_url:
+            manifest.mark_failed(imdb_id, "no poster url")
+            continue
+
+        save_path = os.path.join(POSTER_DIR, f"{imdb_id}.jpg")
+        previous = manifest.info(imdb_id)
+        validators = previous if previous.get("url") == poster_url and os.path.exists(save_path) else None
+
+        try:
+            result = download_poster(image_session, image_bucket, poster_url, save_path, validators)
+            if result is None:
+                print(f"♻️ Poster unchanged: {imdb_id}")
+                manifest.mark_done(imdb_id, **previous)
+                continue
+
+            stored = hash_index.get(result["sha256"])
+            if stored and os.path.exists(resolve_path(stored)):
+                # Identical image already on disk: point at it instead of storing a copy
+                os.remove(result["tmp_path"])
+                poster_path = stored
+                print(f"🔁 Duplicate poster for {imdb_id}, reusing {stored}")
+            else:
+                os.replace(result["tmp_path"], save_path)
+                poster_path = os.path.relpath(save_path, PROJECT_DIR)
+                hash_index[result["sha256"]] = poster_path
+                print(f"✅ Poster saved: {save_path}")
+
+            append_rows(csv_path, [{
+                "imdb_id": imdb_id,
+                "original_title": title,
+                "poster_path": poster_path,
+                "sha256": result["sha256"],
+                "bytes": result["bytes"],
+            }], CSV_COLUMNS)
+            manifest.mark_done(imdb_id, url=poster_url, sha256=result["sha256"],
+                               etag=result["etag"], last_modified=result["last_modified"])
+        except Exception as e:
+            print(f"❌ Failed to download poster for {imdb_id}: {e}")
+            manifest.mark_failed(imdb_id, e)
+
+    # === Drop rows superseded by a retry ===
+    dedupe_csv(csv_path)
+    print(f"🎉 All posters metadata saved to {os.path.basename(csv_path)}")
+    print(f"🗄️ TMDb cache: {tmdb.stats()}")
+    print(f"📋 Manifest: {manifest.summary()}")
+
+    # === Thumbnails and compact image features for new posters (after the merge when sharded) ===
+    if shard is None:
+        with metrics.stage("poster_features"):
+            n_features = build_features()
+        print(f"🖼️ Poster features for {n_features} movies saved")
+    else:
+        print("🖼️ Poster features are built once the shards are merged: python src/poster_features.py")
+    print(f"📊 Run report: {run.finish(manifest=manifest.summary(), tmdb_cache=tmdb.stats())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+POSTER_DIR = os.path.join(PROJECT_DIR, "data", "posters")
+POSTERS_CSV = os.path.join(POSTER_DIR, "posters_all.csv")
+THUMB_DIR = os.path.join(POSTER_DIR, "thumbs")
+FEATURES_PATH = os.path.join(POSTER_DIR, "poster_features.npz")
+
+THUMB_SIZE = (185, 278)
+RGB_BINS = 4            # per channel -> 64-bin joint colour histogram
+HUE_BINS = 12
+MAX_WORKERS = int(os.getenv("POSTER_WORKERS", str(os.cpu_count() or 2)))
+
+
+def resolve_path(poster_path):
+    """Absolute path of a poster_path from posters_all.csv (which may use Windows separators)."""
+    return os.path.join(PROJECT_DIR, *str(poster_path).replace("\\", "/").split("/"))
+
+
+def file_sha256(path, chunk_size=64 * 1024):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def image_features(pixels):
+    """Colour features of an RGB uint8 array of shape (h, w, 3).
+
+    Returns the normalised 64-bin RGB histogram, a 12-bin hue histogram
+    weighted by saturation, the dominant hue (degrees) and mean brightness.
+    """
+    rgb = pixels.reshape(-1, 3)
+    quantised = (rgb // (256 // RGB_BINS)).astype(np.int64)
+    joint = quantised[:, 0] * RGB_BINS * RGB_BINS + quantised[:, 1] * RGB_BINS + quantised[:, 2]
+    rgb_hist = np.bincount(joint, minlength=RGB_BINS ** 3).astype(np.float32)
+    rgb_hist /= max(rgb_hist.sum(), 1.0)
+
+    scaled = rgb.astype(np.float32) / 255.0
+    maxc, minc = scaled.max(axis=1), scaled.min(axis=1)
+    delta = maxc - minc
+    saturation = np.divide(delta, maxc, out=np.zeros_like(delta), where=maxc > 0)
+    safe = np.where(delta > 0, delta, 1.0)
+    r, g, b = scaled[:, 0], scaled[:, 1], scaled[:, 2]
+    hue = np.select(
+        [maxc == r, maxc == g],
+        [((g - b) / safe) % 6, (b - r) / safe + 2],
+        (r - g) / safe + 4,
+    ) / 6.0
+    hue_bin = np.minimum((hue * HUE_BINS).astype(np.int64), HUE_BINS - 1)
+    hue_hist = np.bincount(hue_bin, weights=saturation, minlength=HUE_BINS).astype(np.float32)
+    total = hue_hist.sum()
+    if total > 0:
+        hue_hist /= total
+        dominant_hue = (hue_hist.argmax() + 0.5) * 360.0 / HUE_BINS
+    else:
+        dominant_hue = np.nan   # greyscale poster
+
+    brightness = float(maxc.mean())
+    return rgb_hist, hue_hist, dominant_hue, brightness
+
+
+def process_poster(job):
+    """Worker: write the thumbnail for one unique image and return its features."""
+    from PIL import Image
+
+    sha, path = job
+    with Image.open(path) as img:
+        img = img.convert("RGB")
+        img.thumbnail(THUMB_SIZE)
+        img.save(os.path.join(THUMB_DIR, f"{sha}.jpg"), "JPEG", quality=85)
+        pixels = np.asarray(img, dtype=np.uint8)
+    return (sha, *image_features(pixels))
+
+
+def load_features(path=FEATURES_PATH):
+    """Saved features as a dict of arrays keyed like the npz (empty if none yet)."""
+    if not os.path.exists(path):
+        return {}
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+def build_features(csv_path=POSTERS_CSV, path=FEATURES_PATH, workers=MAX_WORKERS):
+    """Thumbnail and featurise every poster listed in posters_all.csv.
+
+    Work is keyed by image content hash: identical images are processed once
+    and hashes already in the npz are skipped, so a rerun only decodes new
+    posters. Decoding runs in a process pool. Returns the number of movies
+    with features.
+    """
+    if not os.path.exists(csv_path):
+        return 0
+    posters = pd.read_csv(csv_path)
+    posters = posters.dropna(subset=["poster_path"])
+    posters["file"] = posters["poster_path"].map(resolve_path)
+    posters = posters[posters["file"].map(os.path.exists)].copy()
+    if posters.empty:
+        return 0
+    if "sha256" not in posters:
+        posters["sha256"] = None
+    # Older rows were written before hashes were recorded
+    missing = posters["sha256"].isna()
+    posters.loc[missing, "sha256"] = posters.loc[missing, "file"].map(file_sha256)
+
+    saved = load_features(path)
+    known = set(saved.get("sha256", []))
+    jobs = [(sha, file) for sha, file in
+            posters.drop_duplicates("sha256")[["sha256", "file"]].itertuples(index=False)
+            if sha not in known]
+
+    if jobs:
+        os.makedirs(THUMB_DIR, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(process_poster, jobs, chunksize=8))
+        new = {
+            "sha256": np.array([r[0] for r in results]),
+            "rgb_hist": np.stack([r[1] for r in results]),
+            "hue_hist": np.stack([r[2] for r in results]),
+            "dominant_hue": np.array([r[3] for r in results], dtype=np.float32),
+            "brightness": np.array([r[4] for r in results], dtype=np.float32),
+        }
+        features = {key: np.concatenate([saved[key], new[key]]) if saved else new[key] for key in new}
+    else:
+        features = {key: saved[key] for key in ("sha256", "rgb_hist", "hue_hist", "dominant_hue", "brightness")}
+
+    # Movie -> image mapping is rewritten every time; images are only added
+    features["imdb_id"] = posters["imdb_id"].to_numpy(dtype=str)
+    features["movie_sha256"] = posters["sha256"].to_numpy(dtype=str)
+    tmp_path = path + ".tmp.npz"
+    np.savez_compressed(tmp_path, **features)
+    os.replace(tmp_path, path)
+    return len(posters)
+
+
+if __name__ == "__main__":
+    print(f"🖼️ Poster features for {build_features()} movies saved to {FEATURES_PATH}")
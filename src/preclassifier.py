@@ -0,0 +1,242 @@
+"""Offline theme classifier used to decide which films need the LLM.
+
+TF-IDF over plot + dialogue, then one calibrated logistic regression per
+theme, trained on the LLM labels thematic_coding.py keeps in llm_labels.csv. A film whose
+predicted label has a calibrated probability of at least the threshold for
+every theme can skip the LLM; the rest are escalated.
+
+    python src/preclassifier.py train
+    python src/preclassifier.py report       # cross-validated agreement with the LLM
+    python src/preclassifier.py predict      # every film in the corpus
+"""
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import cohen_kappa_score, f1_score
+from sklearn.model_selection import StratifiedKFold, cross_val_predict
+from sklearn.pipeline import make_pipeline
+
+from corpus import batched, iter_films
+from structured_output import THEMES, parse_frame
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_DIR = os.path.join(PROJECT_DIR, "data")
+MODEL_PATH = os.path.join(DATA_DIR, "models", "preclassifier.joblib")
+LLM_LABELS_PATH = os.path.join(DATA_DIR, "llm_labels.csv")
+LABELS_PATH = os.path.join(DATA_DIR, "thematic_coding_clean.csv")
+CODING_PATH = os.path.join(DATA_DIR, "thematic_coding.csv")
+PREDICTIONS_PATH = os.path.join(DATA_DIR, "preclassifier_predictions.csv")
+REPORT_PATH = os.path.join(DATA_DIR, "reports", "preclassifier_agreement.csv")
+
+THRESHOLD = 0.9
+CV_FOLDS = 3  # calibration folds
+MIN_LABEL_COUNT = 5  # enough for calibration inside each cross-validation fold of the report
+REPORT_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+PREDICT_BATCH = 1_000
+
+
+def film_text(film):
+    return f"{film.plot}\n{film.dialogue}"
+
+
+def _vectorizer():
+    return TfidfVectorizer(sublinear_tf=True, min_df=2, max_df=0.9, ngram_range=(1, 2),
+                           max_features=200_000, dtype=np.float32)
+
+
+def _classifier():
+    linear = LogisticRegression(C=4.0, class_weight="balanced", max_iter=2_000)
+    return CalibratedClassifierCV(linear, method="sigmoid", cv=CV_FOLDS)
+
+
+def _trainable(labels):
+    """Rows whose label occurs at least MIN_LABEL_COUNT times; rarer labels cannot be calibrated."""
+    counts = labels.value_counts()
+    keep = labels.isin(counts[counts >= MIN_LABEL_COUNT].index)
+    return keep if labels[keep].nunique() >= 2 else pd.Series(False, index=labels.index)
+
+
+def load_training_data(llm_labels_path=LLM_LABELS_PATH, labels_path=LABELS_PATH, coding_path=CODING_PATH):
+    """(imdb_ids, texts, wide labels) for films the LLM coded.
+
+    Labels come from llm_labels.csv, where a film keeps its LLM coding after
+    the preclassifier settles it, so the training set does not shrink from
+    one train/code cycle to the next. Before thematic_coding.py has written
+    that file, the clean coding is used minus the films labelled by the
+    preclassifier (source column of thematic_coding.csv).
+    """
+    if os.path.exists(llm_labels_path):
+        wide, _ = parse_frame(pd.read_csv(llm_labels_path), raw_col="raw", id_cols=["imdb_id"])
+        wide = wide.drop_duplicates("imdb_id", keep="last").set_index("imdb_id")[THEMES]
+    else:
+        long_df = pd.read_csv(labels_path, usecols=["imdb_id", "theme", "sentiment_category"])
+        wide = long_df.pivot_table(index="imdb_id", columns="theme", values="sentiment_category", aggfunc="first")
+        if os.path.exists(coding_path):
+            coding = pd.read_csv(coding_path)
+            if "source" in coding:
+                wide = wide.drop(coding.loc[coding["source"] == "preclassifier", "imdb_id"], errors="ignore")
+
+    ids, texts = [], []
+    for film in iter_films(imdb_ids=wide.index.tolist()):
+        ids.append(film.imdb_id)
+        texts.append(film_text(film))
+    return ids, texts, wide.reindex(ids).reindex(columns=THEMES)
+
+
+class Preclassifier:
+    """Shared TF-IDF vocabulary plus one calibrated linear model per theme.
+
+    A theme with fewer than two labels that occur MIN_LABEL_COUNT times has no
+    model; its confidence is 0, so every film is escalated for it.
+    """
+
+    def __init__(self, vectorizer, models, trained_on, threshold=THRESHOLD):
+        self.vectorizer = vectorizer
+        self.models = models
+        self.trained_on = trained_on
+        self.threshold = threshold
+
+    @classmethod
+    def train(cls, texts, labels, threshold=THRESHOLD):
+        vectorizer = _vectorizer()
+        X = vectorizer.fit_transform(texts)
+        models = {}
+        for theme in THEMES:
+            y = labels[theme].reset_index(drop=True)
+            keep = (_trainable(y.dropna()).reindex(y.index, fill_value=False)).to_numpy()
+            if keep.any():
+                models[theme] = _classifier().fit(X[keep], y[keep])
+        return cls(vectorizer, models, trained_on=len(texts), threshold=threshold)
+
+    def predict(self, texts):
+        """DataFrame with <theme> (label) and <theme>_confidence per text."""
+        X = self.vectorizer.transform(texts)
+        out = {}
+        for theme in THEMES:
+            model = self.models.get(theme)
+            if model is None:
+                out[theme] = [None] * X.shape[0]
+                out[f"{theme}_confidence"] = np.zeros(X.shape[0])
+                continue
+            proba = model.predict_proba(X)
+            out[theme] = model.classes_[proba.argmax(axis=1)]
+            out[f"{theme}_confidence"] = proba.max(axis=1).round(4)
+        return pd.DataFrame(out)
+
+    def confident(self, predictions, threshold=None):
+        """Boolean mask of rows confident enough on every theme to skip the LLM."""
+        threshold = self.threshold if threshold is None else threshold
+        confidence = predictions[[f"{theme}_confidence" for theme in THEMES]]
+        return (confidence >= threshold).all(axis=1).to_numpy()
+
+    def save(self, path=MODEL_PATH):
+        """Pickle the fitted parts as a plain dict, so loading does not depend on where this class lives.
+
+        Pickling the instance itself from `python src/preclassifier.py train`
+        would record it as __main__.Preclassifier, which no importer can find.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        joblib.dump({"vectorizer": self.vectorizer, "models": self.models,
+                     "trained_on": self.trained_on, "threshold": self.threshold}, path)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        return cls(**joblib.load(path))
+
+
+def agreement_report(texts, labels, thresholds=REPORT_THRESHOLDS, folds=5, seed=0):
+    """Cross-validated agreement with the LLM labels, per theme and threshold.
+
+    Each film is predicted by a model that did not see it (the vectorizer is
+    refit inside each fold). For every threshold the report gives coverage,
+    the share of films the preclassifier would settle, and accuracy on those
+    films, next to overall accuracy, macro F1 and Cohen's kappa.
+    """
+    rows = []
+    for theme in THEMES:
+        y = labels[theme].reset_index(drop=True)
+        keep = _trainable(y.dropna()).reindex(y.index, fill_value=False).to_numpy()
+        if not keep.any():
+            rows.append({"theme": theme, "films": int(y.notna().sum()), "note": "too few labels to train"})
+            continue
+        X_theme = [t for t, k in zip(texts, keep) if k]
+        y_theme = y[keep].to_numpy()
+        n_folds = min(folds, int(pd.Series(y_theme).value_counts().min()))
+        cv = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+        model = make_pipeline(_vectorizer(), _classifier())
+        proba = cross_val_predict(model, X_theme, y_theme, cv=cv, method="predict_proba")
+        classes = np.unique(y_theme)
+        predicted, confidence = classes[proba.argmax(axis=1)], proba.max(axis=1)
+        correct = predicted == y_theme
+
+        row = {
+            "theme": theme,
+            "films": len(y_theme),
+            "accuracy": round(correct.mean(), 3),
+            "macro_f1": round(f1_score(y_theme, predicted, average="macro"), 3),
+            "kappa": round(cohen_kappa_score(y_theme, predicted), 3),
+            "majority_baseline": round(pd.Series(y_theme).value_counts(normalize=True).iloc[0], 3),
+        }
+        for t in thresholds:
+            settled = confidence >= t
+            row[f"coverage@{t}"] = round(settled.mean(), 3)
+            row[f"accuracy@{t}"] = round(correct[settled].mean(), 3) if settled.any() else None
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def predict_corpus(model, path=PREDICTIONS_PATH):
+    """Predict every film in the corpus in batches; returns the number of films."""
+    if os.path.exists(path):
+        os.remove(path)
+    n = 0
+    for films in batched(iter_films(), PREDICT_BATCH):
+        predictions = model.predict([film_text(film) for film in films])
+        predictions.insert(0, "imdb_id", [film.imdb_id for film in films])
+        predictions["escalate"] = ~model.confident(predictions)
+        predictions.to_csv(path, mode="a", header=n == 0, index=False, encoding="utf-8")
+        n += len(films)
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train and apply the offline theme preclassifier.")
+    parser.add_argument("command", choices=["train", "report", "predict"])
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="minimum calibrated confidence on every theme to skip the LLM")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.command == "predict":
+        model = Preclassifier.load()
+        model.threshold = args.threshold
+        n = predict_corpus(model)
+        print(f"✅ Predictions for {n} films saved to {PREDICTIONS_PATH} in {time.perf_counter() - started:.1f}s")
+        return
+
+    ids, texts, labels = load_training_data()
+    print(f"📚 {len(ids)} LLM-coded films with text")
+    if args.command == "train":
+        model = Preclassifier.train(texts, labels, threshold=args.threshold)
+        model.save()
+        missing = [theme for theme in THEMES if theme not in model.models]
+        print(f"✅ Preclassifier saved to {MODEL_PATH} in {time.perf_counter() - started:.1f}s")
+        if missing:
+            print(f"⚠️ No model for {', '.join(missing)} (too few labels); those themes always go to the LLM")
+    else:
+        report = agreement_report(texts, labels)
+        os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+        report.to_csv(REPORT_PATH, index=False, encoding="utf-8")
+        print(report.to_string(index=False))
+        print(f"✅ Agreement report saved to {REPORT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,62 @@
 import os
+import numpy as np
 import pandas as pd
 
-# === Step 2: Load subtitle and description data ===
+from corpus import batched, iter_films
+from instrumentation import start_run
+from lexicon import LexiconMatcher
+from manifest import append_rows
+from movie_store import load_sample
+from sharding import in_shard, shard_path, shard_suffix, stage_args
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "..", "data")
 
-sub_path = os.path.join(DATA_DIR, "subtitles", "subtitles_all.csv")
-desc_path = os.path.join(DATA_DIR, "descriptions", "descriptions_all.csv")
-
-subtitle_df = pd.read_csv(sub_path)
-description_df = pd.read_csv(desc_path)
-
-# === Step 3: Merge subtitle and description ===
-df = pd.merge(subtitle_df, description_df, on="imdb_id", how="outer")
-df["combined_text"] = df["subtitle_text"].fillna("") + "\n" + df["plot"].fillna("")
-movies_path = os.path.join(DATA_DIR, "sampled", "movies_sampled.csv")
-movies_df = pd.read_csv(movies_path)[["imdb_id", "original_title"]]
-df = df.merge(movies_df, on="imdb_id", how="left")
-
-def detect_violence(text):
-    keywords = [
-        "kill", "murder", "violence", "gun", "fight", "blood", "terrorist", "attack", "riot",
-        "war", "shoot", "bomb", "stab", "explosion", "rebel", "hostage", "brutal", "torture"
-    ]
-    if not isinstance(text, str) or len(text.strip()) == 0:
-        return "Unclear"
-
-    count = sum(word in text.lower() for word in keywords)
-    if count >= 5:
-        return "High"
-    elif 1 <= count < 5:
-        return "Low"
+CSV_COLUMNS = ["imdb_id", "original_title", "violence_representation"]
+BATCH_SIZE = 500  # films per keyword-counting pass and per write
+
+matcher = LexiconMatcher()
+
+def detect_violence(texts):
+    """High / Low / Unclear per text, from the number of distinct keywords present."""
+    counts = matcher.count_matrix(texts)
+    distinct = matcher.lexicon_counts(counts, "violence", distinct=True)
+    empty = texts.fillna("").str.strip().eq("").to_numpy()
+    return np.select([empty, distinct >= 5, distinct >= 1], ["Unclear", "High", "Low"], "Unclear")
+
+
+def main(argv=None):
+    shard = stage_args("Code violence representation from keyword counts.", argv).shard
+    run = start_run("violence" + shard_suffix(shard))
+
+    # === Step 2: Titles come from the sample; texts are streamed one film at a time ===
+    titles = load_sample(["imdb_id", "original_title"]).set_index("imdb_id")["original_title"].to_dict()
+    output_path = shard_path(os.path.join(DATA_DIR, "violence_measure.csv"), shard)
+    tmp_path = output_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    # === Step 3: Count violence keywords in one pass per film, a batch of films at a time ===
+    n_films = 0
+    shard_films = (film for film in iter_films() if in_shard(film.imdb_id, shard))
+    for films in batched(shard_films, BATCH_SIZE):
+        combined = pd.Series([f"{film.dialogue}\n{film.plot}" for film in films])
+        labels = detect_violence(combined)
+        append_rows(tmp_path, [{
+            "imdb_id": film.imdb_id,
+            "original_title": titles.get(film.imdb_id),
+            "violence_representation": label,
+        } for film, label in zip(films, labels)], CSV_COLUMNS)
+        n_films += len(films)
+
+    # === Save the output ===
+    if n_films:
+        os.replace(tmp_path, output_path)
     else:
-        return "Unclear"
-
-df["violence_representation"] = df["combined_text"].apply(detect_violence)
+        pd.DataFrame(columns=CSV_COLUMNS).to_csv(output_path, index=False, encoding="utf-8")
 
-# === Save the output ===
-output_df = df[["imdb_id", "original_title", "violence_representation"]].copy()
-output_path = os.path.join(DATA_DIR, "violence_measure.csv")
-output_df.to_csv(output_path, index=False, encoding="utf-8")
+    print(f"✅ Violence coding saved to: {output_path}")
+    print(f"📊 Run report: {run.finish(films=n_films)}")
 
-print(f"✅ Violence coding saved to: {output_path}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,78 @@
 import os
+import argparse
 import numpy as np
 import pandas as pd 
 from functools import reduce
 
+from movie_store import DATA_DIR, SOURCES, STORE_PATH, build_store
+from sampler import MANIFEST_CSV, STRATA, stratified_sample, write_manifest, write_sample_csv
+
 # Set the working directory based on script location
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
 
 # Define correct output directory for sampled data
 output_dir = os.path.join(PROJECT_DIR, "data", "sampled")
-os.makedirs(output_dir, exist_ok=True)  # Make sure it exists
+output_path = os.path.join(output_dir, "movies_sampled.csv")
 
-# Define paths for merging
-file_paths = [
-    os.path.join(PROJECT_DIR, "data", "bollywood_2010-2019.csv"),
-    os.path.join(PROJECT_DIR, "data", "bollywood_meta_2010-2019.csv"),
-    os.path.join(PROJECT_DIR, "data", "bollywood_ratings_2010-2019.csv"),
-    os.path.join(PROJECT_DIR, "data", "bollywood_text_2010-2019.csv")
-]
 
-# Load all CSVs
-dfs = [pd.read_csv(fp) for fp in file_paths]
+def simple_sample(n, seed, data_dir=DATA_DIR):
+    """n random rows of the four source CSVs left-merged on imdb_id, as the original sampling did.
 
-# Merge on 'imdb_id'
-merged_df = reduce(lambda left, right: pd.merge(left, right, on='imdb_id', how='left'), dfs)
+    Drawn from the merged table rather than the movie store, whose
+    de-duplicated rows would give a different draw for the same seed; the
+    merged columns (title_x, title_y, ...) are kept as they were.
+    """
+    dfs = [pd.read_csv(os.path.join(data_dir, filename)) for filename in SOURCES]
+    merged_df = reduce(lambda left, right: pd.merge(left, right, on="imdb_id", how="left"), dfs)
+    return merged_df.sample(n=n, random_state=seed)
 
-# Sample 100 random movies
-sampled_df = merged_df.sample(n=100, random_state=42)
 
-# Save sampled data
-output_path = os.path.join(output_dir, "movies_sampled.csv")
-sampled_df.to_csv(output_path, index=False)
+def main(argv=None):
+    # === Options: the default reproduces the simple 100-movie random sample ===
+    parser = argparse.ArgumentParser(description="Draw the movie sample from the movie store.")
+    parser.add_argument("--mode", choices=["simple", "stratified"], default="simple")
+    parser.add_argument("--n", type=int, default=100, help="sample size")
+    parser.add_argument("--per-stratum", type=int, help="fixed quota per stratum (stratified mode, instead of --n)")
+    parser.add_argument("--strata", default=",".join(STRATA), help="comma-separated subset of: year,genre,rating")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--shards", type=int, default=1, help="number of shards recorded in the sample manifest")
+    args = parser.parse_args(argv)
+
+    os.makedirs(output_dir, exist_ok=True)  # Make sure it exists
+
+    # Build the typed movie store (one row per imdb_id) from the four source CSVs
+    build_store()
+    print(f"🗄️ Movie store built: {STORE_PATH}")
+
+    if args.mode == "simple":
+        # Sample n random movies from the merged source CSVs (reproduces the committed sample)
+        sampled_df = simple_sample(args.n, args.seed)
+        sample = [(imdb_id, "all") for imdb_id in dict.fromkeys(sampled_df["imdb_id"].dropna())]
+    else:
+        # Streamed reservoir sampling per stratum; the full table is never loaded
+        by = tuple(s.strip() for s in args.strata.split(",") if s.strip())
+        unknown = set(by) - set(STRATA)
+        if unknown:
+            parser.error(f"unknown strata: {sorted(unknown)}")
+        quota = {"per_stratum": args.per_stratum} if args.per_stratum else {"n": args.n}
+        sample = stratified_sample(by=by, seed=args.seed, **quota)
+
+    # Save the sample manifest (imdb_id, stratum, shard) and the sampled rows
+    write_manifest(sample, n_shards=args.shards, params={
+        "mode": args.mode, "n": args.n, "per_stratum": args.per_stratum,
+        "strata_by": args.strata if args.mode == "stratified" else None, "seed": args.seed,
+    })
+    if args.mode == "simple":
+        sampled_df.to_csv(output_path, index=False)
+    else:
+        write_sample_csv([imdb_id for imdb_id, _ in sample], output_path)
+
+    print(f"✅ Sample of {len(sample)} movies saved to: {output_path}")
+    if args.mode == "simple" and len(sampled_df) != len(sample):
+        print(f"ℹ️ {len(sampled_df)} rows: the merged source tables repeat some imdb_ids")
+    print(f"📋 Sample manifest saved to: {MANIFEST_CSV}")
+
 
-print(f"✅ Sample saved to: {output_path}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import random
+from collections import Counter
+from contextlib import closing
+
+import pandas as pd
+
+from movie_store import STORE_PATH, connect, load_movies
+from sharding import shard_of
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SAMPLED_DIR = os.path.join(PROJECT_DIR, "data", "sampled")
+MANIFEST_CSV = os.path.join(SAMPLED_DIR, "sample_manifest.csv")
+MANIFEST_JSON = os.path.join(SAMPLED_DIR, "sample_manifest.json")
+
+STRATA = ("year", "genre", "rating")
+RATING_BANDS = [(4.0, "<4"), (5.0, "4-5"), (6.0, "5-6"), (7.0, "6-7"), (8.0, "7-8"), (float("inf"), "8+")]
+FETCH_SIZE = 10_000
+
+
+def rating_band(rating):
+    if rating is None:
+        return "unrated"
+    return next(label for upper, label in RATING_BANDS if rating < upper)
+
+
+def stratum_of(year, genres, rating, by=STRATA):
+    parts = {
+        "year": str(year) if year is not None else "unknown",
+        "genre": genres.split("|")[0] if genres else "unknown",
+        "rating": rating_band(rating),
+    }
+    return "/".join(parts[key] for key in by)
+
+
+def iter_strata(by=STRATA, path=STORE_PATH):
+    """Stream (imdb_id, stratum) over the whole store in imdb_id order."""
+    with closing(connect(path)) as conn:
+        cursor = conn.execute(
+            "SELECT imdb_id, year_of_release, genres, imdb_rating FROM movies ORDER BY imdb_id")
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for imdb_id, year, genres, rating in rows:
+                yield imdb_id, stratum_of(year, genres, rating, by)
+
+
+def proportional_quotas(counts, n):
+    """Allocate `n` across strata in proportion to their size (largest remainder)."""
+    total = sum(counts.values())
+    if n >= total:
+        return dict(counts)
+    exact = {s: n * c / total for s, c in counts.items()}
+    quotas = {s: int(q) for s, q in exact.items()}
+    leftover = n - sum(quotas.values())
+    for s in sorted(exact, key=lambda s: (quotas[s] - exact[s], s))[:leftover]:
+        quotas[s] += 1
+    return quotas
+
+
+def _stratum_rng(seed, stratum):
+    # Each stratum gets its own stream, so adding or removing other strata
+    # never changes which movies are drawn within this one
+    digest = hashlib.sha256(f"{seed}:{stratum}".encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def stratified_sample(n=None, per_stratum=None, by=STRATA, seed=42, path=STORE_PATH):
+    """Draw a stratified sample with one reservoir per stratum.
+
+    Quotas are either a fixed `per_stratum` size or `n` allocated in
+    proportion to stratum sizes (counted in a first streaming pass). Rows are
+    streamed from the store in imdb_id order, so memory is bounded by the
+    sample size and the result depends only on the store contents and seed.
+    Returns a list of (imdb_id, stratum) sorted by stratum, then imdb_id.
+    """
+    if (n is None) == (per_stratum is None):
+        raise ValueError("Pass exactly one of n or per_stratum")
+
+    if per_stratum is not None:
+        quotas = None
+    else:
+        quotas = proportional_quotas(Counter(s for _, s in iter_strata(by, path)), n)
+
+    reservoirs, seen, rngs = {}, Counter(), {}
+    for imdb_id, stratum in iter_strata(by, path):
+        k = per_stratum if quotas is None else quotas.get(stratum, 0)
+        if k == 0:
+            continue
+        if stratum not in rngs:
+            rngs[stratum] = _stratum_rng(seed, stratum)
+            reservoirs[stratum] = []
+        seen[stratum] += 1
+        reservoir = reservoirs[stratum]
+        if len(reservoir) < k:
+            reservoir.append(imdb_id)
+        else:
+            j = rngs[stratum].randrange(seen[stratum])
+            if j < k:
+                reservoir[j] = imdb_id
+
+    return sorted(((imdb_id, s) for s, ids in reservoirs.items() for imdb_id in ids),
+                  key=lambda row: (row[1], row[0]))
+
+
+def write_manifest(sample, n_shards=1, params=None, csv_path=MANIFEST_CSV, json_path=MANIFEST_JSON):
+    """Write the sample manifest: one row per movie with its stratum and shard."""
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    manifest = pd.DataFrame(sample, columns=["imdb_id", "stratum"])
+    manifest["shard"] = [shard_of(i, n_shards) for i in manifest["imdb_id"]]
+    manifest.to_csv(csv_path, index=False)
+
+    summary = {
+        **(params or {}),
+        "n_shards": n_shards,
+        "n_movies": len(manifest),
+        "strata": manifest["stratum"].value_counts().sort_index().to_dict(),
+        "shards": manifest["shard"].value_counts().sort_index().to_dict(),
+    }
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, default=str)
+    return manifest
+
+
+def manifest_ids(shard=None, n_shards=None, csv_path=MANIFEST_CSV):
+    """imdb_ids in the sample manifest, optionally only those of one shard.
+
+    Shards come from the manifest unless `n_shards` asks for a different
+    split, in which case they are recomputed from the same stable hash.
+    """
+    manifest = pd.read_csv(csv_path, usecols=["imdb_id", "shard"])
+    if shard is None:
+        return manifest["imdb_id"].tolist()
+    if n_shards is not None:
+        manifest["shard"] = [shard_of(i, n_shards) for i in manifest["imdb_id"]]
+    return manifest.loc[manifest["shard"] == shard, "imdb_id"].tolist()
+
+
+def write_sample_csv(imdb_ids, output_path, chunk_size=FETCH_SIZE):
+    """Write store rows for `imdb_ids` to CSV, one chunk of ids at a time."""
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    for start in range(0, len(imdb_ids), chunk_size):
+        chunk = load_movies(imdb_ids=imdb_ids[start:start + chunk_size])
+        chunk.to_csv(output_path, mode="a", header=start == 0, index=False)
@@ -0,0 +1,348 @@
+"""Split stages over processes or machines by a stable hash of imdb_id.
+
+A stage run with `--shard i/N` only handles the movies with
+shard_of(imdb_id, N) == i and writes its outputs next to the usual ones,
+with a `.shard-i-of-N` suffix (data/thematic_coding.shard-0-of-4.csv).
+Shards of one stage never share a movie, so they can run at the same time
+on one machine or on several; copy the shard files back before merging.
+
+The merge is deterministic: sources are read in a fixed order (the existing
+output first for resumable fetch stages, then shards by number), rows that
+are exact duplicates are dropped, and an imdb_id with differing rows keeps
+the last one and is reported in <output>.conflicts.csv. Rows come out sorted
+by imdb_id, so the result does not depend on the number of shards.
+
+    python src/description.py --shard 0/4
+    python src/sharding.py merge descriptions
+    python src/sharding.py run violence --shards 8   # local process pool, then merge
+"""
+import argparse
+import glob
+import hashlib
+import os
+import re
+import subprocess
+import sys
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from http_utils import rate_limit_divisor
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_DIR = os.path.join(PROJECT_DIR, "data")
+LOG_DIR = os.path.join(DATA_DIR, "logs")
+
+Shard = namedtuple("Shard", ["index", "count"])
+
+# Stage -> script, outputs, whether the existing output is kept (resumable
+# fetch stages append to it) or replaced (stages that rewrite it every run),
+# and further outputs that are always kept because they accumulate across runs
+Sharded = namedtuple("Sharded", ["script", "outputs", "incremental", "kept"], defaults=[()])
+STAGES = {
+    "subtitles": Sharded("src/subtitles.py", [os.path.join(DATA_DIR, "subtitles", "cues.parquet")], True),
+    "descriptions": Sharded("src/description.py",
+                            [os.path.join(DATA_DIR, "descriptions", "descriptions_all.csv")], True),
+    "posters": Sharded("src/poster.py", [os.path.join(DATA_DIR, "posters", "posters_all.csv")], True),
+    "metadata": Sharded("src/metadata.py", [os.path.join(DATA_DIR, "metadata", "metadata_extended.csv")], True),
+    "thematic_coding": Sharded("src/thematic_coding.py", [os.path.join(DATA_DIR, "thematic_coding.csv")], False,
+                               kept=[os.path.join(DATA_DIR, "llm_labels.csv")]),
+    "violence": Sharded("src/proposed_sentiment.py", [os.path.join(DATA_DIR, "violence_measure.csv")], False),
+}
+
+SHARD_RE = re.compile(r"\.shard-(\d+)-of-(\d+)$")
+
+
+def shard_of(imdb_id, n_shards):
+    """Stable shard number for an imdb_id (independent of Python's hash seed)."""
+    digest = hashlib.blake2b(str(imdb_id).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % n_shards
+
+
+# === Running one shard ===
+def parse_shard(text):
+    """`i/N` -> Shard(i, N); an argparse type."""
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", text or "")
+    if not match:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {text!r}")
+    index, count = int(match.group(1)), int(match.group(2))
+    if count < 1 or index >= count:
+        raise argparse.ArgumentTypeError(f"shard {index}/{count} out of range (0 <= i < N)")
+    return Shard(index, count)
+
+
+def stage_args(description, argv=None):
+    """Parse the `--shard i/N` option every shardable stage accepts."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="only handle shard i of N (by a stable hash of imdb_id)")
+    return parser.parse_args(argv)
+
+
+def in_shard(imdb_id, shard):
+    return shard is None or shard_of(imdb_id, shard.count) == shard.index
+
+
+def shard_suffix(shard):
+    return f".shard-{shard.index}-of-{shard.count}" if shard is not None else ""
+
+
+def shard_path(path, shard):
+    """`path` with the shard suffix before its extension; `path` itself when not sharded."""
+    root, ext = os.path.splitext(path)
+    return f"{root}{shard_suffix(shard)}{ext}"
+
+
+# === Merging ===
+def shard_files(path, ext=None):
+    """[(Shard, file)] of the shard outputs of `path`, in shard order.
+
+    `ext` is the part of the name that follows the shard suffix (default:
+    the extension of `path`). Raises ValueError when shards of different
+    counts are mixed; missing shards are reported but not fatal.
+    """
+    root, ext = (path[:-len(ext)], ext) if ext else os.path.splitext(path)
+    found = []
+    for file in glob.glob(f"{glob.escape(root)}.shard-*-of-*{glob.escape(ext)}"):
+        match = SHARD_RE.search(file[:-len(ext)] if ext else file)
+        if match:
+            found.append((Shard(int(match.group(1)), int(match.group(2))), file))
+    counts = {shard.count for shard, _ in found}
+    if len(counts) > 1:
+        raise ValueError(f"{os.path.basename(path)}: shard files from different counts {sorted(counts)}; "
+                         "remove the stale ones before merging")
+    if counts:
+        missing = sorted(set(range(counts.pop())) - {shard.index for shard, _ in found})
+        if missing:
+            print(f"⚠️ {os.path.basename(path)}: shards {missing} are missing")
+    return sorted(found)
+
+
+def _write_conflicts(path, conflicts):
+    conflicts_path = os.path.splitext(path)[0] + ".conflicts.csv"
+    if conflicts:
+        pd.DataFrame(conflicts).to_csv(conflicts_path, index=False, encoding="utf-8")
+    elif os.path.exists(conflicts_path):
+        os.remove(conflicts_path)
+    return conflicts_path
+
+
+def merge_csv(path, incremental=True, key="imdb_id"):
+    """Merge the shard CSVs of `path` into `path`; returns {"rows", "duplicates", "conflicts"}."""
+    sources = ([("output", path)] if incremental and os.path.exists(path) else [])
+    sources += [(f"shard {s.index}/{s.count}", file) for s, file in shard_files(path)]
+    frames = []
+    for order, (name, file) in enumerate(sources):
+        frame = pd.read_csv(file, dtype=str, keep_default_na=False)
+        frames.append(frame.assign(_source=name, _order=order))
+    if not frames:
+        return {"rows": 0, "duplicates": 0, "conflicts": 0}
+
+    combined = pd.concat(frames, ignore_index=True).fillna("")
+    columns = [c for c in combined.columns if c not in ("_source", "_order")]
+    distinct = combined.drop_duplicates(subset=columns, keep="last")
+    duplicates = len(combined) - len(distinct)
+
+    conflicts = []
+    clashing = distinct[distinct.duplicated(subset=[key], keep=False)]
+    for imdb_id, rows in clashing.groupby(key, sort=True):
+        differing = [c for c in columns if rows[c].nunique() > 1]
+        conflicts.append({
+            key: imdb_id,
+            "sources": "; ".join(rows["_source"]),
+            "kept": rows["_source"].iloc[-1],
+            "columns": ", ".join(differing),
+        })
+
+    merged = (distinct.sort_values("_order", kind="stable")
+              .drop_duplicates(subset=[key], keep="last")
+              .sort_values(key, kind="stable")[columns])
+    tmp_path = path + ".tmp"
+    merged.to_csv(tmp_path, index=False, encoding="utf-8")
+    os.replace(tmp_path, path)
+    _write_conflicts(path, conflicts)
+    return {"rows": len(merged), "duplicates": duplicates, "conflicts": len(conflicts)}
+
+
+def _sorted_films(path, columns):
+    """(imdb_id, [row tuples]) per film of a cue store, checking that films come in imdb_id order."""
+    import pyarrow.parquet as pq
+
+    current, rows = None, []
+    for batch in pq.ParquetFile(path).iter_batches(columns=columns):
+        values = batch.to_pydict()
+        for imdb_id, *row in zip(*(values[name] for name in columns)):
+            if imdb_id != current:
+                if rows:
+                    yield current, rows
+                if current is not None and imdb_id < current:
+                    raise ValueError(f"{path} is not sorted by imdb_id; rebuild it with cue_store.py")
+                current, rows = imdb_id, []
+            rows.append(tuple(row))
+    if rows:
+        yield current, rows
+
+
+def merge_cues(path, incremental=True, rows_per_group=100_000):
+    """Merge shard cue stores into `path`; same stats as merge_csv.
+
+    Every cue store is sorted by imdb_id, so the sources are merged as
+    sorted streams, holding one film per source in memory at a time.
+    """
+    import heapq
+    from itertools import groupby
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    from cue_store import SCHEMA
+
+    sources = ([("output", path)] if incremental and os.path.exists(path) else [])
+    sources += [(f"shard {s.index}/{s.count}", file) for s, file in shard_files(path)]
+    if not sources:
+        return {"rows": 0, "duplicates": 0, "conflicts": 0}
+
+    streams = [((imdb_id, order, rows) for imdb_id, rows in _sorted_films(file, SCHEMA.names))
+               for order, (_, file) in enumerate(sources)]
+    columns = {name: [] for name in SCHEMA.names}
+    films, duplicates, conflicts = 0, 0, []
+    tmp_path = path + ".merge.tmp"
+
+    def flush(writer):
+        if columns["imdb_id"]:
+            writer.write_table(pa.table(columns, schema=SCHEMA))
+            for values in columns.values():
+                values.clear()
+
+    with pq.ParquetWriter(tmp_path, SCHEMA, compression="zstd") as writer:
+        merged = heapq.merge(*streams, key=lambda film: (film[0], film[1]))
+        for imdb_id, copies in groupby(merged, key=lambda film: film[0]):
+            copies = list(copies)
+            # The last source holding a film wins; identical copies are duplicates, differing ones conflicts
+            _, order, rows = copies[-1]
+            if len(copies) > 1:
+                if all(copy[2] == rows for copy in copies[:-1]):
+                    duplicates += len(copies) - 1
+                else:
+                    conflicts.append({"imdb_id": imdb_id,
+                                      "sources": "; ".join(sources[copy[1]][0] for copy in copies),
+                                      "kept": sources[order][0], "columns": "cues"})
+            for row in rows:
+                columns["imdb_id"].append(imdb_id)
+                for name, value in zip(SCHEMA.names[1:], row):
+                    columns[name].append(value)
+            films += 1
+            if len(columns["imdb_id"]) >= rows_per_group:
+                flush(writer)
+        flush(writer)
+    os.replace(tmp_path, path)
+    _write_conflicts(path, conflicts)
+    return {"rows": films, "duplicates": duplicates, "conflicts": len(conflicts)}
+
+
+def merge_stage(stage):
+    """Merge every output of a sharded stage; returns {output path: stats}.
+
+    The shard files are removed only once every output has been merged, so
+    a failed merge can simply be run again.
+    """
+    spec = STAGES[stage]
+    paths = list(spec.outputs) + list(spec.kept)
+    merged_shards = [file for path in paths for _, file in shard_files(path)]
+    results = {}
+    for path in paths:
+        merge = merge_cues if path.endswith(".parquet") else merge_csv
+        results[path] = merge(path, incremental=spec.incremental or path in spec.kept)
+    if stage == "descriptions":
+        merge_packs("descriptions")
+    for file in merged_shards:
+        os.remove(file)
+    return results
+
+
+def merge_packs(name):
+    """Copy the entries of the shard packs of <name> into the <name> pack, then remove them.
+
+    Shard packs are found by their index files, since a compacted pack's
+    data file has a generation number in its name.
+    """
+    from artifact_pack import PACK_DIR, ArtifactPack
+
+    index_ext = ".index.json"
+    merged, shard_packs = 0, []
+    with ArtifactPack(name) as target:
+        for _, file in shard_files(os.path.join(PACK_DIR, name + index_ext), ext=index_ext):
+            with ArtifactPack(os.path.basename(file)[:-len(index_ext)]) as shard:
+                target.add_many((key, shard.get(key)) for key in sorted(shard.entries))
+                merged += len(shard)
+                shard_packs.append((shard.index_path, shard.path))
+    # The target's index is synced by add_many; only then do the shard packs go
+    for index_path, pack_path in shard_packs:
+        os.remove(index_path)
+        os.remove(pack_path)
+    return merged
+
+
+# === Local fan-out ===
+def run_local(stage, n_shards, workers=None, env=None):
+    """Run all shards of `stage` as local processes (at most `workers` at a time).
+
+    The processes share the API quotas the scripts were written for: each
+    one's rate limits are divided by the number running at once
+    (RATE_LIMIT_DIVISOR), so together they stay within a single run's rate.
+    A divisor already set, e.g. for shards on several machines, is multiplied.
+    Returns {shard index: return code}; each shard logs to data/logs/<stage>.shard-i-of-N.log.
+    """
+    spec = STAGES[stage]
+    workers = min(workers or os.cpu_count() or 1, n_shards)
+    env = {**os.environ, **(env or {})}
+    env["RATE_LIMIT_DIVISOR"] = str(rate_limit_divisor(env) * workers)
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    def run(index):
+        shard = Shard(index, n_shards)
+        log_path = os.path.join(LOG_DIR, f"{stage}{shard_suffix(shard)}.log")
+        with open(log_path, "w", encoding="utf-8") as log:
+            proc = subprocess.run([sys.executable, spec.script, "--shard", f"{index}/{n_shards}"],
+                                  cwd=PROJECT_DIR, stdout=log, stderr=subprocess.STDOUT,
+                                  env=env)
+        return index, proc.returncode
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(run, range(n_shards)))
+
+
+def _report(results):
+    for path, stats in results.items():
+        print(f"✅ {os.path.relpath(path, PROJECT_DIR)}: {stats['rows']} films, "
+              f"{stats['duplicates']} duplicates dropped, {stats['conflicts']} conflicts")
+        if stats["conflicts"]:
+            print(f"⚠️ Conflicting rows listed in {os.path.splitext(path)[0]}.conflicts.csv")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run stages in shards and merge their outputs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="run every shard of a stage locally, then merge")
+    run_parser.add_argument("stage", choices=list(STAGES))
+    run_parser.add_argument("--shards", type=int, required=True)
+    run_parser.add_argument("--workers", type=int, default=None, help="processes at a time (default: CPU count)")
+    merge_parser = sub.add_parser("merge", help="merge the shard outputs of a stage")
+    merge_parser.add_argument("stage", choices=list(STAGES))
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        if args.shards < 1:
+            parser.error("--shards must be at least 1")
+        codes = run_local(args.stage, args.shards, args.workers)
+        failed = sorted(i for i, code in codes.items() if code)
+        if failed:
+            print(f"❌ Shards {failed} of {args.stage} failed; see data/logs/. Nothing was merged.")
+            raise SystemExit(1)
+        print(f"🧩 {args.shards} shards of {args.stage} finished")
+    _report(merge_stage(args.stage))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import re
+from collections import namedtuple
+
+Cue = namedtuple("Cue", ["cue_index", "start_ms", "end_ms", "text"])
+
+TIMESTAMP_RE = re.compile(
+    r"(\d{1,2}):(\d{2}):(\d{2})[,.](\d{1,3})\s*-->\s*(\d{1,2}):(\d{2}):(\d{2})[,.](\d{1,3})"
+)
+# Inline formatting: <i>, <font ...>, and ASS-style overrides like {\an8}
+MARKUP_RE = re.compile(r"<[^>]+>|\{\\[^}]*\}")
+
+
+def _to_ms(h, m, s, ms):
+    return ((int(h) * 60 + int(m)) * 60 + int(s)) * 1000 + int(ms.ljust(3, "0"))
+
+
+def clean_text(lines):
+    text = " ".join(MARKUP_RE.sub("", line).strip() for line in lines)
+    return " ".join(text.split())
+
+
+def iter_cues(lines):
+    """Stream cues from an iterable of SRT lines (e.g. an open file).
+
+    Yields `Cue(cue_index, start_ms, end_ms, text)` with integer millisecond
+    timestamps and dialogue-only text. Cue numbers are assigned sequentially,
+    so missing or malformed index lines in the source are tolerated. Input
+    that contains no timestamp lines (HTML error pages, empty files) yields
+    nothing.
+    """
+    cue_index = 0
+    start = end = None
+    text_lines = []
+
+    for raw in lines:
+        line = raw.strip().lstrip("\ufeff")
+        match = TIMESTAMP_RE.search(line)
+        if match or not line:
+            # A timestamp without a blank separator still closes the open cue;
+            # its trailing number line is the next cue's index, not dialogue
+            if match and text_lines and text_lines[-1].isdigit():
+                text_lines.pop()
+            text = clean_text(text_lines) if start is not None else ""
+            if text:
+                cue_index += 1
+                yield Cue(cue_index, start, end, text)
+            start = end = None
+            text_lines = []
+            if match:
+                g = match.groups()
+                start, end = _to_ms(*g[:4]), _to_ms(*g[4:])
+        elif start is not None:
+            text_lines.append(line)
+        # Anything else is a cue number or junk between cues
+
+    text = clean_text(text_lines) if start is not None else ""
+    if text:
+        yield Cue(cue_index + 1, start, end, text)
+
+
+def parse_file(path):
+    """Parse an SRT file lazily; undecodable bytes are ignored."""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        yield from iter_cues(f)
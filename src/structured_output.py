@@ -0,0 +1,85 @@
+import json
+import re
+
+import pandas as pd
+
+# The four-theme coding schema and the labels the prompt allows for each theme
+THEME_LABELS = {
+    "hindu_muslim": ["Exclusionary", "Inclusive", "Neutral"],
+    "gender": ["Progressive", "Conservative", "Neutral"],
+    "nationalism": ["Positive", "Negative", "Neutral"],
+    "caste": ["Reinforcing", "Challenging", "Neutral"],
+}
+THEMES = list(THEME_LABELS)
+
+_CANONICAL = {theme: {label.lower(): label for label in labels} for theme, labels in THEME_LABELS.items()}
+FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
+
+def extract_json(text):
+    """Decode the JSON object in a model response, fenced or not."""
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("empty response")
+    fenced = FENCE_RE.search(text)
+    candidate = fenced.group(1) if fenced else text
+    start, end = candidate.find("{"), candidate.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("no JSON object in response")
+    try:
+        return json.loads(candidate[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON: {e}") from None
+
+
+def validate(obj):
+    """Canonical {theme: label} for a decoded response, or ValueError.
+
+    Labels are matched case-insensitively against the allowed set; extra
+    keys are ignored.
+    """
+    if not isinstance(obj, dict):
+        raise ValueError(f"expected a JSON object, got {type(obj).__name__}")
+    coding, problems = {}, []
+    for theme in THEMES:
+        value = obj.get(theme)
+        label = _CANONICAL[theme].get(str(value).strip().lower()) if value is not None else None
+        if label is None:
+            problems.append(f"{theme}={value!r}")
+        coding[theme] = label
+    if problems:
+        raise ValueError("invalid labels: " + ", ".join(problems))
+    return coding
+
+
+def parse_response(text):
+    return validate(extract_json(text))
+
+
+def parse_frame(df, raw_col="raw", id_cols=("imdb_id",)):
+    """Parse a column of model responses into a wide frame plus rejects.
+
+    Returns (wide, rejects): `wide` has the id columns and one column per
+    theme, built in a single DataFrame construction; `rejects` keeps the id
+    columns, the raw text and the reason each row failed.
+    """
+    id_cols = list(id_cols)
+    raw = df[raw_col] if raw_col in df else pd.Series([None] * len(df), index=df.index)
+    ids = df[id_cols].to_numpy()
+
+    good, bad = [], []
+    for row_ids, text in zip(ids, raw.to_numpy()):
+        try:
+            coding = parse_response(text)
+        except ValueError as e:
+            bad.append([*row_ids, text, str(e)])
+            continue
+        good.append([*row_ids, *(coding[theme] for theme in THEMES)])
+
+    wide = pd.DataFrame(good, columns=id_cols + THEMES)
+    rejects = pd.DataFrame(bad, columns=id_cols + [raw_col, "reason"])
+    return wide, rejects
+
+
+def to_long(wide, id_vars):
+    """One row per (film, theme) with its sentiment_category."""
+    return wide.melt(id_vars=id_vars, value_vars=THEMES, var_name="theme", value_name="sentiment_category")
@@ -1,38 +1,34 @@
 # %%
 import os
-import time
 import re
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 from dotenv import load_dotenv
 
-# === Load environment variables from .env file ===
-load_dotenv()
-API_KEY = os.getenv("OPENSUBTITLES_API_KEY")
-
-if not API_KEY:
-    raise ValueError("API key not found. Please set OPENSUBTITLES_API_KEY in your .env file.")
-
-HEADERS = {
-    "Api-Key": API_KEY,
-    "User-Agent": "BollywoodSubDownloader v1.0"
-}
+from cue_store import CUE_STORE_PATH, build_cue_store, srt_files
+from http_replay import api_key
+from http_utils import TokenBucket, make_session, request_with_retry
+from instrumentation import metrics, start_run
+from manifest import Manifest
+from movie_store import load_sample
+from sharding import in_shard, shard_path, shard_suffix, stage_args
+from srt_parser import parse_file
 
 # === Set working directories ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
-SAMPLE_PATH = os.path.join(PROJECT_DIR, "data", "sampled", "movies_sampled.csv")
 SUBTITLE_DIR = os.path.join(PROJECT_DIR, "data", "subtitles")
-os.makedirs(SUBTITLE_DIR, exist_ok=True)
 
-# === Load sampled movies ===
-df = pd.read_csv(SAMPLE_PATH)
+# === Load environment variables from .env file ===
+load_dotenv()
 
-# === List to collect subtitle text ===
-subtitle_data = []
+# === Concurrency settings ===
+# Throughput is bounded by the shared request budget, not by serial latency.
+MAX_WORKERS = int(os.getenv("SUBTITLE_WORKERS", "8"))
+REQUESTS_PER_SECOND = float(os.getenv("SUBTITLE_RPS", "4"))
 
 # === Function to download subtitle and return file path ===
-def download_subtitle(imdb_id, title):
+def download_subtitle(imdb_id, title, session, bucket):
     print(f"\n🔍 Searching subtitle for: {title} ({imdb_id})")
 
     search_url = "https://api.opensubtitles.com/api/v1/subtitles"
@@ -49,7 +45,7 @@ def download_subtitle(imdb_id, title):
         params["query"] = title
 
     try:
-        response = requests.get(search_url, headers=HEADERS, params=params)
+        response = request_with_retry(session, "GET", search_url, bucket=bucket, params=params)
         if response.status_code != 200:
             print(f"❌ Search failed. Status code: {response.status_code}")
             return None
@@ -70,7 +66,7 @@ def download_subtitle(imdb_id, title):
 
     try:
         download_url = "https://api.opensubtitles.com/api/v1/download"
-        download_response = requests.post(download_url, headers=HEADERS, json={"file_id": file_id})
+        download_response = request_with_retry(session, "POST", download_url, bucket=bucket, json={"file_id": file_id})
         if download_response.status_code != 200:
             print(f"❌ Failed to get download link. Status code: {download_response.status_code}")
             return None
@@ -89,7 +85,9 @@ def download_subtitle(imdb_id, title):
     file_path = os.path.join(SUBTITLE_DIR, f"{safe_name}.srt")
 
     try:
-        srt = requests.get(link).content
+        srt_response = request_with_retry(session, "GET", link, bucket=bucket)
+        srt_response.raise_for_status()
+        srt = srt_response.content
         with open(file_path, "wb") as f:
             f.write(srt)
         print(f"✅ Subtitle saved: {file_path}")
@@ -98,44 +96,93 @@ def download_subtitle(imdb_id, title):
         print(f"❌ Failed to save subtitle: {e}")
         return None
 
-# === Loop through each row in dataset ===
-print("\n🚀 Starting subtitle download process...")
-
-for _, row in df.iterrows():
-    imdb_id = row.get("imdb_id", None)
-    title = row.get("original_title", "Unknown Title")
-
-    if pd.isna(title) or not isinstance(title, str):
-        continue
-
-    subtitle_path = download_subtitle(imdb_id, title)
-    if subtitle_path and os.path.exists(subtitle_path):
-        try:
-            with open(subtitle_path, "r", encoding="utf-8", errors="ignore") as f:
-                text = f.read()
-            subtitle_data.append({
-                "imdb_id": imdb_id,
-                "original_title": title,
-                "subtitle_text": text
-            })
-        except Exception as e:
-            print(f"⚠️ Could not read {subtitle_path}: {e}")
-
-    time.sleep(2)  # Respect rate limits
-
-# === Save to CSV with append logic ===
-combined_csv_path = os.path.join(SUBTITLE_DIR, "subtitles_all.csv")
-
-if os.path.exists(combined_csv_path):
-    existing_df = pd.read_csv(combined_csv_path)
-    updated_df = pd.concat([existing_df, pd.DataFrame(subtitle_data)], ignore_index=True)
-else:
-    updated_df = pd.DataFrame(subtitle_data)
-
-# Drop duplicates based on imdb_id
-updated_df = updated_df.drop_duplicates(subset="imdb_id", keep="last")
-
-# Save to CSV
-updated_df.to_csv(combined_csv_path, index=False, encoding="utf-8")
-print(f"\n📁 All subtitles saved to: {combined_csv_path}")
+# === Fetch a single movie and check that it is a real SRT file ===
+def fetch_movie(imdb_id, title, session, bucket):
+    subtitle_path = download_subtitle(imdb_id, title, session, bucket)
+    if not subtitle_path or not os.path.exists(subtitle_path):
+        return None, "no subtitle downloaded"
+    # Blocked or error pages are sometimes served instead of the file
+    n_cues = sum(1 for _ in parse_file(subtitle_path))
+    if n_cues == 0:
+        return None, "downloaded file has no subtitle cues"
+    return subtitle_path, n_cues
+
+# === Legacy subtitles only count as fetched if their file has cues (block pages do not) ===
+def legacy_problem(imdb_id):
+    subtitle_path = os.path.join(SUBTITLE_DIR, f"{imdb_id}.srt")
+    if not os.path.exists(subtitle_path):
+        return "legacy subtitle file missing"
+    if not any(True for _ in parse_file(subtitle_path)):
+        return "legacy subtitle file has no subtitle cues"
+    return None
+
+def main(argv=None):
+    shard = stage_args("Download English subtitles for the sampled movies.", argv).shard
+
+    API_KEY = api_key("OPENSUBTITLES_API_KEY")
+
+    HEADERS = {
+        "Api-Key": API_KEY,
+        "User-Agent": "BollywoodSubDownloader v1.0"
+    }
 
+    # === Per-host latency, retries and stage timings are reported in data/reports/ ===
+    run = start_run("subtitles" + shard_suffix(shard))
+
+    session = make_session(pool_size=MAX_WORKERS, headers=HEADERS)
+    bucket = TokenBucket(REQUESTS_PER_SECOND)
+    os.makedirs(SUBTITLE_DIR, exist_ok=True)
+
+    # === Load sampled movies ===
+    df = load_sample(["imdb_id", "original_title"])
+
+    # === Resume from the manifest: only missing or failed movies are fetched ===
+    # (ids in a legacy subtitles_all.csv count as already fetched if their .srt has cues)
+    manifest = Manifest("subtitles")
+    manifest.seed_from_csv(os.path.join(SUBTITLE_DIR, "subtitles_all.csv"), check=legacy_problem)
+
+    # === Fetch all pending movies concurrently ===
+    movies = {}
+    for _, row in df.iterrows():
+        imdb_id = row.get("imdb_id", None)
+        title = row.get("original_title", "Unknown Title")
+
+        if pd.isna(title) or not isinstance(title, str):
+            continue
+        if not in_shard(imdb_id if pd.notna(imdb_id) else title, shard):
+            continue
+
+        movies[imdb_id if pd.notna(imdb_id) else title] = (imdb_id, title)
+
+    pending = manifest.pending(list(movies))
+    print(f"\n🚀 Starting subtitle download for {len(pending)} of {len(movies)} movies "
+          f"({MAX_WORKERS} workers, {REQUESTS_PER_SECOND} req/s)...")
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {executor.submit(fetch_movie, *movies[key], session, bucket): key for key in pending}
+
+        # Checkpoint each movie as it finishes so a crash loses only work in flight
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                subtitle_path, detail = future.result()
+            except Exception as e:
+                manifest.mark_failed(key, e)
+                continue
+            if subtitle_path:
+                manifest.mark_done(key, cues=detail)
+            else:
+                manifest.mark_failed(key, detail)
+
+    # === Rebuild the columnar cue store from all downloaded SRT files (a shard only packs its own) ===
+    cue_path = shard_path(CUE_STORE_PATH, shard)
+    with metrics.stage("cue_store"):
+        sources = [(key, path) for key, path in srt_files(SUBTITLE_DIR) if in_shard(key, shard)]
+        n_films = build_cue_store(sources, cue_path)
+    print(f"\n📁 Cue store with {n_films} films saved to: {cue_path}")
+    print(f"📋 Manifest: {manifest.summary()}")
+    print(f"📊 Run report: {run.finish(manifest=manifest.summary())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+import argparse
+import bisect
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+from array import array
+from collections import defaultdict
+
+import pandas as pd
+
+from cue_store import CUE_STORE_PATH, iter_film_cues
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+INDEX_DIR = os.path.join(PROJECT_DIR, "data", "index")
+DESCRIPTIONS_CSV = os.path.join(PROJECT_DIR, "data", "descriptions", "descriptions_all.csv")
+
+FIELDS = ("dialogue", "plot")
+SEGMENT_DOCS = 2_000
+BM25_K1, BM25_B = 1.2, 0.75
+
+TOKEN_RE = re.compile(r"\w+")
+QUERY_RE = re.compile(r'"([^"]*)"|NEAR/(\d+)|(\S+)')
+
+
+def tokenize(text):
+    """Lowercased word tokens; the same tokenizer is used for documents and queries."""
+    return TOKEN_RE.findall(text.lower()) if isinstance(text, str) else []
+
+
+# === On-disk segments ===
+#
+# An index is a directory of immutable segments plus meta.json listing them
+# in order. Each segment holds:
+#   terms.txt      sorted terms, one per line
+#   terms.bin      uint32 pairs (first posting, document frequency) per term
+#   postings.bin   uint32 triples (doc, term frequency, first position) per posting
+#   positions.bin  uint32 token positions, grouped by posting
+#   cue_starts.bin, cue_ids.bin
+#                  first token position and cue_index of every cue, per doc
+#   docs.json      [imdb_id, field, length, first cue, number of cues] per doc
+# The .bin files are native-endian and memory-mapped when queried.
+
+class _SegmentWriter:
+    def __init__(self):
+        self.docs = []
+        self.cue_starts = array("I")
+        self.cue_ids = array("I")
+        self.postings = defaultdict(list)
+
+    def add(self, imdb_id, field, cues):
+        """Index one document given as (cue_index, text) pairs; a plot is a single cue."""
+        doc = len(self.docs)
+        first_cue = len(self.cue_starts)
+        positions = defaultdict(lambda: array("I"))
+        position = 0
+        for cue_index, text in cues:
+            self.cue_starts.append(position)
+            self.cue_ids.append(cue_index)
+            for token in tokenize(text):
+                positions[token].append(position)
+                position += 1
+        self.docs.append([imdb_id, field, position, first_cue, len(self.cue_starts) - first_cue])
+        for term, term_positions in positions.items():
+            self.postings[term].append((doc, term_positions))
+
+    def write(self, segment_dir):
+        terms = sorted(self.postings)
+        term_table, postings, positions = array("I"), array("I"), array("I")
+        for term in terms:
+            entries = self.postings[term]
+            term_table.extend((len(postings) // 3, len(entries)))
+            for doc, term_positions in entries:
+                postings.extend((doc, len(term_positions), len(positions)))
+                positions.extend(term_positions)
+
+        tmp_dir = segment_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        with open(os.path.join(tmp_dir, "terms.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(terms))
+        for name, values in [("terms.bin", term_table), ("postings.bin", postings),
+                             ("positions.bin", positions), ("cue_starts.bin", self.cue_starts),
+                             ("cue_ids.bin", self.cue_ids)]:
+            with open(os.path.join(tmp_dir, name), "wb") as f:
+                values.tofile(f)
+        with open(os.path.join(tmp_dir, "docs.json"), "w", encoding="utf-8") as f:
+            json.dump(self.docs, f)
+        os.replace(tmp_dir, segment_dir)
+
+
+class _Segment:
+    def __init__(self, segment_dir):
+        with open(os.path.join(segment_dir, "terms.txt"), encoding="utf-8") as f:
+            content = f.read()
+        self.terms = {term: i for i, term in enumerate(content.split("\n"))} if content else {}
+        with open(os.path.join(segment_dir, "docs.json"), encoding="utf-8") as f:
+            self.docs = json.load(f)
+        self._maps, self._views = [], []
+        self.term_table = self._map(segment_dir, "terms.bin")
+        self.postings = self._map(segment_dir, "postings.bin")
+        self.positions = self._map(segment_dir, "positions.bin")
+        self.cue_starts = self._map(segment_dir, "cue_starts.bin")
+        self.cue_ids = self._map(segment_dir, "cue_ids.bin")
+
+    def _map(self, segment_dir, name):
+        path = os.path.join(segment_dir, name)
+        if os.path.getsize(path) == 0:
+            return memoryview(array("I"))
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped).cast("I")
+        self._maps.append(mapped)
+        self._views.append(view)
+        return view
+
+    def postings_for(self, term):
+        """[(doc, tf, first position)] for a term; only the posting triples are read."""
+        i = self.terms.get(term)
+        if i is None:
+            return []
+        start, df = self.term_table[2 * i], self.term_table[2 * i + 1]
+        flat = self.postings[3 * start:3 * (start + df)].tolist()
+        return list(zip(flat[0::3], flat[1::3], flat[2::3]))
+
+    def positions_of(self, first, tf):
+        return self.positions[first:first + tf].tolist()
+
+    def cue_of(self, doc, position):
+        _, _, _, first_cue, n_cues = self.docs[doc]
+        starts = self.cue_starts[first_cue:first_cue + n_cues]
+        return self.cue_ids[first_cue + bisect.bisect_right(starts, position) - 1]
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        for mapped in self._maps:
+            mapped.close()
+
+
+def _read_meta(index_dir):
+    path = os.path.join(index_dir, "meta.json")
+    if not os.path.exists(path):
+        return {"segments": []}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_meta(index_dir, meta):
+    path = os.path.join(index_dir, "meta.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+# === Building and incremental updates ===
+
+def iter_documents(imdb_ids=None, cue_path=CUE_STORE_PATH, descriptions_path=DESCRIPTIONS_CSV):
+    """Yield (imdb_id, field, [(cue_index, text), ...]) for dialogue and plot documents."""
+    if os.path.exists(cue_path):
+        for imdb_id, cues in iter_film_cues(imdb_ids, cue_path):
+            yield imdb_id, "dialogue", cues
+    if os.path.exists(descriptions_path):
+        plots = pd.read_csv(descriptions_path, usecols=["imdb_id", "plot"]).dropna()
+        plots = plots.drop_duplicates("imdb_id", keep="last")
+        if imdb_ids is not None:
+            plots = plots[plots["imdb_id"].isin(set(imdb_ids))]
+        for imdb_id, plot in plots.itertuples(index=False):
+            yield imdb_id, "plot", [(0, plot)]
+
+
+def indexed_documents(index_dir=INDEX_DIR):
+    """Set of (imdb_id, field) already in the index."""
+    indexed = set()
+    for name in _read_meta(index_dir)["segments"]:
+        with open(os.path.join(index_dir, name, "docs.json"), encoding="utf-8") as f:
+            indexed.update((imdb_id, field) for imdb_id, field, *_ in json.load(f))
+    return indexed
+
+
+def update_index(documents=None, index_dir=INDEX_DIR, reindex=False, segment_docs=SEGMENT_DOCS):
+    """Add documents to the index as new segments; returns the number added.
+
+    `documents` yields (imdb_id, field, cues) and defaults to the cue store
+    and OMDb plots. Documents already indexed are skipped unless `reindex`,
+    in which case the new copy supersedes the old one at query time.
+    Existing segments are never rewritten, and meta.json is only updated
+    after a segment is complete, so an interrupted update loses nothing.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    documents = iter_documents() if documents is None else documents
+    meta = _read_meta(index_dir)
+    skip = set() if reindex else indexed_documents(index_dir)
+
+    added = 0
+    writer = _SegmentWriter()
+
+    def flush():
+        name = f"seg_{len(meta['segments']):05d}"
+        writer.write(os.path.join(index_dir, name))
+        meta["segments"].append(name)
+        _write_meta(index_dir, meta)
+
+    for imdb_id, field, cues in documents:
+        if (imdb_id, field) in skip:
+            continue
+        writer.add(imdb_id, field, cues)
+        added += 1
+        if len(writer.docs) >= segment_docs:
+            flush()
+            writer = _SegmentWriter()
+    if writer.docs:
+        flush()
+    return added
+
+
+def build_index(documents=None, index_dir=INDEX_DIR, segment_docs=SEGMENT_DOCS):
+    """Rebuild the index from scratch (also compacts superseded documents away)."""
+    shutil.rmtree(index_dir, ignore_errors=True)
+    return update_index(documents, index_dir, segment_docs=segment_docs)
+
+
+# === Queries ===
+
+def parse_query(query):
+    """Split a query into clauses, all of which must match.
+
+    Bare words and "quoted phrases" become phrase clauses (a list of
+    tokens); `a NEAR/k b` joins its neighbours into ("near", a, b, k),
+    matching when at most k tokens separate them in either order.
+    """
+    clauses, near = [], None
+    for phrase, distance, word in QUERY_RE.findall(query):
+        if distance:
+            if not clauses or clauses[-1][0] != "phrase":
+                raise ValueError("NEAR needs a term or phrase on its left")
+            near = (clauses.pop()[1], int(distance))
+            continue
+        tokens = tokenize(phrase if phrase else word)
+        if not tokens:
+            continue
+        if near:
+            clauses.append(("near", near[0], tokens, near[1]))
+            near = None
+        else:
+            clauses.append(("phrase", tokens))
+    if near:
+        raise ValueError("NEAR needs a term or phrase on its right")
+    return clauses
+
+
+def _phrase_starts(positions, tokens):
+    """Start positions where `tokens` occur consecutively."""
+    following = [set(positions[t]) for t in tokens[1:]]
+    return [p for p in positions[tokens[0]]
+            if all(p + i + 1 in s for i, s in enumerate(following))]
+
+
+def _near_matches(left_starts, left_len, right_starts, right_len, k):
+    """Start positions of both sides wherever they are at most k tokens apart."""
+    matched = []
+    right_sorted = sorted(right_starts)
+    for p in left_starts:
+        lo = bisect.bisect_left(right_sorted, p - k - right_len)
+        hi = bisect.bisect_right(right_sorted, p + left_len + k)
+        for q in right_sorted[lo:hi]:
+            gap = q - (p + left_len) if q >= p else p - (q + right_len)
+            if 0 <= gap <= k:
+                matched.extend((p, q))
+    return matched
+
+
+class TextIndex:
+    """Read-only view over an index directory.
+
+    Segments are memory-mapped, so opening is cheap and a query only touches
+    the postings of its own terms. Positions are read only for documents that
+    contain every term, and only when a phrase or NEAR clause needs them.
+    """
+
+    def __init__(self, index_dir=INDEX_DIR):
+        self.segments = [_Segment(os.path.join(index_dir, name))
+                         for name in _read_meta(index_dir)["segments"]]
+        # The newest copy of a (imdb_id, field) document supersedes older ones
+        latest = {}
+        for s, segment in enumerate(self.segments):
+            for doc, (imdb_id, field, *_rest) in enumerate(segment.docs):
+                latest[(imdb_id, field)] = (s, doc)
+        self.live = [set() for _ in self.segments]
+        n_docs, total_length = defaultdict(int), defaultdict(int)
+        for (_, field), (s, doc) in latest.items():
+            self.live[s].add(doc)
+            n_docs[field] += 1
+            total_length[field] += self.segments[s].docs[doc][2]
+        self.n_docs = dict(n_docs)
+        self.avg_length = {field: total_length[field] / n_docs[field] for field in n_docs}
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def search(self, query, k=10, field=None):
+        """Top-k documents matching every clause, ranked by BM25 over the query terms.
+
+        Returns a DataFrame with imdb_id, field, score and, for dialogue,
+        the cue_index of every cue containing a match.
+        """
+        clauses = parse_query(query)
+        terms = sorted({t for clause in clauses for part in clause[1:3] if isinstance(part, list) for t in part})
+        if not terms:
+            return pd.DataFrame(columns=["imdb_id", "field", "score", "cues"])
+        needs_positions = any(c[0] == "near" or len(c[1]) > 1 for c in clauses)
+
+        # Postings of every term, restricted to live documents of the wanted field
+        per_segment, df = [], defaultdict(lambda: defaultdict(int))
+        for s, segment in enumerate(self.segments):
+            postings = {}
+            for term in terms:
+                entries = {}
+                for doc, tf, first in segment.postings_for(term):
+                    doc_field = segment.docs[doc][1]
+                    if doc in self.live[s] and (field is None or doc_field == field):
+                        entries[doc] = (tf, first)
+                        df[doc_field][term] += 1
+                postings[term] = entries
+            per_segment.append(postings)
+
+        results = []
+        for s, segment in enumerate(self.segments):
+            postings = per_segment[s]
+            candidates = set.intersection(*(set(postings[t]) for t in terms))
+            for doc in candidates:
+                imdb_id, doc_field, length, _, _ = segment.docs[doc]
+                matched = []
+                if needs_positions:
+                    positions = {t: segment.positions_of(postings[t][doc][1], postings[t][doc][0]) for t in terms}
+                    matched = self._match_clauses(clauses, positions)
+                    if matched is None:
+                        continue
+                score = self._bm25(
+                    [postings[t][doc][0] for t in terms], [df[doc_field][t] for t in terms], length, doc_field
+                )
+                if doc_field == "dialogue":
+                    if not matched:
+                        tf, first = postings[terms[0]][doc]
+                        matched = segment.positions_of(first, tf)
+                    cues = sorted({segment.cue_of(doc, p) for p in matched})
+                else:
+                    cues = []
+                results.append((imdb_id, doc_field, round(score, 4), cues))
+
+        results.sort(key=lambda r: (-r[2], r[0], r[1]))
+        return pd.DataFrame(results[:k], columns=["imdb_id", "field", "score", "cues"])
+
+    @staticmethod
+    def _match_clauses(clauses, positions):
+        """Matched start positions for a document, or None if a clause fails."""
+        matched = []
+        for clause in clauses:
+            if clause[0] == "phrase":
+                starts = _phrase_starts(positions, clause[1])
+            else:
+                _, left, right, k = clause
+                starts = _near_matches(_phrase_starts(positions, left), len(left),
+                                       _phrase_starts(positions, right), len(right), k)
+            if not starts:
+                return None
+            matched.extend(starts)
+        return matched
+
+    def _bm25(self, tfs, dfs, length, field):
+        n = self.n_docs.get(field, 0)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self.avg_length[field])
+        score = 0.0
+        for tf, df in zip(tfs, dfs):
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            score += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return score
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Full-text index over subtitle cues and plots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help="rebuild the index from scratch")
+    update = commands.add_parser("update", help="index films not yet in the index")
+    update.add_argument("--reindex", nargs="*", metavar="IMDB_ID", help="re-index these films")
+    search = commands.add_parser("search", help='e.g. "pakistan NEAR/5 army" or \'"border security"\'')
+    search.add_argument("query")
+    search.add_argument("--k", type=int, default=10)
+    search.add_argument("--field", choices=FIELDS)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(f"✅ Indexed {build_index()} documents into {INDEX_DIR}")
+    elif args.command == "update":
+        if args.reindex:
+            added = update_index(iter_documents(args.reindex), reindex=True)
+        else:
+            added = update_index()
+        print(f"✅ Added {added} documents to {INDEX_DIR}")
+    else:
+        with TextIndex() as index:
+            print(index.search(args.query, k=args.k, field=args.field).to_string(index=False))
@@ -1,45 +1,41 @@
 import os
+import json
 import pandas as pd
-import google.generativeai as genai
 from dotenv import load_dotenv
 from tqdm import tqdm
 
+from chunking import estimate_tokens, make_windows, reduce_labels, select_windows
+from corpus import iter_films
+from instrumentation import metrics, start_run
+from llm_client import LLMClassifier, make_backend
+from manifest import append_rows
+from near_duplicates import suspect_ids
+from sharding import in_shard, shard_path, shard_suffix, stage_args
+from structured_output import THEMES, parse_response
+
 # === Step 1: Setup ===
 load_dotenv()
-GOOGLE_API_KEY = os.getenv("GEMINI_API_KEY")
-
-if not GOOGLE_API_KEY:
-    raise ValueError("API key not found. Please set GEMINI_API_KEY in your .env file.")
-
-genai.configure(api_key=GOOGLE_API_KEY)
-# Use a stable and supported model
-model = genai.GenerativeModel("models/gemini-2.5-pro")
-
-# === Step 2: Load subtitle and description data ===
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "..", "data")
 
-sub_path = os.path.join(DATA_DIR, "subtitles", "subtitles_all.csv")
-desc_path = os.path.join(DATA_DIR, "descriptions", "descriptions_all.csv")
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "4"))
+LLM_RPS = float(os.getenv("LLM_RPS", "1"))
 
-subtitle_df = pd.read_csv(sub_path)
-description_df = pd.read_csv(desc_path)
+# Map-reduce over cue-aligned windows instead of truncating each film
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "3000"))
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "stratified")  # all | stratified | first
+CHUNK_MAX_WINDOWS = int(os.getenv("CHUNK_MAX_WINDOWS", "8"))
 
-# === Step 3: Merge subtitle and description ===
-df = pd.merge(subtitle_df, description_df, on="imdb_id", how="outer")
-df["combined_text"] = df["subtitle_text"].fillna("") + "\n" + df["plot"].fillna("")
+# Dialogue of subtitles flagged by near_duplicates.py is left out (SUSPECT_SUBTITLES=keep sends it anyway)
+SUSPECT_SUBTITLES = os.getenv("SUSPECT_SUBTITLES", "plot")
 
-# === Step 4: Define prompts ===
-themes = [
-    "Hindu–Muslim relations",
-    "Gender relations",
-    "Nationalism"
-]
+# PRECLASSIFY=1 settles films the offline preclassifier is confident about and sends only the rest to the LLM
+PRECLASSIFY = os.getenv("PRECLASSIFY") == "1"
+PRECLASSIFY_THRESHOLD = float(os.getenv("PRECLASSIFY_THRESHOLD", "0.9"))
 
-custom_theme = "Attitude towards caste hierarchy"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "..", "data")
 
-def make_prompt(text):
-    return f"""
+# === Step 2: Define prompts ===
+PROMPT_TEMPLATE = """
 Analyze the following movie content (subtitle + description) and code it for the following themes:
 
 1. Hindu–Muslim relations: Exclusionary, Inclusive, Neutral
@@ -53,36 +49,188 @@ TEXT:
 {text}
 """
 
-# === Step 5: Run classification ===
-thematic_results = []
-
-for _, row in tqdm(df.iterrows(), total=len(df)):
-    imdb_id = row.get("imdb_id")
-    title = row.get("original_title")
-    text = row.get("combined_text")
-
-    if not text or len(text.strip()) < 100:
-        print(f"⏩ Skipping {title} due to short text.")
-        continue
-
-    try:
-        prompt = make_prompt(text[:12000])  # Gemini token limits
-        response = model.generate_content(prompt)
-        result = response.text.strip()
-        
-        # Try parsing JSON-like response
-        result_dict = eval(result) if result.startswith("{") else {"raw": result}
-
-        result_dict.update({"imdb_id": imdb_id, "original_title": title})
-        thematic_results.append(result_dict)
-
-    except Exception as e:
-        print(f"⚠️ Error for {title}: {e}")
-        thematic_results.append({"imdb_id": imdb_id, "original_title": title, "error": str(e)})
-
-# === Step 6: Save output ===
-os.makedirs(DATA_DIR, exist_ok=True)
-output_df = pd.DataFrame(thematic_results)
-output_path = os.path.join(DATA_DIR, "thematic_coding.csv")
-output_df.to_csv(output_path, index=False, encoding="utf-8")
-print(f"\n🎉 Thematic coding saved to {output_path}") 
+def make_prompt(text):
+    return PROMPT_TEMPLATE.format(text=text)
+
+
+# === Output rows: one per film, written in batches as films finish ===
+CSV_COLUMNS = ["raw", "imdb_id", "original_title", "n_windows", "windows_classified"] + [
+    f"{theme}_{field}" for theme in THEMES for field in ("confidence", "votes")] + ["source", "error"]
+WRITE_EVERY = 50
+
+# Every film's latest LLM coding, kept across runs: a film the preclassifier
+# settles keeps its LLM labels here, and preclassifier.py trains only on them
+LLM_LABELS_PATH = os.path.join(DATA_DIR, "llm_labels.csv")
+LLM_LABEL_COLUMNS = ["imdb_id", "original_title", "raw"]
+
+
+def save_llm_labels(records, path, previous_output=None):
+    """Add or replace the LLM-coded films of this run in the labels file.
+
+    The first time, the file is seeded with the LLM rows of the previous
+    thematic_coding.csv (rows without a source column all came from the LLM).
+    """
+    frames = []
+    if os.path.exists(path):
+        frames.append(pd.read_csv(path, dtype=str))
+    elif previous_output and os.path.exists(previous_output):
+        previous = pd.read_csv(previous_output, dtype=str)
+        if "source" in previous:
+            previous = previous[previous["source"] == "llm"]
+        frames.append(previous.dropna(subset=["raw"]).reindex(columns=LLM_LABEL_COLUMNS))
+    frames.append(pd.DataFrame(records, columns=LLM_LABEL_COLUMNS, dtype=str))
+    labels = pd.concat(frames, ignore_index=True).drop_duplicates("imdb_id", keep="last")
+    tmp_path = path + ".tmp"
+    labels.to_csv(tmp_path, index=False, encoding="utf-8")
+    os.replace(tmp_path, path)
+    return len(labels)
+
+def film_record(imdb_id, film):
+    """The thematic_coding.csv row for a film whose windows have all been classified."""
+    if "record" in film:
+        return film["record"]
+    if not film["labels"]:
+        error = "; ".join(film["errors"])
+        print(f"⚠️ Error for {film['title']}: {error}")
+        return {"imdb_id": imdb_id, "original_title": film["title"], "error": error}
+
+    coding = reduce_labels(film["labels"], THEMES)
+    record = {
+        "raw": json.dumps({theme: coding[theme]["label"] for theme in THEMES}),
+        "imdb_id": imdb_id,
+        "original_title": film["title"],
+        "n_windows": film["n_windows"],
+        "windows_classified": len(film["labels"]),
+        "source": "llm",
+    }
+    for theme in THEMES:
+        record[f"{theme}_confidence"] = coding[theme]["confidence"]
+        record[f"{theme}_votes"] = json.dumps(coding[theme]["votes"])
+    return record
+
+
+def preclassified_record(imdb_id, title, prediction):
+    """The thematic_coding.csv row for a film settled by the preclassifier."""
+    record = {
+        "raw": json.dumps({theme: prediction[theme] for theme in THEMES}),
+        "imdb_id": imdb_id,
+        "original_title": title,
+        "n_windows": 0,
+        "windows_classified": 0,
+        "source": "preclassifier",
+    }
+    for theme in THEMES:
+        record[f"{theme}_confidence"] = prediction[f"{theme}_confidence"]
+    return record
+
+
+def main(argv=None):
+    shard = stage_args("Code the themes of every film with the LLM.", argv).shard
+
+    # Per-stage timings and LLM latency are reported in data/reports/ (PROFILE=thematic_coding adds a cProfile dump)
+    run = start_run("thematic_coding" + shard_suffix(shard))
+
+    # LLM_BACKEND=stub runs offline with deterministic labels
+    backend = make_backend(model_name="models/gemini-2.5-pro")
+
+    # === Step 3: Stream films one at a time (plot + dialogue from the cue store) ===
+    # Only responses that parse and validate are cached; malformed ones are sent again next run
+    classifier = LLMClassifier(backend, PROMPT_TEMPLATE, workers=LLM_WORKERS, requests_per_second=LLM_RPS,
+                               validate=parse_response)
+    output_path = shard_path(os.path.join(DATA_DIR, "thematic_coding.csv"), shard)
+    tmp_path = output_path + ".tmp"
+    os.makedirs(DATA_DIR, exist_ok=True)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(",".join(CSV_COLUMNS) + "\n")
+
+    # Films whose windows are still being classified, in input order
+    films = {}
+    totals = {"films": 0, "windows": 0, "preclassified": 0}
+
+    preclassifier = None
+    if PRECLASSIFY:
+        # scikit-learn is only needed when the preclassifier is used
+        from preclassifier import MODEL_PATH, Preclassifier, film_text
+
+        if os.path.exists(MODEL_PATH):
+            preclassifier = Preclassifier.load(MODEL_PATH)
+            print(f"🔎 Preclassifier settles films with confidence >= {PRECLASSIFY_THRESHOLD} on every theme")
+        else:
+            print(f"⚠️ PRECLASSIFY=1 but no model at {MODEL_PATH}; run `python src/preclassifier.py train`")
+
+    suspects = suspect_ids() if SUSPECT_SUBTITLES == "plot" else set()
+    if suspects:
+        print(f"🚩 {len(suspects)} flagged subtitles are left out; those films are coded from the plot only")
+
+    # === Step 4: Split each film into windows (plot + a slice of dialogue) ===
+    def jobs():
+        for film in iter_films(plot_only=suspects):
+            if not in_shard(film.imdb_id, shard):
+                continue
+            if len((film.dialogue + film.plot).strip()) < 100:
+                print(f"⏩ Skipping {film.title} due to short text.")
+                continue
+
+            if preclassifier is not None:
+                prediction = preclassifier.predict([film_text(film)])
+                if preclassifier.confident(prediction, PRECLASSIFY_THRESHOLD)[0]:
+                    record = preclassified_record(film.imdb_id, film.title, prediction.iloc[0])
+                    films[film.imdb_id] = {"remaining": 0, "record": record}
+                    totals["films"] += 1
+                    totals["preclassified"] += 1
+                    continue
+
+            budget = max(CHUNK_TOKEN_BUDGET - estimate_tokens(film.plot), CHUNK_TOKEN_BUDGET // 2)
+            windows = make_windows(film.dialogue.split("\n"), budget) if film.dialogue else [""]
+            selected = select_windows(windows, CHUNK_STRATEGY, CHUNK_MAX_WINDOWS)
+
+            films[film.imdb_id] = {"title": film.title, "n_windows": len(windows), "remaining": len(selected),
+                                   "labels": [], "errors": []}
+            totals["films"] += 1
+            totals["windows"] += len(selected)
+            for i in selected:
+                yield (film.imdb_id, i), f"{film.plot}\n{windows[i]}".strip()
+
+    print(f"🧩 Windows of up to {CHUNK_TOKEN_BUDGET} tokens, strategy '{CHUNK_STRATEGY}', max {CHUNK_MAX_WINDOWS}")
+
+    # === Step 5: Classify windows in parallel; write each film once all its windows are back ===
+    ready, llm_labels = [], []
+    with metrics.stage("classify"):
+        for (imdb_id, _), result in tqdm(classifier.classify_iter(jobs())):
+            film = films[imdb_id]
+            try:
+                if isinstance(result, Exception):
+                    raise result
+                film["labels"].append(parse_response(result))
+            except Exception as e:
+                film["errors"].append(str(e))
+            film["remaining"] -= 1
+
+            # Rows keep input order: release finished films from the front only
+            while films:
+                first_id = next(iter(films))
+                if films[first_id]["remaining"]:
+                    break
+                ready.append(film_record(first_id, films.pop(first_id)))
+            if len(ready) >= WRITE_EVERY:
+                llm_labels.extend(r for r in ready if r.get("source") == "llm")
+                append_rows(tmp_path, ready, CSV_COLUMNS)
+                ready = []
+    # Preclassified films after the last LLM result
+    ready.extend(film_record(imdb_id, film) for imdb_id, film in films.items())
+    llm_labels.extend(r for r in ready if r.get("source") == "llm")
+    append_rows(tmp_path, ready, CSV_COLUMNS)
+
+    # === Step 6: Save output; LLM labels are kept separately for training the preclassifier ===
+    labels_path = shard_path(LLM_LABELS_PATH, shard)
+    n_labels = save_llm_labels(llm_labels, labels_path, previous_output=output_path)
+    os.replace(tmp_path, output_path)
+    print(f"🏷️ LLM labels for {n_labels} films kept in {labels_path}")
+    print(f"\n🎉 Thematic coding for {totals['films']} films ({totals['windows']} windows, "
+          f"{totals['preclassified']} settled by the preclassifier) saved to {output_path}")
+    print(f"🗄️ LLM cache: {classifier.stats()}")
+    print(f"📊 Run report: {run.finish(**totals, llm=classifier.stats())}")
+
+
+if __name__ == "__main__":
+    main()
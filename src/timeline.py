@@ -0,0 +1,201 @@
+"""Lexicon hit densities over each film's running time, from cue timestamps.
+
+Every cue is placed in a fixed-width time bin by its midpoint, and the
+keyword hits of each lexicon (lexicon.py) are summed per film and bin. The
+result is one films x bins matrix per lexicon, saved with the number of cues
+per bin so that silence can be told apart from dialogue without hits:
+
+    data/timeline/timeline.npz          imdb_id, bin_seconds, lexicons,
+                                        cues, hits_<lexicon>
+    data/timeline/timeline_summary.csv  one row per film and lexicon
+
+The summary gives hits per minute, the peak bin, the first hit, and both as
+a position in the film's runtime (`runtime` from bollywood_meta, or the end
+of the last cue when the runtime is missing).
+
+    python src/timeline.py                  # 60-second bins
+    python src/timeline.py --bin-seconds 30
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from cue_store import CUE_STORE_PATH
+from lexicon import LexiconMatcher
+from movie_store import load_movies
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+TIMELINE_DIR = os.path.join(PROJECT_DIR, "data", "timeline")
+TIMELINE_PATH = os.path.join(TIMELINE_DIR, "timeline.npz")
+SUMMARY_PATH = os.path.join(TIMELINE_DIR, "timeline_summary.csv")
+
+BIN_SECONDS = 60
+MAX_MINUTES = 300  # cues timed later than this are treated as broken timestamps and dropped
+BATCH_SIZE = 65_536
+
+
+def iter_cue_batches(path=CUE_STORE_PATH, batch_size=BATCH_SIZE):
+    """Yield (imdb_ids, dictionary codes, start_ms, end_ms, texts) per Parquet batch.
+
+    imdb_id is dictionary-encoded in the store, so each batch comes with its
+    own small dictionary and an int array of codes into it.
+    """
+    parquet = pq.ParquetFile(path)
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=["imdb_id", "start_ms", "end_ms", "text"]):
+        ids = batch.column(0)
+        if not hasattr(ids, "dictionary"):
+            ids = ids.dictionary_encode()
+        yield (ids.dictionary.to_pylist(),
+               ids.indices.to_numpy(zero_copy_only=False).astype(np.int64),
+               batch.column(1).to_numpy(zero_copy_only=False).astype(np.int64),
+               batch.column(2).to_numpy(zero_copy_only=False).astype(np.int64),
+               batch.column(3).to_pylist())
+
+
+def lexicon_membership(matcher):
+    """(n_terms, n_lexicons) 0/1 matrix: counts @ membership gives hits per lexicon."""
+    membership = np.zeros((len(matcher.terms), len(matcher.lexicons)), dtype=np.int32)
+    for j, lexicon in enumerate(matcher.lexicons):
+        membership[matcher.columns(lexicon), j] = 1
+    return membership
+
+
+def build_timeline(path=CUE_STORE_PATH, bin_seconds=BIN_SECONDS, matcher=None, max_minutes=MAX_MINUTES):
+    """Bin lexicon hits by cue time for every film in the cue store.
+
+    Returns a dict of arrays: imdb_id, bin_seconds, lexicons, cues (films x
+    bins), last_cue_ms (films) and hits_<lexicon> (films x bins). The store
+    is streamed batch by batch; binning and accumulation are array operations
+    over the whole batch.
+    """
+    matcher = matcher or LexiconMatcher()
+    membership = lexicon_membership(matcher)
+    lexicons = list(matcher.lexicons)
+    bin_ms = bin_seconds * 1000
+    n_bins = -(-max_minutes * 60_000 // bin_ms)
+
+    rows = {}
+    capacity = 1_024
+    cues = np.zeros((capacity, n_bins), dtype=np.int32)
+    hits = np.zeros((capacity, n_bins, len(lexicons)), dtype=np.int32)
+    last_cue_ms = np.zeros(capacity, dtype=np.int64)
+
+    for dictionary, codes, start_ms, end_ms, texts in iter_cue_batches(path):
+        lookup = np.array([rows.setdefault(imdb_id, len(rows)) for imdb_id in dictionary], dtype=np.int64)
+        film = lookup[codes]
+        if len(rows) > capacity:
+            grow = max(capacity, len(rows) - capacity)
+            cues = np.concatenate([cues, np.zeros((grow, n_bins), dtype=np.int32)])
+            hits = np.concatenate([hits, np.zeros((grow, n_bins, len(lexicons)), dtype=np.int32)])
+            last_cue_ms = np.concatenate([last_cue_ms, np.zeros(grow, dtype=np.int64)])
+            capacity += grow
+
+        per_lexicon = matcher.count_matrix(texts) @ membership
+        time_bin = (start_ms + end_ms) // 2 // bin_ms
+        keep = (time_bin >= 0) & (time_bin < n_bins)
+        film, time_bin, per_lexicon = film[keep], time_bin[keep], per_lexicon[keep]
+
+        np.add.at(cues, (film, time_bin), 1)
+        np.add.at(hits, (film, time_bin), per_lexicon)
+        np.maximum.at(last_cue_ms, film, end_ms[keep])
+
+    n_films = len(rows)
+    used = np.flatnonzero(cues[:n_films].any(axis=0))
+    n_used = int(used[-1]) + 1 if len(used) else 0
+    timeline = {
+        "imdb_id": np.array(list(rows), dtype=str),
+        "bin_seconds": np.array(bin_seconds),
+        "lexicons": np.array(lexicons, dtype=str),
+        "cues": cues[:n_films, :n_used],
+        "last_cue_ms": last_cue_ms[:n_films],
+    }
+    for j, lexicon in enumerate(lexicons):
+        timeline[f"hits_{lexicon}"] = np.ascontiguousarray(hits[:n_films, :n_used, j])
+    return timeline
+
+
+def save_timeline(timeline, path=TIMELINE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    np.savez_compressed(tmp_path, **timeline)
+    os.replace(tmp_path, path)
+
+
+def load_timeline(path=TIMELINE_PATH):
+    """Saved timeline as a dict of arrays keyed like the npz."""
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+def densities(timeline, lexicon):
+    """Hits per minute for one lexicon, films x bins (float32)."""
+    return timeline[f"hits_{lexicon}"].astype(np.float32) * (60.0 / float(timeline["bin_seconds"]))
+
+
+def runtimes(imdb_ids):
+    """Runtime in minutes per film from the movie store; NaN where unknown."""
+    try:
+        movies = load_movies(["imdb_id", "runtime"], imdb_ids=list(imdb_ids))
+    except Exception as e:
+        print(f"⚠️ Movie store unavailable, runtimes come from the subtitles: {e}")
+        return np.full(len(imdb_ids), np.nan)
+    runtime = movies.set_index("imdb_id")["runtime"].astype("Float64")
+    runtime = runtime[runtime > 0]
+    return runtime.reindex(list(imdb_ids)).to_numpy(dtype=float, na_value=np.nan)
+
+
+def summarise(timeline, runtime_minutes=None):
+    """One row per film and lexicon: totals, peak and first occurrence, absolute and relative to runtime."""
+    imdb_ids = timeline["imdb_id"]
+    bin_minutes = float(timeline["bin_seconds"]) / 60.0
+    runtime = runtimes(imdb_ids) if runtime_minutes is None else np.asarray(runtime_minutes, dtype=float)
+    from_subtitles = np.isnan(runtime)
+    runtime = np.where(from_subtitles, timeline["last_cue_ms"] / 60_000.0, runtime)
+    runtime = np.where(runtime > 0, runtime, np.nan)
+
+    frames = []
+    for lexicon in timeline["lexicons"]:
+        hits = timeline[f"hits_{lexicon}"]
+        if not hits.shape[1]:
+            hits = np.zeros((len(imdb_ids), 1), dtype=np.int32)
+        total = hits.sum(axis=1)
+        any_hit = total > 0
+        peak_minute = np.where(any_hit, (hits.argmax(axis=1) + 0.5) * bin_minutes, np.nan)
+        first_minute = np.where(any_hit, (hits > 0).argmax(axis=1) * bin_minutes, np.nan)
+        frames.append(pd.DataFrame({
+            "imdb_id": imdb_ids,
+            "lexicon": lexicon,
+            "hits": total,
+            "hits_per_minute": (total / runtime).round(4),
+            "peak_hits_per_minute": np.where(any_hit, hits.max(axis=1) / bin_minutes, np.nan),
+            "peak_minute": peak_minute,
+            "peak_position": (peak_minute / runtime).round(4),
+            "first_minute": first_minute,
+            "first_position": (first_minute / runtime).round(4),
+            "runtime_minutes": runtime.round(1),
+            "runtime_source": np.where(from_subtitles, "subtitles", "metadata"),
+        }))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bin lexicon hits over each film's running time.")
+    parser.add_argument("--bin-seconds", type=int, default=BIN_SECONDS, help="width of a time bin")
+    args = parser.parse_args(argv)
+    if args.bin_seconds <= 0:
+        parser.error("--bin-seconds must be positive")
+
+    timeline = build_timeline(bin_seconds=args.bin_seconds)
+    save_timeline(timeline)
+    summary = summarise(timeline)
+    summary.to_csv(SUMMARY_PATH, index=False, encoding="utf-8")
+    print(f"⏱️ {len(timeline['imdb_id'])} films x {timeline['cues'].shape[1]} bins of {args.bin_seconds}s")
+    print(f"✅ Timeline saved to: {TIMELINE_PATH}")
+    print(f"✅ Summary saved to: {SUMMARY_PATH}")
+
+
+if __name__ == "__main__":
+    main()
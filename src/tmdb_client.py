@@ -0,0 +1,59 @@
+import os
+
+from http_utils import TokenBucket, make_session, request_with_retry
+from response_cache import ResponseCache, make_key
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CACHE_PATH = os.path.join(PROJECT_DIR, "data", "cache", "tmdb.sqlite")
+
+API_ROOT = "https://api.themoviedb.org/3"
+IMAGE_ROOT = "https://image.tmdb.org/t/p"
+
+
+class TMDbClient:
+    """TMDb API client shared by poster.py and metadata.py.
+
+    Every successful JSON response is stored in an on-disk cache keyed by
+    endpoint + params, so a rerun over an unchanged sample never touches
+    the network and each imdb_id -> tmdb_id lookup is made only once.
+    """
+
+    def __init__(self, api_key, cache=None, session=None, requests_per_second=4):
+        self.api_key = api_key
+        self.cache = cache if cache is not None else ResponseCache(CACHE_PATH)
+        self.session = session if session is not None else make_session()
+        self.bucket = TokenBucket(requests_per_second)
+
+    def get(self, endpoint, **params):
+        key = make_key(endpoint, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        response = request_with_retry(
+            self.session, "GET", f"{API_ROOT}{endpoint}", bucket=self.bucket,
+            params={"api_key": self.api_key, **params},
+        )
+        if response.status_code != 200:
+            print(f"❌ TMDb request failed for {endpoint}. Status: {response.status_code}")
+            return None
+
+        data = response.json()
+        self.cache.set(key, data)
+        return data
+
+    def find_movie(self, imdb_id):
+        """TMDb movie record for an IMDb id, or None if TMDb has no match."""
+        data = self.get(f"/find/{imdb_id}", external_source="imdb_id")
+        results = (data or {}).get("movie_results", [])
+        return results[0] if results else None
+
+    def movie_details(self, tmdb_id, append_to_response="credits"):
+        return self.get(f"/movie/{tmdb_id}", append_to_response=append_to_response)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+def image_url(poster_path, size="w500"):
+    return f"{IMAGE_ROOT}/{size}{poster_path}"
@@ -0,0 +1,199 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlsplit
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from http_utils import TokenBucket, make_session, request_with_retry
+from response_cache import ResponseCache
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CACHE_PATH = os.path.join(PROJECT_DIR, "data", "cache", "wikipedia.sqlite")
+
+API_URL = "https://en.wikipedia.org/w/api.php"
+USER_AGENT = "BollywoodMetadata/1.0 (research project; python-requests)"
+TITLES_PER_QUERY = 50  # MediaWiki limit for anonymous clients
+
+# lxml is much faster when installed; html.parser is the stdlib fallback
+try:
+    import lxml
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+INFOBOX = SoupStrainer("table", class_="infobox")
+
+UNITS = {"crore": 1e7, "crores": 1e7, "cr": 1e7, "lakh": 1e5, "lakhs": 1e5,
+         "million": 1e6, "billion": 1e9, "thousand": 1e3}
+CURRENCIES = {"₹": "INR", "rs": "INR", "rs.": "INR", "inr": "INR", "us$": "USD", "$": "USD", "usd": "USD"}
+AMOUNT_RE = re.compile(
+    r"(?P<currency>₹|Rs\.?|INR|US\$|USD|\$)\s*"
+    r"(?P<low>\d[\d,]*(?:\.\d+)?)"
+    r"(?:\s*[–—-]\s*(?:₹|Rs\.?|INR|US\$|USD|\$)?\s*(?P<high>\d[\d,]*(?:\.\d+)?))?"
+    r"\s*(?P<unit>crores?|cr\b|lakhs?|million|billion|thousand)?",
+    re.IGNORECASE,
+)
+# Parse checks: infobox string -> (box_office_inr, box_office_usd, box_office_estimate)
+BOX_OFFICE_EXAMPLES = [
+    ("est. ₹93.08 crore (US$11 million)", (930_800_000.0, 11_000_000.0, True)),
+    ("₹10–17 crore", (135_000_000.0, None, False)),
+    ("₹72.5 – ₹83.75 crore", (781_250_000.0, None, False)),
+    ("₹645 million (US$7.6\xa0million)[2]", (645_000_000.0, 7_600_000.0, False)),
+    ("₹72 lakh[1]", (7_200_000.0, None, False)),
+    ("Rs. 5 - Rs. 7 lakh", (600_000.0, None, False)),
+]
+REFERENCE_RE = re.compile(r"\[\d+\]|\[citation needed\]|\[note \d+\]", re.IGNORECASE)
+
+
+def title_from_link(wiki_link):
+    """Article title from an en.wikipedia.org/wiki/... URL."""
+    if not isinstance(wiki_link, str) or "/wiki/" not in wiki_link:
+        return None
+    return unquote(urlsplit(wiki_link).path.split("/wiki/", 1)[1]).replace("_", " ")
+
+
+def clean_value(text):
+    """Infobox cell text without footnote markers and non-breaking spaces."""
+    text = REFERENCE_RE.sub("", text.replace("\xa0", " "))
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def parse_box_office(text):
+    """Numeric box office from an infobox string such as "est. ₹93.08 crore (US$11 million)".
+
+    Returns {"box_office_inr", "box_office_usd", "box_office_estimate"}:
+    the first rupee and first dollar amounts, scaled by crore / lakh /
+    million / billion; a range ("₹10–17 crore", "₹72.5 – ₹83.75 crore")
+    becomes its midpoint.
+    Currencies that are not stated are left as None (no exchange-rate
+    conversion).
+    """
+    result = {"box_office_inr": None, "box_office_usd": None, "box_office_estimate": False}
+    if not isinstance(text, str) or not text.strip():
+        return result
+    text = clean_value(text)
+    result["box_office_estimate"] = bool(re.match(r"(est\.?|estimated|approx)", text, re.IGNORECASE))
+    for match in AMOUNT_RE.finditer(text):
+        currency = CURRENCIES[match.group("currency").lower()]
+        key = "box_office_inr" if currency == "INR" else "box_office_usd"
+        if result[key] is not None:
+            continue
+        low = float(match.group("low").replace(",", ""))
+        high = float(match.group("high").replace(",", "")) if match.group("high") else low
+        unit = UNITS.get((match.group("unit") or "").lower(), 1.0)
+        result[key] = round((low + high) / 2 * unit, 2)
+    return result
+
+
+def parse_infobox(html):
+    """{label: value} for the infobox rows of an article's lead section.
+
+    Only the infobox table is handed to the parser (SoupStrainer), so the
+    rest of the page is never turned into a tree.
+    """
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=INFOBOX)
+    fields = {}
+    for row in soup.find_all("tr"):
+        header, value = row.find("th"), row.find("td")
+        if header is not None and value is not None:
+            fields[clean_value(header.get_text(" "))] = clean_value(value.get_text(" "))
+    return fields
+
+
+class WikipediaClient:
+    """MediaWiki API client that fetches infoboxes by revision.
+
+    Current revision ids are looked up 50 titles per request. Each lead
+    section (section 0, where the infobox lives) is parsed once per
+    revision and cached, so unchanged articles cost one batched
+    revision query and no page download on reruns.
+    """
+
+    def __init__(self, cache=None, session=None, workers=4, requests_per_second=10):
+        self.cache = cache if cache is not None else ResponseCache(CACHE_PATH, ttl=None)
+        self.session = session if session is not None else make_session(
+            pool_size=workers, headers={"User-Agent": USER_AGENT})
+        self.bucket = TokenBucket(requests_per_second)
+        self.workers = workers
+
+    def _api(self, **params):
+        response = request_with_retry(self.session, "GET", API_URL, bucket=self.bucket,
+                                      params={"format": "json", "formatversion": 2, **params})
+        response.raise_for_status()
+        return response.json()
+
+    def revisions(self, titles):
+        """{title: current revid} for the given titles (following redirects)."""
+        revids = {}
+        titles = list(dict.fromkeys(t for t in titles if t))
+        for start in range(0, len(titles), TITLES_PER_QUERY):
+            batch = titles[start:start + TITLES_PER_QUERY]
+            query = self._api(action="query", prop="revisions", rvprop="ids",
+                              redirects=1, titles="|".join(batch)).get("query", {})
+            # Map each requested title through normalisation and redirects
+            resolved = {t: t for t in batch}
+            for step in ("normalized", "redirects"):
+                mapping = {m["from"]: m["to"] for m in query.get(step, [])}
+                resolved = {t: mapping.get(r, r) for t, r in resolved.items()}
+            current = {p["title"]: p["revisions"][0]["revid"]
+                       for p in query.get("pages", []) if p.get("revisions")}
+            revids.update({t: current[r] for t, r in resolved.items() if r in current})
+        return revids
+
+    def infobox(self, revid):
+        key = f"infobox:{revid}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        data = self._api(action="parse", oldid=revid, prop="text", section=0)
+        fields = parse_infobox(data.get("parse", {}).get("text", ""))
+        self.cache.set(key, fields)
+        return fields
+
+    def infoboxes(self, wiki_links):
+        """{wiki_link: infobox fields or None}, fetching pages concurrently."""
+        titles = {link: title_from_link(link) for link in wiki_links}
+        revids = self.revisions(titles.values())
+
+        def fetch(link):
+            revid = revids.get(titles[link])
+            if revid is None:
+                return link, None
+            try:
+                return link, self.infobox(revid)
+            except Exception as e:
+                print(f"⚠️ Wikipedia fetch failed for {titles[link]}: {e}")
+                return link, None
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return dict(executor.map(fetch, titles))
+
+    def stats(self):
+        return self.cache.stats()
+
+
+def box_office(fields):
+    """Raw and normalised box office from infobox fields (None-safe)."""
+    raw = (fields or {}).get("Box office")
+    return {"box_office": raw, **parse_box_office(raw)}
+
+
+def check_box_office(examples=BOX_OFFICE_EXAMPLES):
+    """[(text, expected, parsed)] for examples parse_box_office gets wrong."""
+    failures = []
+    for text, expected in examples:
+        parsed = parse_box_office(text)
+        parsed = (parsed["box_office_inr"], parsed["box_office_usd"], parsed["box_office_estimate"])
+        if parsed != expected:
+            failures.append((text, expected, parsed))
+    return failures
+
+
+if __name__ == "__main__":
+    failures = check_box_office()
+    for text, expected, parsed in failures:
+        print(f"❌ {text!r}: expected {expected}, parsed {parsed}")
+    if failures:
+        raise SystemExit(1)
+    print(f"✅ All {len(BOX_OFFICE_EXAMPLES)} box office examples parse")